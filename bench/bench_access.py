@@ -0,0 +1,62 @@
+"""Benchmark AccessIndex checks at 100k+ rules plus a large shared deny list.
+
+    python -m bench.bench_access --scopes 1000 --handles 200 --shared 1000000
+"""
+import argparse
+import random
+import sys
+import time
+
+from signals.access import AccessIndex, SharedDenyList
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scopes', type=int, default=1000)
+    parser.add_argument('--handles', type=int, default=200, help='rules per scope')
+    parser.add_argument('--shared', type=int, default=1000000, help='entries in the shared deny list')
+    parser.add_argument('--checks', type=int, default=500000)
+    args = parser.parse_args()
+    rng = random.Random(3)
+
+    started = time.perf_counter()
+    shared_ids = rng.sample(range(10 ** 10), args.shared)
+    shared = SharedDenyList(shared_ids)
+    index = AccessIndex(shared)
+    print(f"shared deny list: {len(shared):,} ids in {time.perf_counter() - started:.2f}s, "
+          f"{(sys.getsizeof(shared._ids) + len(shared.bloom.bits)) / 2 ** 20:.1f} MiB "
+          f"(a set would be ~{(sys.getsizeof(set(shared_ids)) + 32 * len(shared_ids)) / 2 ** 20:.0f} MiB)")
+
+    population = 50000
+    for user_id in range(population):
+        index.observe(user_id, f'user{user_id}')
+    started = time.perf_counter()
+    for scope in range(args.scopes):
+        for user_id in rng.sample(range(population), args.handles):
+            index.deny_handle(scope, f'@User{user_id}')
+    elapsed = time.perf_counter() - started
+    rules = args.scopes * args.handles
+    print(f"incremental adds: {rules:,} rules, {rules / elapsed:,.0f} adds/s")
+
+    queries = [(rng.randrange(args.scopes), rng.randrange(population)) for _ in range(args.checks)]
+    queries += [(rng.randrange(args.scopes), rng.choice(shared_ids)) for _ in range(args.checks // 100)]
+    started = time.perf_counter()
+    denied = 0
+    for scope, user_id in queries:
+        if not index.allows(scope, user_id):
+            denied += 1
+    elapsed = time.perf_counter() - started
+    print(f"checks: {len(queries):,} in {elapsed:.2f}s -> {len(queries) / elapsed:,.0f} checks/s "
+          f"({elapsed / len(queries) * 1e9:.0f} ns/check, {denied:,} denied)")
+
+    no_shared = AccessIndex()
+    no_shared._verdicts = index._verdicts
+    started = time.perf_counter()
+    for scope, user_id in queries:
+        no_shared.allows(scope, user_id)
+    elapsed = time.perf_counter() - started
+    print(f"checks without shared list: {len(queries) / elapsed:,.0f} checks/s")
+
+
+if __name__ == '__main__':
+    main_bench()
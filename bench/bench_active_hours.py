@@ -0,0 +1,74 @@
+"""Compare per-message active-hours checks: compiled windows vs parsing the stored string.
+
+    python -m bench.bench_active_hours --users 10000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timezone
+
+from signals.active_hours import ActiveHoursScheduler, compile_slots, minute_of_day
+
+
+def parse_and_check(text, moment):
+    """What the hot path would do without compilation: parse HH:MM strings per message."""
+    minute = moment.hour * 60 + moment.minute
+    for slot in text.split(','):
+        start, end = slot.split('-')
+        sh, sm = map(int, start.strip().split(':'))
+        eh, em = map(int, end.strip().split(':'))
+        start, end = sh * 60 + sm, eh * 60 + em
+        if start == end or (start < end and start <= minute < end) or (start > end and (minute >= start or minute < end)):
+            return True
+    return False
+
+
+def random_slots(rng):
+    slots = []
+    for _ in range(rng.randint(1, 3)):
+        start, end = rng.randrange(1440), rng.randrange(1440)
+        slots.append(f"{start // 60:02d}:{start % 60:02d} - {end // 60:02d}:{end % 60:02d}")
+    return ', '.join(slots)
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--messages', type=int, default=200)
+    args = parser.parse_args()
+    rng = random.Random(5)
+    moment = datetime(2025, 1, 1, 23, 30, tzinfo=timezone.utc)
+
+    texts = {user: random_slots(rng) for user in range(args.users)}
+    scheduler = ActiveHoursScheduler(clock=lambda: moment)
+    started = time.perf_counter()
+    for user, text in texts.items():
+        scheduler.set_window(user, compile_slots(text))
+    print(f"compiled {args.users:,} windows in {time.perf_counter() - started:.3f}s, "
+          f"{len(scheduler.armed):,} armed at {moment:%H:%M}")
+
+    started = time.perf_counter()
+    for _ in range(args.messages):
+        active = [user for user, text in texts.items() if parse_and_check(text, moment)]
+    parse_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(args.messages):
+        active = list(scheduler.armed)
+    armed_time = time.perf_counter() - started
+    assert sorted(active) == sorted(u for u, t in texts.items() if parse_and_check(t, moment))
+
+    per = args.messages
+    print(f"filter everyone by parsing: {parse_time / per * 1e3:8.3f} ms/message")
+    print(f"iterate armed set:          {armed_time / per * 1e3:8.3f} ms/message")
+
+    minute = minute_of_day(moment)
+    started = time.perf_counter()
+    flips = 0
+    for offset in range(1440):
+        flips += len(scheduler.tick((minute + offset) % 1440))
+    print(f"full day of timer-wheel ticks: {time.perf_counter() - started:.3f}s, {flips:,} flips")
+
+
+if __name__ == '__main__':
+    main_bench()
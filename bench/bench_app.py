@@ -0,0 +1,225 @@
+"""Load generator for the bot's Application and ConversationHandler, fully offline.
+
+Builds the application exactly as main() does (main.build_application) on top
+of an in-process Bot API transport and an in-memory Mongo collection, then
+replays synthetic traffic through the same update processor the Application
+uses. Scenarios:
+
+    menu    every user walks the whole menu tree, through every reachable State
+    input   users sit in AWAITING_ETH_LIMIT and keep entering new limits
+    group   bursts of token calls from group chats into echo
+    mixed   all of the above interleaved
+
+Each update is timed from emission until its handler finished. Reports
+throughput, latency percentiles, Bot API calls, handler errors and memory
+growth. Re-run after touching handler code to catch regressions:
+
+    python -m bench.bench_app --users 200 --rate 2000
+    python -m bench.bench_app --scenario group --rate 0    # as fast as possible
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import logging
+import resource
+import time
+import tracemalloc
+from typing import Iterable, Iterator, List
+
+from telegram import Update
+
+import main
+from bench.fakes import AsyncFakeCollection, FakeBotRequest, callback_payload, message_payload
+from bot.outbound import OutboundDispatcher
+from signals.dedup import SeenWindow
+
+# One pass over the menu tree; every step is (kind, payload) where kind is 'text' or 'button'.
+MENU_SCRIPT = [
+    ('text', '/start'),                  # -> SELECTING_CONFIG
+    ('button', 'configure_groups'),      # -> SELECTING_GROUP
+    ('button', 'add_group'),             # -> AWAITING_GROUP
+    ('text', '-1001'),                   # -> SELECTING_GROUP_OPTIONS
+    ('button', 'back_to_groups'),
+    ('button', 'group:Group1'),          # -> SELECTING_GROUP_OPTIONS
+    ('button', 'set_limits'),            # -> SETTING_LIMITS
+    ('button', 'set_eth_limit'),         # -> AWAITING_ETH_LIMIT
+    ('text', '0.25'),                    # -> SETTING_LIMITS
+    ('button', 'back_to_group_options'),
+    ('button', 'set_blacklist'),         # -> SETTING_BLACKLIST
+    ('button', 'add_blacklist'),         # -> AWAITING_BLACKLIST_ADD
+    ('text', '@spammer{user}'),
+    ('button', 'remove_blacklist'),      # -> AWAITING_BLACKLIST_REMOVE
+    ('text', '@spammer{user}'),
+    ('button', 'back_to_group_options'),
+    ('button', 'back_to_groups'),
+    ('button', 'back_to_main'),
+    ('button', 'gen_eth_wallet'),        # -> SELECTING_WALLET
+    ('button', 'back_to_main'),
+    ('button', 'configure_timings'),     # -> SELECTING_BOT_TIME
+    ('button', 'set_time_slot'),         # -> AWAITING_INPUT_TIME_SLOT
+    ('text', '00:00 - 00:00'),           # -> SELECTING_CONFIG
+    ('button', 'exit'),                  # -> END
+]
+
+INPUT_SETUP = [('text', '/start'), ('button', 'configure_groups'), ('button', 'group:Group1'),
+               ('button', 'set_limits'), ('button', 'set_eth_limit')]
+INPUT_LOOP = [('text', '{limit}'), ('button', 'set_eth_limit')]
+
+
+def step_payload(user: int, kind: str, payload: str, index: int) -> dict:
+    if kind == 'text':
+        return message_payload(user, payload.format(user=user, limit=round(0.01 * (index % 100 + 1), 2)))
+    return callback_payload(user, payload)
+
+
+def menu_traffic(users: List[int], passes: int) -> Iterator[dict]:
+    """Round-robin over users so their scripts interleave; each user's own steps stay in order."""
+    script = MENU_SCRIPT * passes
+    for index, step in enumerate(script):
+        for user in users:
+            yield step_payload(user, *step, index)
+
+
+def input_traffic(users: List[int], rounds: int) -> Iterator[dict]:
+    for index, step in enumerate(INPUT_SETUP + INPUT_LOOP * rounds):
+        for user in users:
+            yield step_payload(user, *step, index)
+
+
+def traffic_groups(groups: int) -> List[int]:
+    """Chat ids of the groups group_traffic posts in."""
+    return [-1000 - index for index in range(groups)]
+
+
+def subscriber_doc(tg_id: int, groups: Iterable[int], eth_limit: float = 0.1) -> dict:
+    """Stored user subscribed to group chats, as the settings menus would write it."""
+    return {'tg_id': tg_id, 'status': 'started',
+            'groups': {str(chat_id): {'eth_limit': eth_limit, 'sol_limit': 0.0, 'blacklist': []}
+                       for chat_id in groups}}
+
+
+def group_traffic(groups: int, messages: int, burst: int) -> Iterator[dict]:
+    """Calls are reposted `burst` times across groups before the next one appears."""
+    for index in range(messages):
+        call = index // burst
+        group = -1000 - index % groups
+        sender = 10_000 + index % 97
+        text = f"🚀 new gem CA 0x{call:040x} dexscreener.com/base/0x{call:040x}"
+        yield message_payload(sender, text, chat_id=group, chat_type='supergroup')
+
+
+def mixed_traffic(args) -> Iterator[dict]:
+    sources = [menu_traffic(list(range(1, args.users + 1)), args.passes),
+               input_traffic(list(range(args.users + 1, 2 * args.users + 1)), args.rounds),
+               group_traffic(args.groups, args.messages, args.burst)]
+    for batch in itertools.zip_longest(*sources):
+        yield from (payload for payload in batch if payload is not None)
+
+
+def rss_mib() -> float:
+    """Current resident set size; falls back to the peak where /proc is missing."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+async def run(args, name: str, payloads: List[dict]):
+    request = FakeBotRequest(args.api_latency)
+    application = main.build_application('123456:BENCH', args.concurrency, request)
+    main.user_repo.collection = AsyncFakeCollection(args.mongo_latency)
+    main.group_repo.collection = AsyncFakeCollection(args.mongo_latency)
+    main.config_cache.cache.clear()
+    # Every group call fans out to these users, loaded by on_startup
+    await main.user_repo.insert_many([subscriber_doc(500_000 + index, traffic_groups(args.groups))
+                                      for index in range(args.subscribers)])
+    main.seen_signals = SeenWindow()
+    if not args.telegram_limits:
+        main.outbound = OutboundDispatcher(global_rate=1e9, chat_rate=1e9, group_chat_rate=1e9, chat_burst=1e9)
+    errors = []
+
+    async def on_error(update, context):
+        errors.append(context.error)
+    application.add_error_handler(on_error)
+
+    latencies: List[float] = []
+    processor = application.update_processor
+
+    async def process(update: Update, emitted: float):
+        await processor.process_update(update, application.process_update(update))
+        latencies.append(time.perf_counter() - emitted)
+
+    gc.collect()
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss_before = rss_mib()
+    async with application:
+        await main.on_startup(application)
+        updates = [Update.de_json(payload, application.bot) for payload in payloads]
+        tasks = []
+        started = time.perf_counter()
+        for index, update in enumerate(updates):
+            if args.rate:
+                delay = started + index / args.rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(process(update, time.perf_counter())))
+        await asyncio.gather(*tasks)
+        wall = time.perf_counter() - started
+        backlog = len(main.outbound)
+        await main.on_shutdown(application)
+    del updates, tasks
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] / 2 ** 20 if args.tracemalloc else None
+    if args.tracemalloc:
+        tracemalloc.stop()
+
+    latencies.sort()
+    print(f"{name:<6} updates={len(latencies):6d}  {len(latencies) / wall:8.0f} upd/s  "
+          f"p50={percentile(latencies, 50) * 1000:6.2f}ms  p95={percentile(latencies, 95) * 1000:6.2f}ms  "
+          f"p99={percentile(latencies, 99) * 1000:6.2f}ms  max={latencies[-1] * 1000:7.2f}ms")
+    memory = f"  retained={retained:.1f} MiB" if retained is not None else ''
+    print(f"{'':<6} api calls={sum(request.calls.values())}  outbound backlog={backlog}  errors={len(errors)}  "
+          f"rss {rss_mib() - rss_before:+.1f} MiB{memory}")
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenario', choices=['menu', 'input', 'group', 'mixed', 'all'], default='all')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--passes', type=int, default=2, help='menu walks per user')
+    parser.add_argument('--rounds', type=int, default=20, help='limit entries per user in the input scenario')
+    parser.add_argument('--groups', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=10000)
+    parser.add_argument('--burst', type=int, default=5, help='reposts of each call across groups')
+    parser.add_argument('--subscribers', type=int, default=1, help='users subscribed to every group')
+    parser.add_argument('--rate', type=float, default=2000.0, help='updates per second offered, 0 = all at once')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--mongo-latency', type=float, default=0.001)
+    parser.add_argument('--api-latency', type=float, default=0.0)
+    parser.add_argument('--telegram-limits', action='store_true',
+                        help="keep the outbound dispatcher's real Telegram rate limits")
+    parser.add_argument('--tracemalloc', action='store_true', help='report retained Python memory (slower)')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    users = list(range(1, args.users + 1))
+    scenarios = {
+        'menu': lambda: menu_traffic(users, args.passes),
+        'input': lambda: input_traffic(users, args.rounds),
+        'group': lambda: group_traffic(args.groups, args.messages, args.burst),
+        'mixed': lambda: mixed_traffic(args),
+    }
+    for name, traffic in scenarios.items():
+        if args.scenario in (name, 'all'):
+            asyncio.run(run(args, name, list(traffic())))
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,53 @@
+"""Measure config lookups through ConfigCache against direct DB reads.
+
+    python -m bench.bench_config_cache --users 5000 --lookups 200000 --maxsize 2000
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from bench.fakes import AsyncFakeCollection
+from repo.config_cache import ConfigCache
+from repo.user import AsyncUserRepository
+
+
+async def run(args):
+    repo = AsyncUserRepository()
+    repo.collection = AsyncFakeCollection(args.latency)
+    cache = ConfigCache(repo, maxsize=args.maxsize, ttl=args.ttl)
+    rng = random.Random(7)
+    # Skewed access: a few busy users dominate, like real group traffic.
+    lookups = [min(int(rng.paretovariate(1.2)) - 1, args.users - 1) for _ in range(args.lookups)]
+
+    started = time.perf_counter()
+    for tg_id in lookups:
+        await cache.get_user_config(tg_id)
+    cached = time.perf_counter() - started
+
+    sample = lookups[:args.direct_sample]
+    started = time.perf_counter()
+    for tg_id in sample:
+        await repo.find_by_tg_id(tg_id)
+    direct = (time.perf_counter() - started) / len(sample) * len(lookups)
+
+    stats = cache.stats()
+    print(f"lookups={len(lookups)}  cached={cached:.3f}s ({len(lookups) / cached:,.0f}/s)  "
+          f"direct~{direct:.3f}s (extrapolated from {len(sample)})")
+    print(f"hits={stats['hits']}  misses={stats['misses']}  evictions={stats['evictions']}  "
+          f"hit_rate={stats['hit_rate']:.3f}  db_calls={repo.collection.calls - len(sample)}")
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--lookups', type=int, default=200000)
+    parser.add_argument('--maxsize', type=int, default=2000)
+    parser.add_argument('--ttl', type=float, default=300.0)
+    parser.add_argument('--latency', type=float, default=0.0005, help='simulated Mongo round-trip in seconds')
+    parser.add_argument('--direct-sample', type=int, default=500)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,91 @@
+"""Insert/lookup cost and memory of the signal dedup window at sustained message rates.
+
+Replays a simulated clock: `--rate` token mentions per minute for `--minutes`
+minutes, drawn from a pool of live calls that keeps rotating, so old
+addresses stop recurring the way real calls die off. An unbounded seen-set
+is shown for comparison.
+
+    python -m bench.bench_dedup --rate 5000 --minutes 120 --window 300
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from signals.dedup import SeenWindow
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def mentions(args):
+    rng = random.Random(11)
+    users = list(range(1, args.users + 1))
+    live = [f'0x{rng.getrandbits(160):040x}' for _ in range(args.live)]
+    step = 60.0 / args.rate
+    for index in range(int(args.rate * args.minutes)):
+        if rng.random() < args.new_share:
+            live[rng.randrange(len(live))] = f'0x{rng.getrandbits(160):040x}'
+        yield index * step, (rng.choice(users), rng.choice(live))
+
+
+def run(name, events, clock, check):
+    started = time.perf_counter()
+    passed = 0
+    for now, key in events:
+        clock.now = now
+        passed += check(key)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<14} {elapsed / len(events) * 1e9:6.0f} ns/mention  passed={passed:,}/{len(events):,}")
+
+
+def footprint(name, events, clock, check):
+    tracemalloc.start()
+    for now, key in events:
+        clock.now = now
+        check(key)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<14} memory at end={current / 2 ** 20:7.2f} MiB  peak={peak / 2 ** 20:7.2f} MiB")
+
+
+def unbounded_set():
+    seen = set()
+
+    def check(key):
+        if key in seen:
+            return False
+        seen.add(key)
+        return True
+    return check
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rate', type=float, default=5000, help='token mentions per minute')
+    parser.add_argument('--minutes', type=float, default=120)
+    parser.add_argument('--window', type=float, default=300.0, help='dedup window in seconds')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--live', type=int, default=300, help='calls circulating at any moment')
+    parser.add_argument('--new-share', type=float, default=0.05, help='share of mentions that start a new call')
+    args = parser.parse_args()
+    events = list(mentions(args))
+
+    clock = Clock()
+    run('unbounded set', events, clock, unbounded_set())
+    window = SeenWindow(args.window, clock)
+    run('SeenWindow', events, clock, window.first_seen)
+    stats = window.stats()
+    print(f"{'':<14} suppressed={stats['suppressed']:,} ({stats['suppressed_rate']:.1%})  "
+          f"entries at end={stats['size']:,}  peak={stats['peak']:,}")
+    footprint('unbounded set', events, clock, unbounded_set())
+    footprint('SeenWindow', events, clock, SeenWindow(args.window, clock).first_seen)
+
+
+if __name__ == '__main__':
+    main_bench()
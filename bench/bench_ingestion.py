@@ -0,0 +1,179 @@
+"""Receive-to-handler latency: long polling vs the embedded webhook server.
+
+A local stand-in for the Bot API serves getUpdates long-polls and, in webhook
+mode, pushes the same updates to WebhookServer over keep-alive connections.
+Both directions get an injected one-way network delay. Each update is
+stamped when "Telegram" emits it and again when the handler runs.
+
+    python -m bench.bench_ingestion --updates 500 --rate 200 --one-way 0.02
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import aiohttp
+from aiohttp import web
+from telegram.ext import Application, MessageHandler, filters
+
+from bot.updates import ChatOrderedUpdateProcessor
+from bot.webhook import SECRET_HEADER, WebhookServer
+
+TOKEN = '123456:TEST'
+SECRET = 'bench-secret'
+
+
+def message_update(update_id: int) -> dict:
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': -1000 - update_id % 50, 'type': 'supergroup', 'title': 'alpha'},
+            'from': {'id': 10 + update_id % 500, 'is_bot': False, 'first_name': 'caller'},
+            'text': f'CA 0x{update_id:040x}',
+        },
+    }
+
+
+class FakeBotApi:
+    """Just enough of api.telegram.org for Application start-up and getUpdates."""
+
+    def __init__(self, one_way: float):
+        self.one_way = one_way
+        self.pending = []
+        self.arrived = asyncio.Event()
+        self.runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.one_way)
+        method = request.match_info['method']
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+        elif method == 'getUpdates':
+            try:
+                params = dict(await request.post())
+            except ConnectionResetError:
+                return web.Response(status=499)
+            offset = int(params.get('offset', 0) or 0)
+            self.pending = [update for update in self.pending if update['update_id'] >= offset]
+            timeout = float(params.get('timeout', 0) or 0)
+            if not self.pending and timeout:
+                self.arrived.clear()
+                try:
+                    await asyncio.wait_for(self.arrived.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            result = list(self.pending)
+            await asyncio.sleep(self.one_way)
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    def emit(self, update: dict):
+        self.pending.append(update)
+        self.arrived.set()
+
+    async def start(self, port: int):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, '127.0.0.1', port).start()
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+def build_application(api_port: int, concurrency: int, received: dict) -> Application:
+    application = (Application.builder().token(TOKEN)
+                   .base_url(f'http://127.0.0.1:{api_port}/bot')
+                   .concurrent_updates(ChatOrderedUpdateProcessor(concurrency))
+                   .build())
+
+    async def handler(update, context):
+        received[update.update_id] = time.perf_counter()
+
+    application.add_handler(MessageHandler(filters.TEXT, handler))
+    return application
+
+
+async def drive(emit, count: int, rate: float, emitted: dict, received: dict):
+    for update_id in range(1, count + 1):
+        emitted[update_id] = time.perf_counter()
+        emit(message_update(update_id))
+        await asyncio.sleep(1 / rate)
+    deadline = time.perf_counter() + 30
+    while len(received) < count and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+
+
+async def run_polling(args) -> list:
+    api = FakeBotApi(args.one_way)
+    await api.start(args.api_port)
+    emitted, received = {}, {}
+    application = build_application(args.api_port, args.concurrency, received)
+    async with application:
+        await application.updater.start_polling(poll_interval=0.0, timeout=10)
+        await application.start()
+        await drive(api.emit, args.updates, args.rate, emitted, received)
+        await application.updater.stop()
+        await application.stop()
+    await api.stop()
+    return [received[i] - emitted[i] for i in received]
+
+
+async def run_webhook(args) -> list:
+    api = FakeBotApi(args.one_way)
+    await api.start(args.api_port)
+    emitted, received = {}, {}
+    application = build_application(args.api_port, args.concurrency, received)
+    server = WebhookServer(application, SECRET, '127.0.0.1', args.webhook_port, '/telegram')
+    connector = aiohttp.TCPConnector(limit=args.max_connections)
+    async with application, aiohttp.ClientSession(connector=connector) as session:
+        await server.start()
+        await application.start()
+        url = f'http://127.0.0.1:{args.webhook_port}/telegram'
+        headers = {SECRET_HEADER: SECRET, 'Content-Type': 'application/json'}
+        posts = []
+
+        async def push(update):
+            await asyncio.sleep(args.one_way)
+            async with session.post(url, data=json.dumps(update), headers=headers) as response:
+                await response.read()
+
+        await drive(lambda update: posts.append(asyncio.create_task(push(update))),
+                    args.updates, args.rate, emitted, received)
+        await asyncio.gather(*posts)
+        await server.stop()
+        await application.stop()
+    await api.stop()
+    return [received[i] - emitted[i] for i in received]
+
+
+def report(name, latencies, expected):
+    latencies.sort()
+    pick = lambda pct: latencies[min(len(latencies) - 1, int(len(latencies) * pct / 100))] * 1000
+    print(f"{name:<8} delivered={len(latencies)}/{expected}  p50={pick(50):7.1f}ms  "
+          f"p95={pick(95):7.1f}ms  p99={pick(99):7.1f}ms  max={latencies[-1] * 1000:7.1f}ms")
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=200.0, help='updates per second emitted')
+    parser.add_argument('--one-way', type=float, default=0.02, help='simulated one-way network delay')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--max-connections', type=int, default=40)
+    parser.add_argument('--api-port', type=int, default=18081)
+    parser.add_argument('--webhook-port', type=int, default=18082)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    report('polling', asyncio.run(run_polling(args)), args.updates)
+    report('webhook', asyncio.run(run_webhook(args)), args.updates)
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,112 @@
+"""Signal journal: append cost on the live path, and replay throughput over tens of millions of records.
+
+    python -m bench.bench_journal --records 20000000 --users 2000 --groups 1000
+
+Writes a synthetic history of token calls at --rate calls per second (so
+20M records at 20/s are about 11.5 days) into segment-rotated files in a
+temporary directory. It then reads the history back twice: a bare scan of
+the mapped records, and a full SignalReplay of --users users with ETH
+limits, blacklists and active windows. Replay speed is also given as a
+multiple of real time, meaning the history's span over the replay's wall
+time.
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from eth_utils import to_checksum_address
+
+from repo.config_cache import build_user_config
+from signals.journal import RECORD, REPLAY_RECORD, JournalReader, SignalJournal, segment_paths
+from signals.parser import TokenMention, b58encode
+from signals.replay import SignalReplay
+
+
+def token_pool(size: int, rng: random.Random) -> list:
+    """Distinct calls, three EVM (some on Base) for each Solana mint."""
+    tokens = []
+    for index in range(size):
+        if index % 4 == 3:
+            tokens.append(TokenMention(b58encode(bytes([1]) + rng.randbytes(31)), 'solana', 'solana', 'link'))
+        else:
+            tokens.append(TokenMention(to_checksum_address(rng.randbytes(20)), 'base' if index % 2 else None,
+                                       'evm', 'text'))
+    return tokens
+
+
+def user_configs(users: int, groups: list, per_user: int, senders: int, rng: random.Random) -> dict:
+    configs = {}
+    for tg_id in range(1, users + 1):
+        timings = '00:00 - 00:00' if tg_id % 3 else f'{tg_id % 24:02d}:00 - {(tg_id + 8) % 24:02d}:00'
+        configs[tg_id] = build_user_config({'timings': timings, 'groups': {
+            str(group): {'eth_limit': round(rng.uniform(0.01, 0.5), 2),
+                         'blacklist': [f'@caller{rng.randrange(senders)}' for _ in range(tg_id % 4)]}
+            for group in rng.sample(groups, per_user)}})
+    return configs
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=20_000_000)
+    parser.add_argument('--rate', type=float, default=20.0, help='token calls per second of history')
+    parser.add_argument('--groups', type=int, default=1000)
+    parser.add_argument('--subscribed-groups', type=int, default=200,
+                        help='groups with subscribers; the rest are journalled by other settings')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--per-user', type=int, default=5, help='groups each user subscribes to')
+    parser.add_argument('--senders', type=int, default=5000)
+    parser.add_argument('--tokens', type=int, default=50_000)
+    parser.add_argument('--segment-records', type=int, default=1 << 20)
+    parser.add_argument('--directory', default=None, help='keep the journal here instead of a temporary directory')
+    args = parser.parse_args()
+    rng = random.Random(20)
+
+    directory = args.directory or tempfile.mkdtemp(prefix='signal-journal-')
+    groups = [-1000 - index for index in range(args.groups)]
+    tokens = token_pool(args.tokens, rng)
+    usernames = [f'caller{sender}' for sender in range(args.senders)]
+    # A call is reposted a few times across groups before the next one appears
+    plan = [(rng.choice(groups), rng.randrange(args.senders), tokens[index // 4 % len(tokens)])
+            for index in range(min(args.records, 1 << 16))]
+    start = time.time() - args.records / args.rate
+    try:
+        journal = SignalJournal(directory, segment_records=args.segment_records)
+        append = journal.append
+        step = 1 / args.rate
+        started = time.perf_counter()
+        for index in range(args.records):
+            chat_id, sender, token = plan[index & 0xFFFF]
+            append(chat_id, sender, usernames[sender], token, 3, 1, start + index * step)
+        journal.close()
+        elapsed = time.perf_counter() - started
+        size = sum(os.path.getsize(path) for path in segment_paths(directory))
+        print(f"append  {args.records:>11,d} records  {elapsed / args.records * 1e9:6.0f} ns/record  "
+              f"{size / elapsed / 2 ** 20:6.1f} MB/s  {len(segment_paths(directory))} segments of "
+              f"{args.segment_records:,d}  {size / 2 ** 30:.2f} GiB ({RECORD.size} B/record)")
+
+        reader = JournalReader(directory)
+        started = time.perf_counter()
+        scanned = sum(1 for _ in reader.records(REPLAY_RECORD))
+        elapsed = time.perf_counter() - started
+        print(f"scan    {scanned:>11,d} records  {scanned / elapsed / 1e6:6.2f} M records/s")
+
+        subscribed = groups[:args.subscribed_groups]
+        replay = SignalReplay(user_configs(args.users, subscribed, args.per_user, args.senders, rng))
+        started = time.perf_counter()
+        result = replay.run(reader.records(REPLAY_RECORD))
+        elapsed = time.perf_counter() - started
+        span = args.records / args.rate
+        print(f"replay  {result['replayed']:>11,d} records  {result['replayed'] / elapsed / 1e6:6.2f} M records/s  "
+              f"{span / elapsed:9,.0f}x real time ({span / 86400:.1f} days in {elapsed:.1f}s)  "
+              f"skipped={result['skipped']:,d} notified={sum(result['notified'].values()):,d} "
+              f"buys={sum(result['buys'].values()):,d} users={replay.subscriptions.stats()['users']}")
+    finally:
+        if args.directory is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main_bench()
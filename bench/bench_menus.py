@@ -0,0 +1,102 @@
+"""Menu navigation: Bot API calls and CPU per button press, with and without the menu engine's caches.
+
+    python -m bench.bench_menus --users 200 --passes 5
+
+Every user walks NAV_SCRIPT through the real Application (main.build_application)
+over an in-process Bot API and an in-memory Mongo collection. The script
+includes presses that leave a screen as it is: refreshing the screen on
+display and a double tap. The `rebuild` variant builds a new keyboard for
+every screen and sends every edit, as the hand-written handlers did;
+`engine` uses the cached keyboards and skips edits that would not change
+the message. CPU is process time per press,
+handlers and Bot API request encoding included.
+"""
+import argparse
+import asyncio
+import logging
+import time
+import timeit
+
+from telegram import Update
+
+import bot.menus
+import main
+from bench.fakes import AsyncFakeCollection, FakeBotRequest, callback_payload, message_payload
+from bot.outbound import OutboundDispatcher
+from signals.dedup import SeenWindow
+
+# The cached builder; the rebuild variant swaps in the uncached one
+markup = bot.menus.markup
+
+NAV_SCRIPT = [
+    '/start',
+    'configure_groups', 'group:Group1',
+    'set_limits', 'set_limits',                      # refresh: unchanged
+    'set_eth_limit', 'cancel_limit_setting',
+    'back_to_group_options', 'set_blacklist',
+    'back_to_blacklist',                             # unchanged
+    'add_blacklist', 'cancel_blacklist',
+    'back_to_group_options', 'back_to_groups', 'back_to_main',
+    'back_to_main',                                  # double tap: unchanged
+    'configure_timings', 'back_to_main',
+    'gen_eth_wallet', 'back_to_main',
+]
+
+
+async def walk(application, user: int, passes: int):
+    for _ in range(passes):
+        for step in NAV_SCRIPT:
+            payload = message_payload(user, step) if step.startswith('/') else callback_payload(user, step)
+            await application.process_update(Update.de_json(payload, application.bot))
+
+
+async def run(args, name: str, cached: bool):
+    request = FakeBotRequest()
+    application = main.build_application('123456:BENCH', 16, request)
+    main.user_repo.collection = AsyncFakeCollection()
+    main.group_repo.collection = AsyncFakeCollection()
+    main.config_cache.cache.clear()
+    main.seen_signals = SeenWindow()
+    main.outbound = OutboundDispatcher(global_rate=1e9, chat_rate=1e9, group_chat_rate=1e9, chat_burst=1e9)
+    main.menus.skip_unchanged = cached
+    bot.menus.markup = markup if cached else markup.__wrapped__
+    before = main.menus.stats()
+    async with application:
+        main.outbound.start(application.bot)
+        # Warm up: users' settings cached, first keyboards built
+        await walk(application, 0, 1)
+        await asyncio.sleep(0.05)
+        request.calls.clear()
+        started_cpu, started = time.process_time(), time.perf_counter()
+        await asyncio.gather(*(walk(application, user, args.passes) for user in range(1, args.users + 1)))
+        await main.outbound.stop(timeout=60)
+        cpu, wall = time.process_time() - started_cpu, time.perf_counter() - started
+    presses = args.users * args.passes * len(NAV_SCRIPT)
+    after = main.menus.stats()
+    calls = sum(request.calls.values())
+    print(f"{name:<8} presses={presses:6d}  api calls/press={calls / presses:5.2f} "
+          f"(edits {request.calls['editMessageText'] / presses:4.2f}, answers {request.calls['answerCallbackQuery'] / presses:4.2f})  "
+          f"cpu/press={cpu / presses * 1e6:6.0f}us  wall {wall:5.2f}s  "
+          f"skipped edits={after['unchanged'] - before['unchanged']}")
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--passes', type=int, default=5, help='walks of NAV_SCRIPT per user')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    rows = main.MAIN_MENU_KEYBOARD
+    number = 20000
+    built = timeit.timeit(lambda: markup.__wrapped__(rows), number=number) / number
+    reused = timeit.timeit(lambda: markup(rows), number=number) / number
+    print(f"main menu keyboard: built {built * 1e6:.1f}us, cached {reused * 1e6:.2f}us")
+
+    for name, cached in (('rebuild', False), ('engine', True)):
+        asyncio.run(run(args, name, cached))
+    bot.menus.markup = markup
+
+
+if __name__ == '__main__':
+    main_bench()
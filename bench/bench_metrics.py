@@ -0,0 +1,92 @@
+"""Per-update cost of the latency instrumentation on the group message path.
+
+Feeds Bot API update payloads through a real Application (de_json, handler
+dispatch, main.echo with its parser, access checks and dedup) with metrics
+disabled and enabled, and reports the added cost per update. The local Bot
+API stand-in from bench_ingestion only answers the start-up calls.
+
+    python -m bench.bench_metrics --updates 20000
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from telegram import Update
+from telegram.ext import Application, MessageHandler, filters
+
+import main
+import metrics
+from bench.bench_ingestion import TOKEN, FakeBotApi, message_update
+from bench.fakes import AsyncFakeCollection
+from signals.dedup import SeenWindow
+
+
+async def run(args, enabled: bool) -> float:
+    metrics.REGISTRY.enabled = enabled
+    api = FakeBotApi(0.0)
+    await api.start(args.api_port)
+    application = Application.builder().token(TOKEN).base_url(f'http://127.0.0.1:{args.api_port}/bot').build()
+    application.add_handler(MessageHandler((filters.TEXT | filters.CAPTION) & ~filters.COMMAND, main.echo))
+    metrics.instrument_handlers(application.handlers[0])
+    payloads = [message_update(update_id) for update_id in range(1, args.updates + 1)]
+    main.seen_signals = SeenWindow()
+    main.group_repo.collection = AsyncFakeCollection()
+    async with application:
+        started = time.perf_counter()
+        for index, payload in enumerate(payloads):
+            if enabled:
+                metrics.received_at.set(time.perf_counter())
+            await application.process_update(Update.de_json(payload, application.bot))
+            if index % 1000 == 999:
+                main.outbound._heap.clear()
+                main.outbound._coalescing.clear()
+        elapsed = time.perf_counter() - started
+    main.outbound._heap.clear()
+    main.outbound._coalescing.clear()
+    await api.stop()
+    return elapsed / args.updates
+
+
+def instrumentation_cost(enabled: bool, updates: int) -> float:
+    """The calls echo() makes into metrics for one update, timed in isolation."""
+    metrics.REGISTRY.enabled = enabled
+    series = metrics.HANDLER_SECONDS.labels('bench')
+    started = time.perf_counter()
+    for _ in range(updates):
+        if enabled:
+            metrics.received_at.set(time.perf_counter())
+            handler_started = time.perf_counter()
+        span = metrics.span()
+        for stage in ('receive', 'filter', 'parse', 'decide', 'send'):
+            span.mark(stage)
+        if enabled:
+            series.observe(time.perf_counter() - handler_started)
+    return (time.perf_counter() - started) / updates
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--api-port', type=int, default=18083)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    # Interleave the rounds so drift in machine load hits both sides alike
+    disabled, enabled = [], []
+    for _ in range(args.rounds):
+        disabled.append(asyncio.run(run(args, False)))
+        enabled.append(asyncio.run(run(args, True)))
+    disabled, enabled = min(disabled), min(enabled)
+    print(f"metrics off: {disabled * 1e6:6.2f} us/update")
+    print(f"metrics on:  {enabled * 1e6:6.2f} us/update  ({(enabled - disabled) * 1e9:+.0f} ns, "
+          f"{(enabled - disabled) / disabled:+.1%})")
+    for enabled_flag in (False, True):
+        cost = instrumentation_cost(enabled_flag, args.updates)
+        print(f"instrumentation alone, {'on ' if enabled_flag else 'off'}: {cost * 1e9:5.0f} ns/update")
+    print(metrics.format_summary(metrics.REGISTRY.summary()))
+
+
+if __name__ == '__main__':
+    main_bench()
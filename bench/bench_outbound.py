@@ -0,0 +1,96 @@
+"""Measure OutboundDispatcher throughput and queueing delay against a rate-limited stand-in Bot.
+
+A launch burst: many users get alpha notifications at once, some of them
+repeated, while others click through menus and a few snipes confirm.
+
+    python -m bench.bench_outbound --users 300 --bursts 5
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from bench.fakes import FakeBot
+from bot.outbound import OutboundDispatcher, Priority
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+async def inline_baseline(jobs, latency, flood_limit):
+    """Every handler awaiting bot.send_message itself, retrying on 429."""
+    bot = FakeBot(latency=latency, flood_limit=flood_limit)
+    started = time.perf_counter()
+
+    async def send(chat_id, text):
+        while True:
+            try:
+                return await bot.send_message(chat_id=chat_id, text=text)
+            except Exception as error:
+                await asyncio.sleep(error.retry_after)
+
+    await asyncio.gather(*(send(chat_id, text) for _, chat_id, text, _ in jobs))
+    return time.perf_counter() - started, bot
+
+
+async def dispatched(jobs, latency, flood_limit):
+    bot = FakeBot(latency=latency, flood_limit=flood_limit)
+    dispatcher = OutboundDispatcher(bot)
+    dispatcher.start()
+    delays = {priority: [] for priority in Priority}
+    started = time.perf_counter()
+
+    def record(priority, submitted):
+        return lambda future: delays[priority].append(time.perf_counter() - submitted)
+
+    futures = []
+    for priority, chat_id, text, coalesce in jobs:
+        future = dispatcher.submit('send_message', chat_id, priority, 'alpha' if coalesce else None, text=text)
+        if future not in futures:
+            future.add_done_callback(record(priority, time.perf_counter()))
+            futures.append(future)
+    await asyncio.gather(*futures)
+    elapsed = time.perf_counter() - started
+    await dispatcher.stop()
+    return elapsed, bot, dispatcher, delays
+
+
+def build_jobs(users, bursts, rng):
+    jobs = []
+    for burst in range(bursts):
+        for user in range(users):
+            jobs.append((Priority.NOTIFY, user, f"alpha #{burst} for {user}", True))
+            if rng.random() < 0.2:
+                jobs.append((Priority.MENU, user, "menu edit", False))
+            if rng.random() < 0.02:
+                jobs.append((Priority.SNIPE, user, "✅ sniped", False))
+    return jobs
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--bursts', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.03, help='simulated Bot API round-trip')
+    parser.add_argument('--flood-limit', type=int, default=30, help='calls/s before the stand-in answers 429')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    jobs = build_jobs(args.users, args.bursts, random.Random(11))
+
+    elapsed, bot = asyncio.run(inline_baseline(jobs, args.latency, args.flood_limit))
+    print(f"inline:     {len(jobs):,} calls, {len(bot.calls):,} delivered in {elapsed:.2f}s "
+          f"({len(bot.calls) / elapsed:.1f}/s), {bot.rejected:,} x 429")
+
+    elapsed, bot, dispatcher, delays = asyncio.run(dispatched(jobs, args.latency, args.flood_limit))
+    print(f"dispatcher: {len(jobs):,} calls, {len(bot.calls):,} delivered in {elapsed:.2f}s "
+          f"({len(bot.calls) / elapsed:.1f}/s), {bot.rejected:,} x 429, {dispatcher.coalesced:,} coalesced")
+    for priority, samples in delays.items():
+        print(f"  {priority.name:<6} n={len(samples):5d}  queue p50={percentile(samples, 50):6.2f}s  "
+              f"p99={percentile(samples, 99):6.2f}s")
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,131 @@
+"""Startup time and resident memory of the bot's state store with many stored users:
+MongoPersistence loading users on their first update, against reading every stored user at boot.
+
+    python -m bench.bench_persistence --users 100000 --active 1000
+
+Runs on the in-memory fake collection; memory is what tracemalloc attributes
+to the bot process after the store was seeded (the store itself stands in for
+the database and is not counted).
+"""
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+from typing import Any, Dict
+
+from telegram import Update
+
+import main
+from bench.bench_app import INPUT_SETUP, step_payload
+from bench.fakes import AsyncFakeCollection, FakeBotRequest
+from repo.dbhelper import AsyncMongoHelper
+from repo.persistence import MongoPersistence, decode_key
+from signals.dedup import SeenWindow
+
+
+class EagerMongoPersistence(MongoPersistence):
+    """Same documents, all of them read at boot like the file-based persistences do."""
+
+    async def get_user_data(self) -> Dict[int, Dict[str, Any]]:
+        docs = await self.helper.find_all({})
+        for doc in docs:
+            self._saved_user_data[doc['_id']] = dict(doc.get('user_data') or {})
+            self._loaded.add(doc['_id'])
+        return {doc['_id']: dict(doc.get('user_data') or {}) for doc in docs}
+
+    async def get_conversations(self, name: str):
+        states = {state.name: state for state in main.State}
+        conversations = {}
+        for doc in await self.helper.find_all({}):
+            for text, state in (doc.get('conversations') or {}).get(name, {}).items():
+                key = decode_key(text)
+                conversations[key] = states.get(state, state)
+                self._saved_states[(name, key)] = state
+                self._conversation_keys.setdefault(doc['_id'], set()).add((name, key))
+        return conversations
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def stored_user(user_id: int) -> dict:
+    return {'_id': user_id,
+            'user_data': {'selected_group': 'Group1', 'setting_limit': 'eth', 'blacklist_action': 'add'},
+            'conversations': {'menu': {f'{user_id}_{user_id}': 'SETTING_LIMITS'}}}
+
+
+def megabytes(size: int) -> str:
+    return f"{size / 1e6:7.1f} MB"
+
+
+async def run_variant(name: str, kind: type, store: AsyncFakeCollection, args):
+    clock = Clock()
+    helper = AsyncMongoHelper('mydb', 'conversations')
+    helper.collection = store
+    persistence = kind(helper, update_interval=60, idle_ttl=600, clock=clock)
+    application = main.build_application('123456:TEST', 16, FakeBotRequest(), persistence)
+    tracemalloc.start()
+    started = time.perf_counter()
+    await application.initialize()
+    boot = time.perf_counter() - started
+    booted = tracemalloc.get_traced_memory()[0]
+
+    # The active users come back to the limit prompt and walk into it again
+    started = time.perf_counter()
+    updates = [Update.de_json(step_payload(user, *step, index), application.bot)
+               for index, step in enumerate(INPUT_SETUP[1:]) for user in range(args.active)]
+    for update in updates:
+        await application.update_processor.process_update(update, application.process_update(update))
+    served = time.perf_counter() - started
+    served_updates = len(updates)
+    del updates
+    gc.collect()
+    calls = store.calls
+    await application.update_persistence()
+    writes = store.calls - calls
+    active = tracemalloc.get_traced_memory()[0]
+
+    clock.now = 601
+    update = Update.de_json(step_payload(args.users + 1, 'text', '/start', 0), application.bot)
+    await application.update_processor.process_update(update, application.process_update(update))
+    del update
+    gc.collect()
+    evicted = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    await application.shutdown()
+    stats = persistence.stats()
+    print(f"{name:<6} boot {boot * 1000:8.1f} ms  memory: boot {megabytes(booted)}  "
+          f"{args.active} active {megabytes(active)}  after eviction {megabytes(evicted)}")
+    print(f"{'':<6} {served_updates} updates in {served:.2f}s, loads={stats['loads']} "
+          f"persistence round trips={writes} ops={stats['written_ops']} unchanged={stats['unchanged']}")
+
+
+async def run(args):
+    for name, kind in (('eager', EagerMongoPersistence), ('lazy', MongoPersistence)):
+        store = AsyncFakeCollection()
+        for first in range(0, args.users, 10_000):
+            await store.insert_many([stored_user(user) for user in range(first, min(first + 10_000, args.users))])
+        store.latency = args.latency
+        await run_variant(name, kind, store, args)
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100_000, help='stored users')
+    parser.add_argument('--active', type=int, default=1_000, help='users sending updates after boot')
+    parser.add_argument('--latency', type=float, default=0.0005, help='simulated round trip of the fake')
+    args = parser.parse_args()
+    main.user_repo.collection = AsyncFakeCollection()
+    main.group_repo.collection = AsyncFakeCollection()
+    main.seen_signals = SeenWindow()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,121 @@
+"""On-chain token checks per signal: sequential calls vs batched JSON-RPC vs Multicall3.
+
+Every signal needs decimals, totalSupply, the WETH pair reserves and the pair
+creation block. The local RPC stand-in injects a fixed latency per HTTP
+round-trip. Signals arrive at a fixed rate and overlap, as they do when
+several groups post at once.
+
+    python -m bench.bench_rpc --signals 500 --rate 200 --latency 0.03
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+import aiohttp
+
+from bench.fake_rpc import FakeRpcServer
+from chain.rpc import JsonRpcClient
+from chain.tokens import TokenReader, pair_for
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda pct: samples[min(len(samples) - 1, int(len(samples) * pct / 100))] * 1000
+    return f"p50={pick(50):7.1f}ms  p99={pick(99):7.1f}ms"
+
+
+class SequentialReader(TokenReader):
+    """One HTTP request per read, awaited one after another on a fresh connection each time."""
+
+    def __init__(self, url):
+        super().__init__(None, use_multicall=False)
+        self.url = url
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(force_close=True))
+
+    async def read(self, token):
+        results = []
+        for request_id, (method, params) in enumerate(self.requests(token)):
+            payload = {'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params}
+            async with self.session.post(self.url, data=json.dumps(payload),
+                                         headers={'Content-Type': 'application/json'}) as response:
+                results.append((await response.json())['result'])
+        head = int(results.pop(), 16)
+        _, token0, token1 = pair_for(token)
+        method, params = self._logs_request(token0, token1, head)
+        payload = {'jsonrpc': '2.0', 'id': len(results) + 1, 'method': method, 'params': params}
+        async with self.session.post(self.url, data=json.dumps(payload),
+                                     headers={'Content-Type': 'application/json'}) as response:
+            logs = (await response.json())['result']
+        creation_block = int(logs[0]['blockNumber'], 16) if logs else None
+        return self._parse(token, [bytes.fromhex(r[2:]) for r in results], creation_block)
+
+    async def close(self):
+        await self.session.close()
+
+
+async def drive(reader, tokens, rate):
+    latencies = []
+
+    async def signal(token):
+        started = time.perf_counter()
+        info = await reader.read(token)
+        assert info.has_liquidity
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    tasks = []
+    for token in tokens:
+        tasks.append(asyncio.create_task(signal(token)))
+        await asyncio.sleep(1 / rate)
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - started, latencies
+
+
+async def run(name, args, tokens, make_reader, failing_primary=False):
+    server = FakeRpcServer(latency=args.latency)
+    for token in tokens:
+        server.add_token(token, reserve_token=10 ** 26, reserve_weth=5 * 10 ** 18)
+    urls = [await server.start()]
+    dead = None
+    if failing_primary:
+        dead = FakeRpcServer(fail=True)
+        urls.insert(0, await dead.start())
+    reader = make_reader(urls)
+    wall, latencies = await drive(reader, tokens, args.rate)
+    if isinstance(reader, SequentialReader):
+        await reader.close()
+    else:
+        await reader.rpc.close()
+    await server.stop()
+    if dead is not None:
+        await dead.stop()
+    print(f"{name:<22} calls/signal={server.calls / len(tokens):5.2f}  "
+          f"round-trips/signal={server.round_trips / len(tokens):5.2f}  "
+          f"wall={wall:6.2f}s  {percentiles(latencies)}")
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--signals', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=200.0, help='signals per second')
+    parser.add_argument('--latency', type=float, default=0.03, help='RPC round-trip latency in seconds')
+    parser.add_argument('--window', type=float, default=0.01, help='batch window that merges concurrent signals')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    tokens = ['0x' + os.urandom(20).hex() for _ in range(args.signals)]
+
+    asyncio.run(run('sequential', args, tokens, lambda urls: SequentialReader(urls[-1])))
+    asyncio.run(run('batched', args, tokens,
+                    lambda urls: TokenReader(JsonRpcClient(urls), use_multicall=False)))
+    asyncio.run(run('batched + multicall', args, tokens, lambda urls: TokenReader(JsonRpcClient(urls))))
+    asyncio.run(run(f'multicall, {args.window * 1000:g}ms window', args, tokens,
+                    lambda urls: TokenReader(JsonRpcClient(urls, batch_window=args.window))))
+    asyncio.run(run('multicall, failover', args, tokens,
+                    lambda urls: TokenReader(JsonRpcClient(urls)), failing_primary=True))
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,101 @@
+"""Throughput of sharded update processing from 1 to N worker processes.
+
+Spawns N workers (main.attach_shard + main.build_application on the offline
+Bot API transport and in-memory Mongo), routes group calls and menu walks
+through a ShardIngress as fast as it takes them and waits until every shard
+has handled everything, including the settings broadcasts, signal claims and
+forwarded buys between shards. Reports updates/s, the speedup over one
+shard and the ingress's own CPU cost per update, which caps the scaling.
+
+    python -m bench.bench_shards --shards 1,2,4 --messages 20000
+"""
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from typing import Sequence
+
+from telegram.ext import Application
+
+import main
+from bench.bench_app import group_traffic, menu_traffic, subscriber_doc, traffic_groups
+from bench.fakes import AsyncFakeCollection, FakeBotRequest, message_payload
+from bot.outbound import OutboundDispatcher
+from bot.shards import ShardIngress, ShardLink
+
+
+# The user every group call is acted on for
+SUBSCRIBER = 2
+
+
+def bench_setup(link: ShardLink, mongo_latency: float, concurrency: int, groups: Sequence[int] = ()) -> Application:
+    """Worker setup: a real shard on fake I/O, with the outbound rate limits lifted.
+
+    Each worker has its own fake collection, so SUBSCRIBER's subscription to
+    `groups` is stored in every one of them.
+    """
+    logging.disable(logging.WARNING)
+    collection = main.user_repo.collection = AsyncFakeCollection(mongo_latency)
+    main.group_repo.collection = AsyncFakeCollection(mongo_latency)
+    if groups:
+        # Seeded before the loop runs, so straight into the store
+        collection._insert([subscriber_doc(SUBSCRIBER, groups)])
+    main.attach_shard(link)
+    main.outbound = OutboundDispatcher(global_rate=1e9, chat_rate=1e9, group_chat_rate=1e9, chat_burst=1e9)
+    return main.build_application('123456:BENCH', concurrency, FakeBotRequest())
+
+
+async def run(args, shards: int, bodies) -> tuple:
+    setup = functools.partial(bench_setup, mongo_latency=args.mongo_latency, concurrency=args.concurrency,
+                              groups=traffic_groups(args.groups))
+    ingress = ShardIngress(shards, setup)
+    await ingress.start()
+    try:
+        # /start shares the subscriber's settings with all shards
+        await ingress.route(message_payload(SUBSCRIBER, '/start'))
+        await ingress.drain()
+
+        cpu = time.process_time()
+        started = time.perf_counter()
+        for data, body in bodies:
+            await ingress.route(data, body)
+        await ingress.drain()
+        wall = time.perf_counter() - started
+        cpu = time.process_time() - cpu
+        return len(bodies) / wall, cpu / len(bodies), ingress.routed, ingress.broadcasts, ingress.forwarded
+    finally:
+        await ingress.stop()
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shards', default='1,2,4', help='comma-separated worker counts')
+    parser.add_argument('--messages', type=int, default=20000, help='group calls')
+    parser.add_argument('--groups', type=int, default=64)
+    parser.add_argument('--burst', type=int, default=4, help='reposts of each call across groups')
+    parser.add_argument('--users', type=int, default=64, help='users walking the menu alongside')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--mongo-latency', type=float, default=0.001)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    payloads = list(group_traffic(args.groups, args.messages, args.burst))
+    payloads += menu_traffic(list(range(100, 100 + args.users)), 1)
+    # Webhook bodies arrive as bytes; the ingress only parses them for the routing key
+    bodies = [(payload, json.dumps(payload).encode()) for payload in payloads]
+    print(f"{len(bodies)} updates, {os.cpu_count()} CPUs")
+
+    baseline = None
+    for shards in [int(count) for count in args.shards.split(',')]:
+        rate, ingress_cpu, routed, broadcasts, forwarded = asyncio.run(run(args, shards, bodies))
+        baseline = baseline or rate
+        print(f"shards={shards:<2} {rate:8.0f} upd/s  x{rate / baseline:4.2f}  "
+              f"ingress {ingress_cpu * 1e6:5.1f} us/update  routed={routed}  "
+              f"config broadcasts={broadcasts}  forwarded buys={forwarded}")
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,88 @@
+"""Signal-to-signed-tx latency of SnipeExecutor against a local JSON-RPC stand-in.
+
+Compares the prepared path (local nonces, cached fees, calldata template,
+direct type-2 signing) with building every swap from scratch through
+eth-account and per-signal RPC lookups.
+
+    python -m bench.bench_snipe --signals 200 --latency 0.03
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from eth_account import Account
+from eth_abi import encode
+from eth_utils import keccak
+
+from bench.fake_rpc import FakeRpcServer
+from chain.execution import BASE_CHAIN_ID, BASE_UNISWAP_V2_ROUTER, BASE_WETH, SnipeExecutor, WEI_PER_ETH
+from chain.rpc import JsonRpcClient
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda pct: samples[min(len(samples) - 1, int(len(samples) * pct / 100))] * 1000
+    return f"p50={pick(50):7.2f}ms  p99={pick(99):7.2f}ms"
+
+
+async def naive_swap(rpc, account, token, eth_amount):
+    """Per-signal nonce and fee lookups, full ABI encoding and eth-account signing."""
+    nonce = int(await rpc.call('eth_getTransactionCount', [account.address, 'pending']), 16)
+    block = await rpc.call('eth_getBlockByNumber', ['latest', False])
+    tip = int(await rpc.call('eth_maxPriorityFeePerGas'), 16)
+    data = keccak(text='swapExactETHForTokensSupportingFeeOnTransferTokens(uint256,address[],address,uint256)')[:4] \
+        + encode(['uint256', 'address[]', 'address', 'uint256'],
+                 [0, [BASE_WETH, token], account.address, int(time.time()) + 120])
+    signed = account.sign_transaction({
+        'type': 2, 'chainId': BASE_CHAIN_ID, 'nonce': nonce, 'to': BASE_UNISWAP_V2_ROUTER,
+        'value': int(eth_amount * WEI_PER_ETH), 'gas': 350_000, 'data': data,
+        'maxFeePerGas': int(block['baseFeePerGas'], 16) * 2 + tip, 'maxPriorityFeePerGas': tip,
+    })
+    return signed
+
+
+async def run(args):
+    server = FakeRpcServer(latency=args.latency)
+    url = await server.start()
+    rpc = JsonRpcClient(url)
+    key = os.urandom(32)
+    tokens = ['0x' + os.urandom(20).hex() for _ in range(args.signals)]
+
+    account = Account.from_key(key)
+    naive = []
+    for token in tokens:
+        started = time.perf_counter()
+        await naive_swap(rpc, account, token, 0.1)
+        naive.append(time.perf_counter() - started)
+
+    executor = SnipeExecutor(rpc, key)
+    await executor.start()
+    built, sent = [], []
+    for token in tokens:
+        started = time.perf_counter()
+        swap = executor.build(token, 0.1)
+        built.append(time.perf_counter() - started)
+        await executor.send(swap)
+        sent.append(time.perf_counter() - started)
+    await executor.stop()
+
+    print(f"from scratch, signal->signed tx:   {percentiles(naive)}")
+    print(f"prepared,     signal->signed tx:   {percentiles(built)}")
+    print(f"prepared,     signal->broadcast:   {percentiles(sent)}")
+    print(f"nonces in order: {server.nonce_of(executor.address) == args.signals}, txs accepted: {len(server.sent)}")
+    await rpc.close()
+    await server.stop()
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--signals', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.03, help='simulated RPC round-trip')
+    logging.disable(logging.INFO)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,68 @@
+"""Measure /start handler latency under concurrent load.
+
+Compares the old synchronous UserRepository (blocking the event loop) with
+AsyncUserRepository, both backed by an in-memory collection that simulates a
+Mongo round-trip.
+
+    python -m bench.bench_start_latency --users 200 --latency 0.002
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from types import SimpleNamespace
+
+import main
+from bench.fakes import AsyncFakeCollection, FakeCollection, fake_update
+from constants import State
+from repo.user import UserRepository
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def sync_start(update, context):
+    """The pre-async /start handler: blocking initiate_doc inside the loop."""
+    sync_repo.initiate_doc(tg_id=update.message.from_user.id)
+    return await main.menus.show(update, context, State.SELECTING_CONFIG)
+
+
+async def timed(handler, update, context, started):
+    await handler(update, context)
+    return time.perf_counter() - started
+
+
+async def run(handler, users: int):
+    context = SimpleNamespace(user_data={})
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(timed(handler, fake_update(uid), context, started)
+                                       for uid in range(users)))
+    return time.perf_counter() - started, latencies
+
+
+def report(name, wall, latencies):
+    print(f"{name:<6} wall={wall * 1000:8.1f}ms  p50={percentile(latencies, 50) * 1000:8.1f}ms  "
+          f"p99={percentile(latencies, 99) * 1000:8.1f}ms  mean={statistics.mean(latencies) * 1000:8.1f}ms")
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.002, help='simulated Mongo round-trip in seconds')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    global sync_repo
+    sync_repo = UserRepository()
+    sync_repo.collection = FakeCollection(args.latency)
+    report('sync', *asyncio.run(run(sync_start, args.users)))
+
+    main.user_repo.collection = AsyncFakeCollection(args.latency)
+    report('async', *asyncio.run(run(main.start, args.users)))
+
+
+if __name__ == '__main__':
+    main_bench()
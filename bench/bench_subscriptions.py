@@ -0,0 +1,120 @@
+"""Group message fan-out with 10k users across 1k groups: the in-memory subscription index
+against a DB query per message, and batched subscriber evaluation against per-subscriber checks.
+
+    python -m bench.bench_subscriptions --users 10000 --groups 1000 --per-user 10
+
+Group popularity is skewed (Zipf-like), so a few groups have most of the
+subscribers. The DB variant runs subscribers_query on the in-memory fake with
+a simulated round trip.
+"""
+import argparse
+import asyncio
+import functools
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+from bench.bench_app import subscriber_doc
+from bench.fakes import AsyncFakeCollection
+from repo.config_cache import build_user_config
+from repo.user import AsyncUserRepository
+from signals.access import AccessIndex
+from signals.active_hours import ActiveHoursScheduler, compile_slots
+from signals.subscriptions import SubscriptionIndex
+
+
+def per_subscriber(index: SubscriptionIndex, group: str, sender: int, hours: ActiveHoursScheduler,
+                   access: AccessIndex) -> list:
+    """The checks echo made for its single user, repeated for every subscriber."""
+    subscribers = index.subscribers(group)
+    if subscribers is None:
+        return []
+    return [(tg_id, limit) for tg_id, limit in zip(subscribers.ids, subscribers.eth_limits)
+            if hours.is_armed(tg_id) and access.allows((tg_id, group), sender)]
+
+
+async def run(args):
+    rng = random.Random(11)
+    groups = [-1000 - group for group in range(args.groups)]
+    weights = [1 / (rank + 1) for rank in range(args.groups)]
+    docs = []
+    for tg_id in range(1, args.users + 1):
+        chosen = set()
+        while len(chosen) < args.per_user:
+            chosen.add(rng.choices(groups, weights)[0])
+        docs.append(subscriber_doc(tg_id, chosen, eth_limit=round(rng.uniform(0.01, 0.5), 2)))
+
+    repo = AsyncUserRepository()
+    repo.collection = AsyncFakeCollection()
+    await repo.insert_many(docs)
+    await repo.ensure_indexes()
+
+    index = SubscriptionIndex()
+    access = AccessIndex()
+    hours = ActiveHoursScheduler(clock=lambda: datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc))
+    started = time.perf_counter()
+    for doc in await repo.find_with_groups():
+        config = build_user_config(doc)
+        index.sync_user(doc['tg_id'], config)
+    elapsed = time.perf_counter() - started
+    stats = index.stats()
+    memory = sum(sys.getsizeof(subscribers.ids) + sys.getsizeof(subscribers.eth_limits)
+                 for subscribers in index._groups.values())
+    sizes = sorted((len(index.subscribers(str(group)) or ()) for group in groups), reverse=True)
+    print(f"index: {stats['users']} users, {stats['groups']} groups, {stats['subscriptions']} subscriptions "
+          f"built in {elapsed * 1000:.0f} ms; record arrays {memory / 2 ** 20:.2f} MiB; "
+          f"subscribers per group max={sizes[0]} median={sizes[len(sizes) // 2]}")
+
+    # Some rules about the senders, and some users outside their active hours
+    senders = list(range(10_000_000, 10_000_200))
+    for sender in senders:
+        access.observe(sender, f'caller{sender}')
+    for tg_id in rng.sample(range(1, args.users + 1), args.users // 5):
+        for group in rng.sample(list(index.groups_of(tg_id)), 2):
+            access.deny_handle((tg_id, group), f'@caller{rng.choice(senders)}')
+    for tg_id in rng.sample(range(1, args.users + 1), args.users // 10):
+        hours.set_window(tg_id, compile_slots('00:00 - 06:00'))
+
+    messages = [(str(rng.choices(groups, weights)[0]), rng.choice(senders)) for _ in range(args.messages)]
+    for name, evaluate in (('per-subscriber checks', functools.partial(per_subscriber, index)), ('batched select', index.select)):
+        started = time.perf_counter()
+        delivered = sum(len(evaluate(group, sender, hours, access)) for group, sender in messages)
+        elapsed = time.perf_counter() - started
+        print(f"{name:<22} {len(messages) / elapsed:10,.0f} msgs/s  {elapsed / len(messages) * 1e6:7.1f} us/msg  "
+              f"{elapsed / delivered * 1e9:6.0f} ns/recipient  ({delivered / len(messages):.0f} recipients/msg)")
+
+    repo.collection.latency = args.latency
+    sample = messages[:args.db_messages]
+    started = time.perf_counter()
+    found = 0
+    for group, _ in sample:
+        found += len(await repo.find_subscribers(group))
+    elapsed = time.perf_counter() - started
+    print(f"{'DB query per message':<22} {len(sample) / elapsed:10,.0f} msgs/s  "
+          f"{elapsed / len(sample) * 1e6:7.1f} us/msg  ({found / len(sample):.0f} subscribers/msg, "
+          f"before any filtering)")
+
+    changes = [(rng.randrange(1, args.users + 1), str(rng.choice(groups)), rng.choice([0.0, 0.2])) for _ in range(20_000)]
+    started = time.perf_counter()
+    for tg_id, group, limit in changes:
+        config = build_user_config({'groups': {group: {'eth_limit': limit}}})
+        index.sync_user(tg_id, config)
+    elapsed = time.perf_counter() - started
+    print(f"sync_user (settings changes): {len(changes) / elapsed:,.0f}/s incl. build_user_config")
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--groups', type=int, default=1_000)
+    parser.add_argument('--per-user', type=int, default=10, help='groups each user subscribes to')
+    parser.add_argument('--messages', type=int, default=20_000)
+    parser.add_argument('--db-messages', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.0005, help='simulated round trip of the fake')
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,84 @@
+"""RPC load of repeated shills: reading every signal vs TokenCache.
+
+Signals arrive at a fixed rate and draw their token from a skewed pool, so the
+same address turns up in several groups within seconds, often concurrently. A
+share of the pool is dead (no contract or no liquidity). The RPC stand-in adds
+a fixed latency per round-trip.
+
+    python -m bench.bench_token_cache --signals 2000 --tokens 100 --rate 400
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+
+from bench.fake_rpc import FakeRpcServer
+from chain.rpc import JsonRpcClient
+from chain.token_cache import TokenCache
+from chain.tokens import TokenReader
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda pct: samples[min(len(samples) - 1, int(len(samples) * pct / 100))] * 1000
+    return f"p50={pick(50):6.1f}ms  p99={pick(99):6.1f}ms"
+
+
+async def run(name, args, pool, signals, cached):
+    server = FakeRpcServer(latency=args.latency)
+    for index, token in enumerate(pool):
+        if index % 10 == 8:
+            continue  # not a contract
+        if index % 10 == 9:
+            server.add_token(token)  # deployed, no pair yet
+        else:
+            server.add_token(token, reserve_token=10 ** 26, reserve_weth=5 * 10 ** 18)
+    reader = TokenReader(JsonRpcClient(await server.start()))
+    cache = TokenCache(reader)
+    lookup = cache.get if cached else reader.read
+    latencies = []
+
+    async def signal(token):
+        started = time.perf_counter()
+        await lookup(token)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    tasks = []
+    for token in signals:
+        tasks.append(asyncio.create_task(signal(token)))
+        await asyncio.sleep(1 / args.rate)
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - started
+    await reader.rpc.close()
+    await server.stop()
+    print(f"{name:<8} rpc calls={server.calls:6d}  round-trips={server.round_trips:5d}  "
+          f"wall={wall:5.2f}s  {percentiles(latencies)}")
+    if cached:
+        stats = cache.stats()
+        print(f"         hit rate={stats['hit_rate']:.1%}  coalesced={stats['coalesced']}  "
+              f"negative hits={stats['negative_hits']}  full reads={stats['full_reads']}  "
+              f"volatile reads={stats['volatile_reads']}  rpc calls saved={stats['rpc_calls_saved']}")
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--signals', type=int, default=2000)
+    parser.add_argument('--tokens', type=int, default=100)
+    parser.add_argument('--rate', type=float, default=400.0, help='signals per second')
+    parser.add_argument('--latency', type=float, default=0.03, help='RPC round-trip latency in seconds')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    random.seed(7)
+    pool = ['0x' + os.urandom(20).hex() for _ in range(args.tokens)]
+    weights = [1 / (rank + 1) for rank in range(args.tokens)]
+    signals = random.choices(pool, weights, k=args.signals)
+
+    asyncio.run(run('uncached', args, pool, signals, cached=False))
+    asyncio.run(run('cached', args, pool, signals, cached=True))
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,133 @@
+"""UserRepository at scale: lookup latency with and without the tg_id index, and write throughput
+of the menu mutations applied one by one versus write-behind bulk writes.
+
+Against a real server (recommended; uses and drops the bench.users collection):
+
+    python -m bench.bench_user_repo --mongo localhost:27017 --users 1000000
+
+Without --mongo it runs on the in-memory fake with a simulated round trip,
+which shows the round-trip savings but not the server's own costs.
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import List
+
+from bench.fakes import AsyncFakeCollection
+from repo.user import AsyncUserRepository
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def make_repo(args, write_behind: float = 0.0) -> AsyncUserRepository:
+    if args.mongo:
+        host, port = args.mongo.split(':')
+        return AsyncUserRepository('bench', 'users', host, int(port), write_behind=write_behind)
+    return AsyncUserRepository(write_behind=write_behind)
+
+
+async def timed_lookups(repo: AsyncUserRepository, ids: List[int]) -> List[float]:
+    samples = []
+    for tg_id in ids:
+        started = time.perf_counter()
+        await repo.find_by_tg_id(tg_id)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def report_lookups(name: str, samples: List[float]):
+    print(f"{name:<22} lookups={len(samples):6d}  p50={percentile(samples, 50) * 1000:8.3f}ms  "
+          f"p99={percentile(samples, 99) * 1000:8.3f}ms")
+
+
+async def mutations(repo: AsyncUserRepository, args, rng: random.Random) -> float:
+    """Menu-like changes from a pool of active users, `concurrency` at a time; returns ops/s."""
+    active = [rng.randrange(args.users) for _ in range(args.active)]
+    queue = asyncio.Queue()
+    for index in range(args.writes):
+        queue.put_nowait(index)
+
+    async def worker():
+        while not queue.empty():
+            index = queue.get_nowait()
+            tg_id = active[index % len(active)]
+            kind = index % 5
+            if kind == 0:
+                await repo.initiate_doc(tg_id)
+            elif kind == 1:
+                await repo.set_group_value(tg_id, 'Group1', 'eth_limit', round(0.01 * (index % 50 + 1), 2))
+            elif kind == 2:
+                await repo.add_to_blacklist(tg_id, 'Group1', f'@spam{index % 7}')
+            elif kind == 3:
+                await repo.remove_from_blacklist(tg_id, 'Group1', f'@spam{(index + 3) % 7}')
+            else:
+                await repo.set_timings(tg_id, f'{index % 24:02d}:00 - 23:59')
+
+    repo.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    await repo.stop()
+    return args.writes / (time.perf_counter() - started)
+
+
+async def run(args):
+    rng = random.Random(7)
+    repo = make_repo(args)
+    if args.mongo:
+        await repo.collection.drop()
+    else:
+        repo.collection = AsyncFakeCollection(args.latency)
+
+    started = time.perf_counter()
+    for first in range(0, args.users, args.chunk):
+        await repo.insert_many([{'tg_id': tg_id, 'status': 'started', 'timings': '00:00 - 00:00'}
+                                for tg_id in range(first, min(first + args.chunk, args.users))])
+    elapsed = time.perf_counter() - started
+    print(f"seeded {args.users} users in {elapsed:.1f}s ({args.users / elapsed:,.0f} docs/s)")
+
+    lookups = [rng.randrange(args.users) for _ in range(args.lookups)]
+    report_lookups('no index (scan)', await timed_lookups(repo, lookups[:args.scan_lookups]))
+    started = time.perf_counter()
+    await repo.ensure_indexes()
+    print(f"ensure_indexes         {time.perf_counter() - started:.2f}s, again: ", end='')
+    started = time.perf_counter()
+    await repo.ensure_indexes()
+    print(f"{(time.perf_counter() - started) * 1000:.1f}ms")
+    report_lookups('tg_id_unique index', await timed_lookups(repo, lookups))
+
+    collection = repo.collection
+    for name, write_behind in (('one by one', 0.0), (f'write-behind {args.interval}s', args.interval)):
+        writer = make_repo(args, write_behind)
+        writer.collection = collection
+        round_trips = collection.calls if not args.mongo else None
+        rate = await mutations(writer, args, rng)
+        trips = f"  round trips={collection.calls - round_trips}" if round_trips is not None else ''
+        print(f"{name:<22} {rate:10,.0f} ops/s  {writer.write_stats()}{trips}")
+
+    if args.mongo:
+        await collection.drop()
+        await repo.close()
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mongo', help='host:port of a MongoDB server; in-memory fake when omitted')
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--chunk', type=int, default=10_000)
+    parser.add_argument('--lookups', type=int, default=10_000)
+    parser.add_argument('--scan-lookups', type=int, default=20)
+    parser.add_argument('--writes', type=int, default=50_000)
+    parser.add_argument('--active', type=int, default=5_000, help='users changing settings')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--interval', type=float, default=0.05, help='write-behind flush interval')
+    parser.add_argument('--latency', type=float, default=0.0005, help='simulated round trip of the fake')
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main_bench()
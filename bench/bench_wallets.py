@@ -0,0 +1,106 @@
+"""Wallet Generate: generating the scrypt keystore inline in the handler against handing out
+a wallet from the pre-generated WalletPool, with the event-loop stall each one causes.
+
+    python -m bench.bench_wallets --presses 8 --workers 2
+
+The stall is measured by a task that sleeps 1 ms in a loop: its largest
+oversleep is the longest time no other update could be handled. Inline
+generation is measured with the scrypt work factor the pool uses.
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import List
+
+from bench.fakes import AsyncFakeCollection
+from chain.wallets import WalletPool, generate_wallet
+from repo.wallet import AsyncWalletRepository
+
+
+class StallMonitor:
+    """Largest and p99 oversleep of a 1 ms ticker while active."""
+
+    def __init__(self, tick: float = 0.001):
+        self.tick = tick
+        self.lags: List[float] = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.tick)
+            self.lags.append(time.perf_counter() - started - self.tick)
+
+    def __enter__(self):
+        self.lags = []
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+    def report(self) -> str:
+        lags = sorted(self.lags) or [0.0]
+        return f"stall max={lags[-1] * 1000:7.1f}ms p99={lags[int(len(lags) * 0.99)] * 1000:6.1f}ms"
+
+
+async def run(args):
+    iterations = args.iterations
+    password = 'bench'
+
+    with StallMonitor() as monitor:
+        await asyncio.sleep(0.01)
+        started = time.perf_counter()
+        latencies = []
+        for _ in range(args.presses):
+            pressed = time.perf_counter()
+            generate_wallet(password, iterations)
+            latencies.append(time.perf_counter() - pressed)
+            # Each press is its own update; let the loop run in between
+            await asyncio.sleep(0.002)
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0.01)
+    print(f"inline      {args.presses / elapsed:6.2f} wallets/s  per press {sum(latencies) / len(latencies) * 1000:7.1f}ms  "
+          f"{monitor.report()}")
+
+    repo = AsyncWalletRepository()
+    repo.collection = AsyncFakeCollection(args.mongo_latency)
+    await repo.ensure_indexes()
+    pool = WalletPool(repo, password, size=args.presses, workers=args.workers, iterations=iterations)
+    with StallMonitor() as monitor:
+        started = time.perf_counter()
+        await pool.start()
+        while len(pool) < args.presses:
+            await asyncio.sleep(0.005)
+        elapsed = time.perf_counter() - started
+    print(f"pool refill {args.presses / elapsed:6.2f} wallets/s  ({args.workers} worker processes, "
+          f"{os.cpu_count()} CPUs)                 {monitor.report()}")
+
+    with StallMonitor() as monitor:
+        latencies = []
+        for user in range(args.presses):
+            pressed = time.perf_counter()
+            await pool.take(user)
+            latencies.append(time.perf_counter() - pressed)
+        # The pool is now empty; keep measuring while it refills in the background
+        while len(pool) < args.presses:
+            await asyncio.sleep(0.005)
+    latencies.sort()
+    print(f"pool take   per press p50={latencies[len(latencies) // 2] * 1000:.2f}ms max={latencies[-1] * 1000:.2f}ms "
+          f"(one conditional update), during refill {monitor.report()}")
+    await pool.stop()
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--presses', type=int, default=8, help='Wallet Generate presses (and pool size)')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 1)))
+    parser.add_argument('--iterations', type=int, default=None, help="scrypt n; eth-keyfile's 2**18 when omitted")
+    parser.add_argument('--mongo-latency', type=float, default=0.0005)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,161 @@
+"""Local JSON-RPC stand-in for an EVM node, used by the chain benchmarks and tests.
+
+Serves single and batch requests over aiohttp with an injectable latency per
+HTTP round-trip, and counts round-trips and individual calls. Tokens added
+with add_token() answer decimals(), totalSupply(), getReserves() on their
+Uniswap V2 pair, Multicall3 aggregate3() and the factory's PairCreated log.
+"""
+import asyncio
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+import rlp
+from aiohttp import web
+from eth_abi import decode, encode
+from eth_keys import keys
+from eth_utils import keccak, to_checksum_address
+
+from chain.tokens import (AGGREGATE3, DECIMALS, GET_RESERVES, MULTICALL3, PAIR_CREATED_TOPIC, TOTAL_SUPPLY,
+                          pair_for)
+
+
+def sender_of(raw: bytes) -> str:
+    """The address that signed a raw EIP-1559 transaction."""
+    fields = rlp.decode(raw[1:])
+    v, r, s = (int.from_bytes(field, 'big') for field in fields[9:12])
+    signature = keys.Signature(vrs=(v, r, s))
+    return signature.recover_public_key_from_msg_hash(keccak(b'\x02' + rlp.encode(fields[:9]))).to_checksum_address()
+
+
+class FakeRpcServer:
+    def __init__(self, latency: float = 0.0, base_fee: int = 10 ** 8, tip: int = 10 ** 6, start_nonce: int = 0,
+                 fail: bool = False):
+        self.latency = latency
+        self.base_fee = base_fee
+        self.tip = tip
+        self.fail = fail
+        self.block_number = 1_000_000
+        # Every account's nonce is at least `nonce`; accounts that sent are tracked by address
+        self.nonce = start_nonce
+        self.nonces: Dict[str, int] = {}
+        self.sent: List[bytes] = []
+        self.round_trips = 0
+        self.calls = 0
+        self.contracts: Dict[str, Dict[bytes, bytes]] = {}
+        self.pair_logs: Dict[tuple, dict] = {}
+        self.methods: Dict[str, Callable[[List[Any]], Any]] = {
+            'eth_chainId': lambda params: hex(8453),
+            'eth_blockNumber': lambda params: hex(self.block_number),
+            'eth_getTransactionCount': lambda params: hex(self.nonce_of(params[0])),
+            'eth_maxPriorityFeePerGas': lambda params: hex(self.tip),
+            'eth_getBlockByNumber': lambda params: {'number': hex(self.block_number),
+                                                    'baseFeePerGas': hex(self.base_fee)},
+            'eth_sendRawTransaction': self._send_raw,
+            'eth_call': self._eth_call,
+            'eth_getLogs': self._get_logs,
+        }
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ''
+
+    def nonce_of(self, address: str) -> int:
+        return max(self.nonce, self.nonces.get(address.lower(), 0))
+
+    def _send_raw(self, params: List[Any]) -> str:
+        raw = bytes.fromhex(params[0][2:])
+        sender = sender_of(raw)
+        nonce = int.from_bytes(rlp.decode(raw[1:])[1], 'big')
+        if nonce < self.nonce_of(sender):
+            raise ValueError('nonce too low')
+        self.nonces[sender.lower()] = nonce + 1
+        self.sent.append(raw)
+        return '0x' + keccak(raw).hex()
+
+    def add_token(self, token: str, decimals: int = 18, total_supply: int = 10 ** 27, reserve_token: int = 0,
+                  reserve_weth: int = 0, created_block: Optional[int] = None):
+        """Deploy a token and, when reserves are given, its WETH pair."""
+        self.contracts[to_checksum_address(token)] = {DECIMALS: encode(['uint8'], [decimals]),
+                                                      TOTAL_SUPPLY: encode(['uint256'], [total_supply])}
+        if reserve_token or reserve_weth:
+            pair, token0, token1 = pair_for(token)
+            reserves = (reserve_token, reserve_weth)
+            if token0 != bytes.fromhex(token[2:]):
+                reserves = reserves[::-1]
+            self.contracts[pair] = {GET_RESERVES: encode(['uint112', 'uint112', 'uint32'], [*reserves, 0])}
+            block = created_block if created_block is not None else self.block_number
+            self.pair_logs[('0x' + token0.rjust(32, b'\0').hex(), '0x' + token1.rjust(32, b'\0').hex())] = {
+                'address': pair, 'blockNumber': hex(block), 'topics': [PAIR_CREATED_TOPIC]}
+
+    def _static_call(self, to: str, data: bytes) -> bytes:
+        if to_checksum_address(to) == MULTICALL3 and data[:4] == AGGREGATE3:
+            results = []
+            for target, allow_failure, call_data in decode(['(address,bool,bytes)[]'], data[4:])[0]:
+                try:
+                    results.append((True, self._static_call(target, call_data)))
+                except ValueError:
+                    if not allow_failure:
+                        raise
+                    results.append((False, b''))
+            return encode(['(bool,bytes)[]'], [results])
+        contract = self.contracts.get(to_checksum_address(to))
+        if contract is None:
+            return b''
+        if data[:4] not in contract:
+            raise ValueError('execution reverted')
+        return contract[data[:4]]
+
+    def _eth_call(self, params: List[Any]) -> str:
+        call = params[0]
+        return '0x' + self._static_call(call['to'], bytes.fromhex(call.get('data', '0x')[2:])).hex()
+
+    def _get_logs(self, params: List[Any]) -> List[dict]:
+        topics = params[0].get('topics') or []
+        if len(topics) < 3 or topics[0] != PAIR_CREATED_TOPIC:
+            return []
+        log = self.pair_logs.get((topics[1], topics[2]))
+        # Block tags such as 'earliest' and 'latest' leave that end of the range open
+        start, end = (params[0].get(key) or '' for key in ('fromBlock', 'toBlock'))
+        block = int(log['blockNumber'], 16) if log else None
+        if block is None or start.startswith('0x') and block < int(start, 16) \
+                or end.startswith('0x') and block > int(end, 16):
+            return []
+        return [log]
+
+    def _answer(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls += 1
+        handler = self.methods.get(request.get('method'))
+        if handler is None:
+            return {'jsonrpc': '2.0', 'id': request.get('id'),
+                    'error': {'code': -32601, 'message': f"method not found: {request.get('method')}"}}
+        try:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': handler(request.get('params') or [])}
+        except Exception as error:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': -32000, 'message': str(error)}}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.round_trips += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail:
+            return web.Response(status=503)
+        payload = json.loads(await request.read())
+        if isinstance(payload, list):
+            body = [self._answer(item) for item in payload]
+        else:
+            body = self._answer(payload)
+        return web.json_response(body)
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_post('/', self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f'http://{host}:{port}/'
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,458 @@
+"""In-process stand-ins for MongoDB and the Telegram Bot API used by the benchmarks and tests.
+
+Each fake adds an optional per-call latency so round-trip cost can be
+simulated without a real server.
+"""
+import asyncio
+import collections
+import copy
+import itertools
+import json
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
+from telegram.error import RetryAfter
+from telegram.request import BaseRequest, RequestData
+
+
+def _matches(document: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    for key, expected in query.items():
+        value = document
+        for part in key.split('.'):
+            value = value.get(part) if isinstance(value, dict) else None
+        if isinstance(expected, dict) and '$in' in expected:
+            if value not in expected['$in']:
+                return False
+        elif isinstance(expected, dict) and '$exists' in expected:
+            if (value is not None) != expected['$exists']:
+                return False
+        elif isinstance(expected, dict) and '$gt' in expected:
+            if value is None or not value > expected['$gt']:
+                return False
+        elif isinstance(value, list) and not isinstance(expected, list):
+            if expected not in value:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+def _set_path(document: Dict[str, Any], key: str, value: Any):
+    parts = key.split('.')
+    for part in parts[:-1]:
+        document = document.setdefault(part, {})
+    document[parts[-1]] = value
+
+
+def _get_path(document: Dict[str, Any], key: str) -> Any:
+    for part in key.split('.'):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(part)
+    return document
+
+
+def _unset_path(document: Dict[str, Any], key: str):
+    parts = key.split('.')
+    for part in parts[:-1]:
+        document = document.get(part)
+        if not isinstance(document, dict):
+            return
+    document.pop(parts[-1], None)
+
+
+def _apply_update(document: Dict[str, Any], update: Dict[str, Any]) -> bool:
+    before = copy.deepcopy(document)
+    for key, value in update.get('$set', {}).items():
+        _set_path(document, key, copy.deepcopy(value))
+    for key in update.get('$unset', {}):
+        _unset_path(document, key)
+    for key, value in update.get('$addToSet', {}).items():
+        current = _get_path(document, key)
+        if current is None:
+            current = []
+            _set_path(document, key, current)
+        items = value['$each'] if isinstance(value, dict) and '$each' in value else [value]
+        for item in items:
+            if item not in current:
+                current.append(item)
+    for key, value in update.get('$pull', {}).items():
+        current = _get_path(document, key)
+        removed = value['$in'] if isinstance(value, dict) and '$in' in value else [value]
+        if isinstance(current, list):
+            current[:] = [item for item in current if item not in removed]
+    return document != before
+
+
+class _Store:
+    """Shared document store behind the sync and async fake collections."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.documents: List[Dict[str, Any]] = []
+        self.indexes: Dict[str, Dict[str, Any]] = {}
+        self.calls = 0
+        self._next_id = 0
+        # Single top-level field indexes: field -> value -> documents, so equality lookups skip the scan
+        self._lookup: Dict[str, Dict[Any, List[Dict[str, Any]]]] = {'_id': {}}
+        self._unique: set = {'_id'}
+
+    def _new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def _find(self, query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        for field, expected in query.items():
+            if field in self._lookup and not isinstance(expected, dict):
+                candidates = self._lookup[field].get(expected, [])
+                return [doc for doc in candidates if _matches(doc, query)]
+        return [doc for doc in self.documents if _matches(doc, query)]
+
+    def _add(self, document: Dict[str, Any]):
+        for field, lookup in self._lookup.items():
+            if field in document:
+                existing = lookup.setdefault(document[field], [])
+                if existing and field in self._unique:
+                    raise DuplicateKeyError(f"E11000 duplicate key error: {field}: {document[field]!r}")
+                existing.append(document)
+        self.documents.append(document)
+
+    def _reindex(self):
+        for field in self._lookup:
+            self._lookup[field] = {}
+            for document in self.documents:
+                if field in document:
+                    self._lookup[field].setdefault(document[field], []).append(document)
+
+    def _insert(self, documents: List[Dict[str, Any]]) -> List[Any]:
+        ids = []
+        for document in documents:
+            document.setdefault('_id', self._new_id())
+            self._add(copy.deepcopy(document))
+            ids.append(document['_id'])
+        return ids
+
+    def _find_one(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        found = self._find(query)
+        return copy.deepcopy(found[0]) if found else None
+
+    def _update(self, query, update, upsert: bool, many: bool):
+        matched = self._find(query)
+        if not many:
+            matched = matched[:1]
+        indexed = [(doc, [doc.get(field) for field in self._lookup]) for doc in matched]
+        modified = sum(_apply_update(doc, update) for doc in matched)
+        if any([doc.get(field) for field in self._lookup] != values for doc, values in indexed):
+            self._reindex()
+        upserted_id = None
+        if not matched and upsert:
+            document = {k: v for k, v in query.items() if not isinstance(v, dict)}
+            upserted_id = document.setdefault('_id', self._new_id())
+            _apply_update(document, update)
+            for key, value in update.get('$setOnInsert', {}).items():
+                _set_path(document, key, copy.deepcopy(value))
+            self._add(document)
+        return SimpleNamespace(matched_count=len(matched), modified_count=modified,
+                               upserted_id=upserted_id)
+
+    def _delete(self, query, many: bool):
+        found = self._find(query)
+        if not many:
+            found = found[:1]
+        ids = {id(doc) for doc in found}
+        self.documents = [doc for doc in self.documents if id(doc) not in ids]
+        if found and self._lookup:
+            self._reindex()
+        return SimpleNamespace(deleted_count=len(found))
+
+    def _create_index(self, keys, unique: bool = False, name: Optional[str] = None) -> str:
+        name = name or '_'.join(f'{field}_{direction}' for field, direction in keys)
+        if self.indexes.get(name) == {'key': keys, 'unique': unique}:
+            return name
+        self.indexes[name] = {'key': keys, 'unique': unique}
+        if len(keys) == 1 and '.' not in keys[0][0] and keys[0][1] == 1:
+            field = keys[0][0]
+            if unique:
+                self._unique.add(field)
+            self._lookup[field] = {}
+            self._reindex()
+            if unique and any(len(docs) > 1 for docs in self._lookup[field].values()):
+                raise DuplicateKeyError(f"E11000 duplicate key error building index {name}")
+        return name
+
+    def _project(self, document: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if not projection:
+            return copy.deepcopy(document)
+        return {key: copy.deepcopy(document[key]) for key in ('_id', *projection) if key in document}
+
+    def _bulk_write(self, requests):
+        modified = upserted = 0
+        for request in requests:
+            result = self._update(request._filter, request._doc, request._upsert,
+                                  many=type(request).__name__ == 'UpdateMany')
+            modified += result.modified_count
+            upserted += result.upserted_id is not None
+        return SimpleNamespace(modified_count=modified, upserted_count=upserted)
+
+
+class FakeCursor:
+    """Result of find(): sort(), limit() and the async to_list() of a pymongo cursor, plus iteration."""
+
+    def __init__(self, documents: List[Dict[str, Any]], stored: Optional[List[Dict[str, Any]]] = None):
+        self.documents = documents
+        # The matched documents before projection, so sort() can use fields the projection leaves out
+        self.stored = stored if stored is not None else documents
+
+    def sort(self, key: str, direction: int = ASCENDING) -> 'FakeCursor':
+        order = sorted(range(len(self.documents)), key=lambda index: self.stored[index][key],
+                       reverse=direction == DESCENDING)
+        self.documents = [self.documents[index] for index in order]
+        self.stored = [self.stored[index] for index in order]
+        return self
+
+    def limit(self, limit: int) -> 'FakeCursor':
+        if limit:
+            self.documents = self.documents[:limit]
+            self.stored = self.stored[:limit]
+        return self
+
+    def __iter__(self):
+        return iter(self.documents)
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self.documents[:length] if length else list(self.documents)
+
+
+class FakeCollection(_Store):
+    """Synchronous in-memory collection mimicking the pymongo Collection API."""
+
+    def _round_trip(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def insert_one(self, document: Dict[str, Any]):
+        self._round_trip()
+        return SimpleNamespace(inserted_id=self._insert([document])[0])
+
+    def insert_many(self, documents: List[Dict[str, Any]]):
+        self._round_trip()
+        return SimpleNamespace(inserted_ids=self._insert(documents))
+
+    def find_one(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        self._round_trip()
+        return self._find_one(query)
+
+    def find(self, query: Dict[str, Any] = None, projection: Optional[Dict[str, Any]] = None) -> FakeCursor:
+        self._round_trip()
+        stored = self._find(query or {})
+        return FakeCursor([self._project(doc, projection) for doc in stored], stored)
+
+    def update_one(self, query, update, upsert: bool = False):
+        self._round_trip()
+        return self._update(query, update, upsert, many=False)
+
+    def update_many(self, query, update, upsert: bool = False):
+        self._round_trip()
+        return self._update(query, update, upsert, many=True)
+
+    def delete_one(self, query):
+        self._round_trip()
+        return self._delete(query, many=False)
+
+    def delete_many(self, query):
+        self._round_trip()
+        return self._delete(query, many=True)
+
+    def count_documents(self, query) -> int:
+        self._round_trip()
+        return len(self._find(query))
+
+    def create_index(self, keys, unique: bool = False, name: Optional[str] = None, **kwargs) -> str:
+        self._round_trip()
+        return self._create_index(keys, unique, name)
+
+    def bulk_write(self, requests, ordered: bool = True):
+        self._round_trip()
+        return self._bulk_write(requests)
+
+
+class AsyncFakeCollection(_Store):
+    """Asynchronous in-memory collection mimicking the AsyncCollection API."""
+
+    async def _round_trip(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def insert_one(self, document: Dict[str, Any]):
+        await self._round_trip()
+        return SimpleNamespace(inserted_id=self._insert([document])[0])
+
+    async def insert_many(self, documents: List[Dict[str, Any]]):
+        await self._round_trip()
+        return SimpleNamespace(inserted_ids=self._insert(documents))
+
+    async def find_one(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        await self._round_trip()
+        return self._find_one(query)
+
+    def find(self, query: Dict[str, Any] = None, projection: Optional[Dict[str, Any]] = None) -> FakeCursor:
+        # The round trip happens when the cursor is read; counted here as one call
+        self.calls += 1
+        stored = self._find(query or {})
+        return FakeCursor([self._project(doc, projection) for doc in stored], stored)
+
+    async def update_one(self, query, update, upsert: bool = False):
+        await self._round_trip()
+        return self._update(query, update, upsert, many=False)
+
+    async def update_many(self, query, update, upsert: bool = False):
+        await self._round_trip()
+        return self._update(query, update, upsert, many=True)
+
+    async def delete_one(self, query):
+        await self._round_trip()
+        return self._delete(query, many=False)
+
+    async def delete_many(self, query):
+        await self._round_trip()
+        return self._delete(query, many=True)
+
+    async def count_documents(self, query) -> int:
+        await self._round_trip()
+        return len(self._find(query))
+
+    async def create_index(self, keys, unique: bool = False, name: Optional[str] = None, **kwargs) -> str:
+        await self._round_trip()
+        return self._create_index(keys, unique, name)
+
+    async def bulk_write(self, requests, ordered: bool = True):
+        await self._round_trip()
+        return self._bulk_write(requests)
+
+
+class FakeMessage:
+    """Minimal stand-in for telegram.Message that records replies."""
+
+    def __init__(self, user_id: int, text: str = '/start', chat_type: str = 'private', chat_id: int = None):
+        self.from_user = SimpleNamespace(id=user_id, first_name=f'user{user_id}', username=f'user{user_id}')
+        self.chat = SimpleNamespace(id=chat_id if chat_id is not None else user_id, type=chat_type)
+        self.chat_id = self.chat.id
+        self.message_id = 1
+        self.text = text
+        self.caption = None
+        self.replies: List[str] = []
+
+    async def reply_text(self, text: str, **kwargs):
+        self.replies.append(text)
+
+
+def fake_update(user_id: int, text: str = '/start', chat_type: str = 'private', chat_id: int = None):
+    """Build an Update-like object carrying a single text message."""
+    return SimpleNamespace(message=FakeMessage(user_id, text, chat_type, chat_id),
+                           callback_query=None, effective_user=SimpleNamespace(id=user_id))
+
+
+class FakeBot:
+    """Stand-in for telegram.Bot: records every API call and can emulate flood control.
+
+    With flood_limit set, more than that many calls within one second raise
+    RetryAfter, the way Telegram answers with HTTP 429.
+    """
+
+    def __init__(self, latency: float = 0.0, flood_limit: int = 0, retry_after: int = 1):
+        self.latency = latency
+        self.flood_limit = flood_limit
+        self.retry_after = retry_after
+        self.calls: List[tuple] = []
+        self.rejected = 0
+        self._recent = collections.deque()
+
+    def __getattr__(self, method: str):
+        if method.startswith('_'):
+            raise AttributeError(method)
+
+        async def call(**kwargs):
+            now = time.monotonic()
+            if self.flood_limit:
+                while self._recent and now - self._recent[0] > 1.0:
+                    self._recent.popleft()
+                if len(self._recent) >= self.flood_limit:
+                    self.rejected += 1
+                    raise RetryAfter(self.retry_after)
+                self._recent.append(now)
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            self.calls.append((method, kwargs, time.monotonic()))
+            return SimpleNamespace(message_id=len(self.calls), **kwargs)
+
+        return call
+
+
+class FakeBotRequest(BaseRequest):
+    """In-process Bot API transport for a real Application: answers every method without any network.
+
+    Plugged in through ApplicationBuilder.request(). sendMessage and
+    editMessageText echo back a valid Message; everything else returns True.
+    """
+
+    BOT = {'id': 1, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Dict[str, int] = collections.Counter()
+        self._message_ids = itertools.count(1)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit('/', 1)[-1]
+        self.calls[api_method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = request_data.parameters if request_data is not None else {}
+        if api_method == 'getMe':
+            result: Any = self.BOT
+        elif api_method in ('sendMessage', 'editMessageText'):
+            chat_id = int(params.get('chat_id', 0))
+            result = {'message_id': int(params.get('message_id') or next(self._message_ids)), 'date': int(time.time()),
+                      'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'supergroup'},
+                      'from': self.BOT, 'text': params.get('text', '')}
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+_update_ids = itertools.count(1)
+
+
+def message_payload(user_id: int, text: str, chat_id: Optional[int] = None, chat_type: str = 'private') -> dict:
+    """Bot API update dict for a text message (a private message unless chat_id/chat_type say otherwise)."""
+    update_id = next(_update_ids)
+    chat = {'id': chat_id if chat_id is not None else user_id, 'type': chat_type}
+    if chat_type != 'private':
+        chat['title'] = f'group {chat["id"]}'
+    message = {'message_id': update_id, 'date': int(time.time()), 'chat': chat, 'text': text,
+               'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}', 'username': f'user{user_id}'}}
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+
+def callback_payload(user_id: int, data: str, message_id: int = 1) -> dict:
+    """Bot API update dict for an inline button press on one of the bot's menu messages."""
+    update_id = next(_update_ids)
+    sender = {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}', 'username': f'user{user_id}'}
+    menu = {'message_id': message_id, 'date': int(time.time()), 'chat': {'id': user_id, 'type': 'private'},
+            'from': FakeBotRequest.BOT, 'text': 'menu'}
+    query = {'id': str(update_id), 'from': sender, 'chat_instance': str(user_id), 'data': data, 'message': menu}
+    return {'update_id': update_id, 'callback_query': query}
@@ -0,0 +1,181 @@
+import logging
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple, Union
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import BadRequest
+from telegram.ext import BaseHandler, CallbackContext, CallbackQueryHandler, MessageHandler, filters
+
+from bot.outbound import OutboundDispatcher
+from constants import State
+
+logger = logging.getLogger(__name__)
+
+# A keyboard as rows of (label, callback_data) buttons; tuples, so a layout is hashable
+Rows = Tuple[Tuple[Tuple[str, str], ...], ...]
+Action = Callable[[Update, CallbackContext], Awaitable[Any]]
+
+
+@lru_cache(maxsize=1024)
+def markup(rows: Rows) -> Optional[InlineKeyboardMarkup]:
+    """The reply markup for a layout, built once per distinct layout (markups are immutable)."""
+    if not rows:
+        return None
+    return InlineKeyboardMarkup([[InlineKeyboardButton(label, callback_data=data) for label, data in row]
+                                 for row in rows])
+
+
+class Screen:
+    """One menu state: its text, its keyboard and where each of its buttons leads.
+
+    `text` and `keyboard` are fixed, or async callables of (update, context)
+    for content that depends on the user. `routes` maps a callback_data
+    pattern (a regex matched in full) either to the State it opens or to an
+    async action that runs first and returns the State to show; actions that
+    answer on their own return a State without a screen (ConversationHandler.END).
+    `on_text` handles typed input in this state and sends its own reply.
+    """
+
+    __slots__ = ('state', 'text', 'keyboard', 'routes', 'on_text')
+
+    def __init__(self, state: State, text: Union[str, Action], keyboard: Union[Rows, Action] = (),
+                 routes: Optional[Dict[str, Union[State, Action]]] = None, on_text: Optional[Action] = None):
+        self.state = state
+        self.text = text
+        self.keyboard = keyboard
+        self.routes = routes or {}
+        self.on_text = on_text
+
+
+class MenuEngine:
+    """Renders Screens through the outbound queue and builds the ConversationHandler states from them.
+
+    Every menu message the engine sends or edits is remembered by (chat_id,
+    message_id) with a hash of its text and layout. An edit that would leave
+    a message as it is, such as pressing the button of the screen on display,
+    is dropped instead of costing a Bot API call that Telegram rejects with
+    "message is not modified". The most recent `max_messages` messages are
+    remembered; an unknown message is always edited.
+    """
+
+    def __init__(self, screens: Iterable[Screen], dispatcher: Callable[[], OutboundDispatcher],
+                 parse_mode: Optional[str] = 'Markdown', skip_unchanged: bool = True, max_messages: int = 50000):
+        self.screens: Dict[State, Screen] = {}
+        for screen in screens:
+            if screen.state in self.screens:
+                raise ValueError(f"Two screens for {screen.state}")
+            self.screens[screen.state] = screen
+        for screen in self.screens.values():
+            for pattern, target in screen.routes.items():
+                if isinstance(target, State) and target not in self.screens:
+                    raise ValueError(f"Button {pattern!r} of {screen.state} leads to {target}, which has no screen")
+        # Looked up on every call, so a dispatcher swapped in later (shards, benchmarks) is used
+        self.dispatcher = dispatcher
+        self.parse_mode = parse_mode
+        self.skip_unchanged = skip_unchanged
+        self.max_messages = max_messages
+        self._shown: 'OrderedDict[Hashable, int]' = OrderedDict()
+        self.sent = 0
+        self.edited = 0
+        self.unchanged = 0
+
+    def states(self) -> Dict[State, List[BaseHandler]]:
+        """The `states` of a ConversationHandler: typed input first, then one handler per button."""
+        states = {}
+        for state, screen in self.screens.items():
+            handlers: List[BaseHandler] = []
+            if screen.on_text is not None:
+                handlers.append(MessageHandler(filters.TEXT & ~filters.COMMAND, screen.on_text))
+            handlers.extend(CallbackQueryHandler(self._route(target), pattern=f"^(?:{pattern})$")
+                            for pattern, target in screen.routes.items())
+            states[state] = handlers
+        return states
+
+    def _route(self, target: Union[State, Action]) -> Action:
+        async def navigate(update: Update, context: CallbackContext):
+            await update.callback_query.answer()
+            state = target if isinstance(target, State) else await target(update, context)
+            if state in self.screens:
+                await self.show(update, context, state)
+            return state
+        # Handler metrics are labelled by callback name
+        navigate.__name__ = navigate.__qualname__ = \
+            target.name.lower() if isinstance(target, State) else target.__name__
+        return navigate
+
+    async def render(self, update: Update, context: CallbackContext, state: State) -> Tuple[str, Rows]:
+        """The text and layout of a state's screen for this user."""
+        screen = self.screens[state]
+        text = screen.text if isinstance(screen.text, str) else await screen.text(update, context)
+        rows = screen.keyboard if isinstance(screen.keyboard, tuple) else await screen.keyboard(update, context)
+        return text, rows
+
+    async def show(self, update: Update, context: CallbackContext, state: State) -> State:
+        """Show a state's screen: edit the menu message of a button press, else reply with a new one."""
+        text, rows = await self.render(update, context, state)
+        if update.callback_query is not None:
+            self.edit(update.callback_query, text, rows)
+        else:
+            self.reply(update.message, text, rows)
+        return state
+
+    def reply(self, message: Any, text: str, rows: Rows = ()) -> Any:
+        """Send a new menu message in reply to `message`."""
+        fingerprint = hash((text, rows))
+        future = self.dispatcher().reply_to(message, text, **self._options(rows))
+        future.add_done_callback(lambda done: self._sent(done, fingerprint))
+        self.sent += 1
+        return future
+
+    def edit(self, query: Any, text: str, rows: Rows = ()) -> Optional[Any]:
+        """Edit the message of a button press; None when it already shows exactly this."""
+        key = (query.message.chat_id, query.message.message_id)
+        fingerprint = hash((text, rows))
+        if self.skip_unchanged and self._shown.get(key) == fingerprint:
+            self.unchanged += 1
+            return None
+        self._remember(key, fingerprint)
+        future = self.dispatcher().edit_query_message(query, text, **self._options(rows))
+        future.add_done_callback(lambda done: self._edited(done, key, fingerprint))
+        self.edited += 1
+        return future
+
+    def _options(self, rows: Rows) -> Dict[str, Any]:
+        options: Dict[str, Any] = {'parse_mode': self.parse_mode}
+        if rows:
+            options['reply_markup'] = markup(rows)
+        return options
+
+    def _remember(self, key: Hashable, fingerprint: int):
+        self._shown[key] = fingerprint
+        self._shown.move_to_end(key)
+        if len(self._shown) > self.max_messages:
+            self._shown.popitem(last=False)
+
+    def _sent(self, future: Any, fingerprint: int):
+        if future.cancelled() or future.exception() is not None:
+            return
+        message = future.result()
+        if message is not None:
+            self._remember((message.chat_id, message.message_id), fingerprint)
+
+    def _edited(self, future: Any, key: Hashable, fingerprint: int):
+        if future.cancelled():
+            error = None
+        else:
+            error = future.exception()
+            if error is None or (isinstance(error, BadRequest) and 'not modified' in str(error)):
+                return
+        # The message may not show what was remembered; forget it so the next edit goes through
+        if self._shown.get(key) == fingerprint:
+            del self._shown[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Counters: menu messages sent, edited, edits skipped as unchanged, and messages remembered."""
+        return {
+            'sent': self.sent,
+            'edited': self.edited,
+            'unchanged': self.unchanged,
+            'remembered': len(self._shown),
+        }
@@ -0,0 +1,266 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from enum import IntEnum
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set
+
+from telegram.error import RetryAfter
+
+from metrics import REGISTRY, TELEGRAM_SECONDS
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4096
+
+
+class Priority(IntEnum):
+    SNIPE = 0
+    NOTIFY = 1
+    MENU = 2
+
+
+class TokenBucket:
+    """Classic token bucket; delay() peeks, consume() spends a token."""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Seconds until a token is available."""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self._refill()
+        self.tokens -= 1
+
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class _Job:
+    __slots__ = ('priority', 'seq', 'method', 'chat_id', 'kwargs', 'future', 'created', 'coalesce_key')
+
+    def __init__(self, priority, seq, method, chat_id, kwargs, future, created, coalesce_key):
+        self.priority = priority
+        self.seq = seq
+        self.method = method
+        self.chat_id = chat_id
+        self.kwargs = kwargs
+        self.future = future
+        self.created = created
+        self.coalesce_key = coalesce_key
+
+    def __lt__(self, other: '_Job') -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+def _log_failure(future: asyncio.Future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Outbound Telegram call failed: {future.exception()!r}")
+
+
+class OutboundDispatcher:
+    """Single exit point for Bot API calls, shaped to Telegram's rate limits.
+
+    Calls are queued by priority lane and sent by one worker that spends a
+    global token (~30 msg/s) and a per-chat token per call. A chat that is out
+    of tokens, has a call in flight, or is waiting behind earlier calls is
+    parked without holding up other chats, which keeps per-chat order intact.
+    RetryAfter pauses sending for the requested time and re-queues the call;
+    handler coroutines never wait on any of this unless they await the
+    returned future. Notifications submitted with a coalesce_key are merged
+    into a still-queued message for the same chat within coalesce_window.
+    """
+
+    def __init__(self, bot: Any = None, global_rate: float = 30.0, chat_rate: float = 1.0,
+                 group_chat_rate: float = 20 / 60, chat_burst: float = 3.0,
+                 coalesce_window: float = 2.0, max_in_flight: int = 16,
+                 clock: Callable[[], float] = time.monotonic):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.group_chat_rate = group_chat_rate
+        self.chat_burst = chat_burst
+        self.coalesce_window = coalesce_window
+        self.max_in_flight = max_in_flight
+        self.clock = clock
+        self.global_bucket = TokenBucket(global_rate, global_rate, clock)
+        self._chat_buckets: Dict[Hashable, TokenBucket] = {}
+        self._heap: List[_Job] = []
+        self._seq = itertools.count()
+        self._parked: Dict[Hashable, List[_Job]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._busy: Set[Hashable] = set()
+        self._coalescing: Dict[tuple, _Job] = {}
+        self._in_flight: Set[asyncio.Task] = set()
+        self._paused_until = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.coalesced = 0
+        self.retries = 0
+
+    def __len__(self) -> int:
+        return len(self._heap) + sum(len(jobs) for jobs in self._parked.values())
+
+    def submit(self, method: str, chat_id: Hashable, priority: Priority = Priority.NOTIFY,
+               coalesce_key: Optional[Hashable] = None, **kwargs) -> asyncio.Future:
+        """Queue bot.<method>(chat_id=chat_id, **kwargs) and return a future for its result."""
+        now = self.clock()
+        if coalesce_key is not None:
+            job = self._coalescing.get((chat_id, coalesce_key))
+            if job is not None and now - job.created <= self.coalesce_window:
+                merged = f"{job.kwargs['text']}\n{kwargs['text']}"
+                if len(merged) <= MAX_MESSAGE_LENGTH:
+                    job.kwargs['text'] = merged
+                    self.coalesced += 1
+                    return job.future
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_log_failure)
+        job = _Job(priority, next(self._seq), method, chat_id, dict(kwargs, chat_id=chat_id), future, now, coalesce_key)
+        if coalesce_key is not None:
+            self._coalescing[(chat_id, coalesce_key)] = job
+        self._push(job)
+        return future
+
+    def send_message(self, chat_id: Hashable, text: str, priority: Priority = Priority.NOTIFY,
+                     coalesce_key: Optional[Hashable] = None, **kwargs) -> asyncio.Future:
+        return self.submit('send_message', chat_id, priority, coalesce_key, text=text, **kwargs)
+
+    def reply_to(self, message: Any, text: str, priority: Priority = Priority.MENU, **kwargs) -> asyncio.Future:
+        """Queue the equivalent of message.reply_text(text)."""
+        return self.submit('send_message', message.chat_id, priority, text=text, **kwargs)
+
+    def edit_query_message(self, query: Any, text: str, priority: Priority = Priority.MENU, **kwargs) -> asyncio.Future:
+        """Queue the equivalent of query.edit_message_text(text)."""
+        return self.submit('edit_message_text', query.message.chat_id, priority,
+                           message_id=query.message.message_id, text=text, **kwargs)
+
+    def start(self, bot: Any = None):
+        """Start the sending worker on the running event loop."""
+        if bot is not None:
+            self.bot = bot
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._task = asyncio.create_task(self._run())
+            if self._heap:
+                self._wakeup.set()
+
+    async def stop(self, timeout: float = 5.0):
+        """Flush what is queued (up to timeout) and stop the worker."""
+        if self._task is None:
+            return
+        deadline = self.clock() + timeout
+        while (len(self) or self._in_flight) and self.clock() < deadline:
+            await asyncio.sleep(0.01)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+
+    def _push(self, job: _Job):
+        heapq.heappush(self._heap, job)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _bucket(self, chat_id: Hashable) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10000:
+                self._chat_buckets = {chat: b for chat, b in self._chat_buckets.items() if not b.is_full()}
+            group = isinstance(chat_id, int) and chat_id < 0
+            bucket = TokenBucket(self.group_chat_rate if group else self.chat_rate, self.chat_burst, self.clock)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _park(self, job: _Job, delay: float = 0.0):
+        self._parked.setdefault(job.chat_id, []).append(job)
+        if delay > 0 and job.chat_id not in self._timers:
+            loop = asyncio.get_running_loop()
+            self._timers[job.chat_id] = loop.call_later(delay, self._release, job.chat_id)
+
+    def _release(self, chat_id: Hashable):
+        self._timers.pop(chat_id, None)
+        if chat_id in self._busy:
+            return
+        for job in self._parked.pop(chat_id, []):
+            self._push(job)
+
+    async def _run(self):
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            pause = self._paused_until - self.clock()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            wait = self.global_bucket.delay()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            job = heapq.heappop(self._heap)
+            chat_id = job.chat_id
+            if chat_id in self._busy or chat_id in self._parked:
+                self._park(job)
+                continue
+            delay = self._bucket(chat_id).delay()
+            if delay > 0:
+                self._park(job, delay)
+                continue
+            await self._slots.acquire()
+            self.global_bucket.consume()
+            self._bucket(chat_id).consume()
+            self._busy.add(chat_id)
+            if job.coalesce_key is not None and self._coalescing.get((chat_id, job.coalesce_key)) is job:
+                del self._coalescing[(chat_id, job.coalesce_key)]
+            task = asyncio.create_task(self._deliver(job))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _deliver(self, job: _Job):
+        started = time.perf_counter()
+        try:
+            result = await getattr(self.bot, job.method)(**job.kwargs)
+        except RetryAfter as error:
+            retry_after = error.retry_after.total_seconds() if hasattr(error.retry_after, 'total_seconds') \
+                else float(error.retry_after)
+            logger.warning(f"Telegram asked to retry after {retry_after}s (chat {job.chat_id})")
+            self.retries += 1
+            self._paused_until = max(self._paused_until, self.clock() + retry_after)
+            self._push(job)
+        except Exception as error:
+            if not job.future.done():
+                job.future.set_exception(error)
+        else:
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            if REGISTRY.enabled:
+                TELEGRAM_SECONDS.observe(time.perf_counter() - started, job.method)
+            self._busy.discard(job.chat_id)
+            self._slots.release()
+            if job.chat_id not in self._timers:
+                self._release(job.chat_id)
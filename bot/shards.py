@@ -0,0 +1,449 @@
+"""Sharded update processing: one ingress process routes updates to N worker processes.
+
+The ingress receives updates (webhook or long polling), reads only the chat or
+user id of each one and forwards the raw JSON to the worker that owns that
+key. Workers run the normal Application and handlers. Updates of one chat
+always reach the same worker, so per-chat ordering and ConversationHandler
+state are kept.
+
+Workers also talk to each other through the ingress:
+
+    config  a user's settings changed; every other worker takes the new copy
+    group   a group's title or a member the bot learnt of, for every worker's
+            group directory
+    claim   first-seen check of (user, token) signals, shared by all shards
+    forget  (user, token) signals that were not acted on, let through again
+            by the shared window and every worker's own
+    snipe   a buy decided on one shard, forwarded to shard 0, which signs
+            with the users' wallets and owns their nonces
+"""
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import struct
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import aiohttp
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from bot.webhook import WebhookServer
+from signals.dedup import SeenWindow
+
+logger = logging.getLogger(__name__)
+
+OWNER_SHARD = 0
+
+# Frame kinds on the ingress <-> worker sockets
+HELLO = b'H'      # worker -> ingress: shard index
+UPDATE = b'U'     # ingress -> worker: raw update JSON
+CONFIG = b'C'     # worker -> ingress -> other workers: [tg_id, settings document or null] after a change
+GROUP = b'T'      # worker -> ingress -> other workers: [group, title or null, member tg_id or null]
+CLAIM = b'Q'      # worker -> ingress: [request id, [[user, token], ...]]
+ANSWER = b'A'     # ingress -> worker: [request id, [first seen, ...]]
+FORGET = b'G'     # worker -> ingress -> other workers: [[user, token], ...] to let through again
+SNIPE = b'S'      # worker -> ingress -> owner shard: buy request
+FLUSH = b'F'      # ingress -> worker: request id
+FLUSHED = b'D'    # worker -> ingress: request id, once everything received before FLUSH is handled
+
+_HEADER = struct.Struct('!cI')
+
+
+def frame(kind: bytes, payload: bytes) -> bytes:
+    return _HEADER.pack(kind, len(payload)) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[bytes, bytes]:
+    kind, size = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return kind, await reader.readexactly(size)
+
+
+def shard_for(key: Optional[int], shards: int) -> int:
+    """Jump consistent hash of a chat/user id: growing from N to N+1 shards moves only 1/(N+1) of the keys."""
+    if key is None or shards <= 1:
+        return OWNER_SHARD
+    key &= 0xFFFFFFFFFFFFFFFF
+    bucket, candidate = -1, 0
+    while candidate < shards:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def raw_update_key(data: Dict[str, Any]) -> Optional[int]:
+    """The chat id of an update that is still a dict, else the user id.
+
+    That is the chat of bot.updates.update_order_key, so all the updates a
+    worker keeps in order for one (chat, user) reach the same shard.
+    """
+    for field, value in data.items():
+        if field == 'update_id' or not isinstance(value, dict):
+            continue
+        chat = value.get('chat') or (value.get('message') or {}).get('chat')
+        if chat:
+            return chat['id']
+        user = value.get('from') or value.get('user')
+        if user:
+            return user['id']
+    return None
+
+
+class ShardLink:
+    """A worker's connection to the ingress."""
+
+    def __init__(self, index: int, shards: int, writer: asyncio.StreamWriter):
+        self.index = index
+        self.shards = shards
+        self.writer = writer
+        # Set by the worker's setup function
+        self.on_config: Optional[Callable[[int, Optional[Dict[str, Any]]], Awaitable[Any]]] = None
+        self.on_snipe: Optional[Callable[[Dict[str, Any]], Awaitable[Any]]] = None
+        self.on_forget: Optional[Callable[[List[Tuple[int, str]]], Any]] = None
+        self.on_group: Optional[Callable[[str, Optional[str], Optional[int]], Any]] = None
+        self._claims: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count()
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def is_owner(self) -> bool:
+        return self.index == OWNER_SHARD
+
+    def _send(self, kind: bytes, payload: Any):
+        self.writer.write(frame(kind, json.dumps(payload).encode()))
+
+    def publish_config(self, tg_id: int, document: Optional[Dict[str, Any]] = None):
+        """Send the new settings of tg_id to the other shards; without a document they reload from the DB."""
+        self._send(CONFIG, [tg_id, document])
+
+    def publish_group(self, group: str, title: Optional[str], member: Optional[int]):
+        """Send what this shard learnt about a group to the other shards' directories."""
+        self._send(GROUP, [group, title, member])
+
+    def forward_snipe(self, request: Dict[str, Any]):
+        """Hand a buy over to the owner shard."""
+        self._send(SNIPE, request)
+
+    def forget(self, keys: Sequence[Tuple[int, str]]):
+        """Let (user, token) keys through again in the shared window and on the other shards."""
+        self._send(FORGET, [list(key) for key in keys])
+
+    async def claim(self, keys: Sequence[Tuple[int, str]]) -> List[bool]:
+        """First-seen check of (user, token) keys against the window shared by all shards."""
+        request_id = next(self._ids)
+        future = self._claims[request_id] = asyncio.get_running_loop().create_future()
+        self._send(CLAIM, [request_id, [list(key) for key in keys]])
+        try:
+            return await future
+        finally:
+            self._claims.pop(request_id, None)
+
+    def _spawn(self, coroutine: Awaitable[Any]):
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flushed(self, request_id: int, pending: List[asyncio.Task]):
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._send(FLUSHED, request_id)
+
+    async def run(self, reader: asyncio.StreamReader, application: Application):
+        """Handle frames from the ingress until it closes the connection."""
+        processor = application.update_processor
+        while True:
+            try:
+                kind, payload = await read_frame(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            if kind == UPDATE:
+                update = Update.de_json(json.loads(payload), application.bot)
+                self._spawn(processor.process_update(update, application.process_update(update)))
+            elif kind == ANSWER:
+                request_id, seen = json.loads(payload)
+                future = self._claims.get(request_id)
+                if future is not None and not future.done():
+                    future.set_result(seen)
+            elif kind == CONFIG and self.on_config is not None:
+                self._spawn(self.on_config(*json.loads(payload)))
+            elif kind == SNIPE and self.on_snipe is not None:
+                self._spawn(self.on_snipe(json.loads(payload)))
+            elif kind == GROUP and self.on_group is not None:
+                self.on_group(*json.loads(payload))
+            elif kind == FORGET and self.on_forget is not None:
+                self.on_forget([tuple(key) for key in json.loads(payload)])
+            elif kind == FLUSH:
+                self._spawn(self._flushed(json.loads(payload), list(self._tasks)))
+        for future in self._claims.values():
+            future.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def serve_worker(index: int, shards: int, path: str, setup: Callable[[ShardLink], Application]):
+    reader, writer = await asyncio.open_unix_connection(path)
+    link = ShardLink(index, shards, writer)
+    application = setup(link)
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        link._send(HELLO, index)
+        try:
+            await link.run(reader, application)
+        finally:
+            if application.post_shutdown:
+                await application.post_shutdown(application)
+            writer.close()
+
+
+def run_worker(index: int, shards: int, path: str, setup: Callable[[ShardLink], Application]):
+    """Worker process entry point; it exits when the ingress goes away."""
+    # Ctrl-C reaches the whole process group; shutting down is the ingress's call
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(serve_worker(index, shards, path, setup))
+
+
+class _Worker:
+    __slots__ = ('process', 'writer', 'routed')
+
+    def __init__(self, process):
+        self.process = process
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.routed = 0
+
+
+class ShardIngress:
+    """Spawns the worker processes and routes updates to them by chat.
+
+    `setup` runs in every worker with its ShardLink and returns the
+    Application to feed; it must be importable (a module-level function), as
+    workers are started with the spawn method.
+    """
+
+    def __init__(self, shards: int, setup: Callable[[ShardLink], Application], dedup_window: float = 300.0,
+                 start_timeout: float = 60.0):
+        self.shards = shards
+        self.setup = setup
+        self.start_timeout = start_timeout
+        self.seen = SeenWindow(window=dedup_window)
+        self.broadcasts = 0
+        self.forwarded = 0
+        self._workers: List[_Worker] = []
+        self._ready: Optional[asyncio.Future] = None
+        self._flushes: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._directory: Optional[str] = None
+
+    @property
+    def routed(self) -> List[int]:
+        """Updates sent to each shard so far."""
+        return [worker.routed for worker in self._workers]
+
+    async def start(self):
+        """Spawn the workers and wait until each has built its application and connected."""
+        self._directory = tempfile.mkdtemp(prefix='shards-')
+        path = os.path.join(self._directory, 'ingress.sock')
+        self._ready = asyncio.get_running_loop().create_future()
+        self._server = await asyncio.start_unix_server(self._serve, path)
+        context = multiprocessing.get_context('spawn')
+        for index in range(self.shards):
+            process = context.Process(target=run_worker, args=(index, self.shards, path, self.setup),
+                                      name=f'shard-{index}', daemon=True)
+            process.start()
+            self._workers.append(_Worker(process))
+        try:
+            await asyncio.wait_for(asyncio.shield(self._ready), self.start_timeout)
+        except asyncio.TimeoutError:
+            await self.stop()
+            raise RuntimeError(f"Shard workers did not connect within {self.start_timeout}s")
+        logger.info(f"Routing updates to {self.shards} shard processes")
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Frames from one worker, starting with its HELLO."""
+        worker = None
+        while True:
+            try:
+                kind, payload = await read_frame(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            if kind == HELLO:
+                worker = self._workers[json.loads(payload)]
+                worker.writer = writer
+                if all(w.writer is not None for w in self._workers) and not self._ready.done():
+                    self._ready.set_result(None)
+            elif kind in (CONFIG, GROUP):
+                self.broadcasts += 1
+                for other in self._workers:
+                    if other is not worker and other.writer is not None:
+                        other.writer.write(frame(kind, payload))
+            elif kind == CLAIM:
+                request_id, keys = json.loads(payload)
+                seen = [self.seen.first_seen(tuple(key)) for key in keys]
+                writer.write(frame(ANSWER, json.dumps([request_id, seen]).encode()))
+            elif kind == FORGET:
+                self.broadcasts += 1
+                for key in json.loads(payload):
+                    self.seen.forget(tuple(key))
+                for other in self._workers:
+                    if other is not worker and other.writer is not None:
+                        other.writer.write(frame(FORGET, payload))
+            elif kind == SNIPE:
+                owner = self._workers[OWNER_SHARD]
+                if owner.writer is None:
+                    logger.error(f"Dropping a forwarded buy: {owner.process.name} is down")
+                    continue
+                self.forwarded += 1
+                owner.writer.write(frame(SNIPE, payload))
+            elif kind == FLUSHED:
+                future = self._flushes.get(json.loads(payload))
+                if future is not None and not future.done():
+                    future.set_result(None)
+        if worker is not None:
+            worker.writer = None
+            logger.warning(f"Shard {worker.process.name} disconnected")
+
+    async def route(self, data: Dict[str, Any], body: Optional[bytes] = None):
+        """Forward one update to the shard owning its chat; `body` is its JSON if already at hand."""
+        worker = self._workers[shard_for(raw_update_key(data), self.shards)]
+        if worker.writer is None:
+            logger.error(f"Dropping update {data.get('update_id')}: {worker.process.name} is down")
+            return
+        worker.writer.write(frame(UPDATE, body if body is not None else json.dumps(data).encode()))
+        worker.routed += 1
+        await worker.writer.drain()
+
+    async def drain(self):
+        """Wait until every routed update and every message between shards has been handled."""
+        while True:
+            before = (self.broadcasts, self.forwarded)
+            futures = []
+            for worker in self._workers:
+                if worker.writer is None:
+                    continue
+                request_id = next(self._ids)
+                futures.append(self._flushes.setdefault(request_id, asyncio.get_running_loop().create_future()))
+                worker.writer.write(frame(FLUSH, json.dumps(request_id).encode()))
+            try:
+                await asyncio.gather(*futures)
+            finally:
+                self._flushes.clear()
+            if (self.broadcasts, self.forwarded) == before:
+                return
+
+    async def stop(self, timeout: float = 10.0):
+        """Close the connections; workers finish what they hold and exit."""
+        for worker in self._workers:
+            if worker.writer is not None:
+                worker.writer.close()
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            await loop.run_in_executor(None, worker.process.join, max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.terminate()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+        self._workers.clear()
+
+
+class RoutingWebhookServer(WebhookServer):
+    """WebhookServer that hands the raw update to the ingress instead of building it here."""
+
+    def __init__(self, ingress: ShardIngress, secret_token: str, **kwargs):
+        super().__init__(None, secret_token, **kwargs)
+        self.ingress = ingress
+
+    async def accept(self, data: Dict[str, Any], body: bytes):
+        await self.ingress.route(data, body)
+
+
+async def poll_updates(ingress: ShardIngress, token: str, base_url: str = 'https://api.telegram.org/bot',
+                       timeout: int = 30, retry_delay: float = 1.0, max_retry_delay: float = 60.0):
+    """Long-poll getUpdates and route the raw results; the ingress never builds Update objects.
+
+    A failed call is retried after the retry_after Telegram asks for (429),
+    else after a delay doubling from `retry_delay` up to `max_retry_delay`,
+    so a conflicting poller (409) or an outage is not hammered.
+    """
+    url = f'{base_url}{token}/'
+    offset = 0
+    failures = 0
+    async with aiohttp.ClientSession() as session:
+        await session.post(url + 'deleteWebhook')
+        while True:
+            retry_after = None
+            try:
+                async with session.post(url + 'getUpdates',
+                                        json={'offset': offset, 'timeout': timeout,
+                                              'allowed_updates': Update.ALL_TYPES},
+                                        timeout=aiohttp.ClientTimeout(total=timeout + 10)) as response:
+                    body = await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as error:
+                logger.warning(f"getUpdates failed: {error!r}")
+            else:
+                if isinstance(body, dict) and body.get('ok'):
+                    failures = 0
+                    for data in body.get('result') or []:
+                        offset = data['update_id'] + 1
+                        await ingress.route(data)
+                    continue
+                body = body if isinstance(body, dict) else {}
+                logger.warning(f"getUpdates failed: {body.get('description') or body!r}")
+                retry_after = (body.get('parameters') or {}).get('retry_after')
+            failures += 1
+            await asyncio.sleep(retry_after if retry_after is not None
+                                else min(retry_delay * 2 ** (failures - 1), max_retry_delay))
+
+
+async def serve_sharded(ingress: ShardIngress, token: str, webhook_url: Optional[str] = None,
+                        secret_token: str = '', host: str = '0.0.0.0', port: int = 8443, path: str = '/telegram',
+                        max_connections: int = 40, stop_event: Optional[asyncio.Event] = None):
+    """Run the ingress, by webhook when webhook_url is given, until stop_event is set (or SIGINT/SIGTERM)."""
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    await ingress.start()
+    server = poller = None
+    try:
+        if webhook_url:
+            server = RoutingWebhookServer(ingress, secret_token, host=host, port=port, path=path)
+            await server.start()
+            async with aiohttp.ClientSession() as session:
+                await session.post(f'https://api.telegram.org/bot{token}/setWebhook',
+                                   json={'url': webhook_url, 'secret_token': secret_token,
+                                         'max_connections': max_connections,
+                                         'allowed_updates': Update.ALL_TYPES})
+        else:
+            poller = asyncio.create_task(poll_updates(ingress, token))
+        await stop_event.wait()
+    finally:
+        if poller is not None:
+            poller.cancel()
+            await asyncio.gather(poller, return_exceptions=True)
+        if server is not None:
+            await server.stop()
+        await ingress.stop()
+
+
+def run_sharded(setup: Callable[[ShardLink], Application], token: str, shards: int, dedup_window: float = 300.0,
+                **kwargs):
+    """Blocking entry point of sharded mode; kwargs go to serve_sharded."""
+    ingress = ShardIngress(shards, setup, dedup_window)
+    asyncio.run(serve_sharded(ingress, token, **kwargs))
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def update_order_key(update: Any) -> Optional[Hashable]:
+    """Return the key updates must stay ordered by: the (chat, user) pair ConversationHandler keeps state for."""
+    if isinstance(update, Update):
+        chat, user = update.effective_chat, update.effective_user
+        if chat is not None or user is not None:
+            return (chat.id if chat is not None else None, user.id if user is not None else None)
+    return None
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates concurrently but one at a time per chat and user.
+
+    ConversationHandler state is per chat and user, so updates of the same
+    user in the same chat must not overlap; different users of one group
+    and different chats have no such constraint. An update waits for its
+    turn before it takes one of the `max_concurrent_updates` slots, so a
+    backlog in one chat does not hold slots other chats could run in.
+    `preload` runs in the update's turn just before it is dispatched, e.g.
+    to load the sender's persisted state on first contact.
+    """
+
+    def __init__(self, max_concurrent_updates: int, preload: Optional[Callable[[object], Awaitable[Any]]] = None):
+        super().__init__(max_concurrent_updates)
+        self.preload = preload
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._waiters: Dict[Hashable, int] = {}
+
+    @property
+    def in_flight(self) -> int:
+        """Updates being handled or waiting for their turn."""
+        return sum(self._waiters.values())
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:  # type: ignore[misc]
+        # Replaces the base class's version, which takes a slot before do_process_update()
+        # and so would hold it while the update waits for its chat.
+        if metrics.REGISTRY.enabled:
+            metrics.received_at.set(time.perf_counter())
+        key = update_order_key(update)
+        if key is None:
+            async with self._slots:
+                await self.do_process_update(update, coroutine)
+            return
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            async with lock, self._slots:
+                await self.do_process_update(update, coroutine)
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                del self._locks[key]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        if self.preload is not None:
+            try:
+                await self.preload(update)
+            except Exception as error:
+                # Handle the update anyway; the load is retried on the user's next update
+                logger.warning(f"Preloading state for update failed: {error!r}")
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
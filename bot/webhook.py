@@ -0,0 +1,110 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """Embedded aiohttp endpoint that feeds Telegram webhook updates into Application.update_queue.
+
+    Requests without the expected secret token are rejected with 403 before
+    the body is read. Connections are kept alive so Telegram can reuse them
+    for the next update instead of reconnecting.
+    """
+
+    def __init__(self, application: Optional[Application], secret_token: str, host: str = '0.0.0.0',
+                 port: int = 8443, path: str = '/telegram', keepalive_timeout: float = 75.0):
+        self.application = application
+        self.secret_token = secret_token
+        self.host = host
+        self.port = port
+        self.path = path
+        self.keepalive_timeout = keepalive_timeout
+        self.received = 0
+        self.rejected = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Validate one webhook call and enqueue its update."""
+        token = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token, self.secret_token):
+            self.rejected += 1
+            return web.Response(status=403)
+        body = await request.read()
+        try:
+            data = json.loads(body)
+            await self.accept(data, body)
+        except (ValueError, TypeError, KeyError) as error:
+            logger.warning(f"Discarding malformed webhook payload: {error!r}")
+            return web.Response(status=400)
+        self.received += 1
+        return web.Response(status=200)
+
+    async def accept(self, data: Dict[str, Any], body: bytes):
+        """Build the update and queue it for the application."""
+        await self.application.update_queue.put(Update.de_json(data, self.application.bot))
+
+    async def start(self):
+        """Start listening."""
+        self._runner = web.AppRunner(self.build_app(), keepalive_timeout=self.keepalive_timeout,
+                                     access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        logger.info(f"Webhook listening on {self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        """Stop listening."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def serve_webhook(application: Application, server: WebhookServer, webhook_url: str,
+                        max_connections: int = 40, stop_event: Optional[asyncio.Event] = None):
+    """Run the application fed by a WebhookServer until stop_event is set (or SIGINT/SIGTERM)."""
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await server.start()
+        await application.bot.set_webhook(webhook_url, secret_token=server.secret_token,
+                                          max_connections=max_connections,
+                                          allowed_updates=Update.ALL_TYPES)
+        await application.start()
+        try:
+            await stop_event.wait()
+        finally:
+            await server.stop()
+            await application.stop()
+            if application.post_shutdown:
+                await application.post_shutdown(application)
+
+
+def run_webhook(application: Application, webhook_url: str, secret_token: str, host: str = '0.0.0.0',
+                port: int = 8443, path: str = '/telegram', max_connections: int = 40):
+    """Blocking webhook counterpart of Application.run_polling()."""
+    server = WebhookServer(application, secret_token, host, port, path)
+    asyncio.run(serve_webhook(application, server, webhook_url, max_connections))
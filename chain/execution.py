@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, NamedTuple, Optional
+
+import rlp
+from eth_abi import encode
+from eth_keys import keys
+from eth_utils import keccak, to_canonical_address, to_checksum_address
+
+from chain.rpc import JsonRpcClient, RpcError
+
+logger = logging.getLogger(__name__)
+
+# Base mainnet, Uniswap V2 router. The bot's limits are denominated in ETH on Base.
+BASE_CHAIN_ID = 8453
+BASE_WETH = '0x4200000000000000000000000000000000000006'
+BASE_UNISWAP_V2_ROUTER = '0x4752ba5DBc23f44D87826276BF6Fd6b1C372aD24'
+
+WEI_PER_ETH = 10 ** 18
+SWAP_GAS_LIMIT = 350_000
+
+_SWAP_SIGNATURE = 'swapExactETHForTokensSupportingFeeOnTransferTokens(uint256,address[],address,uint256)'
+
+
+class SignedSwap(NamedTuple):
+    raw: bytes
+    tx_hash: str
+    nonce: int
+    token: str
+    value: int
+
+
+class SwapTemplate:
+    """Router calldata encoded once per wallet; only the token, min-out and deadline words are patched.
+
+    Layout of swapExactETHForTokensSupportingFeeOnTransferTokens(amountOutMin,
+    path, to, deadline) after the 4-byte selector: amountOutMin, offset of
+    path, to, deadline, path length, path[0] = WETH, path[1] = token.
+    """
+
+    _AMOUNT_OUT_MIN = 4
+    _DEADLINE = 4 + 3 * 32
+    _TOKEN = 4 + 6 * 32
+
+    def __init__(self, recipient: str, weth: str = BASE_WETH):
+        selector = keccak(text=_SWAP_SIGNATURE)[:4]
+        body = encode(['uint256', 'address[]', 'address', 'uint256'],
+                      [0, [weth, weth], recipient, 0])
+        self._template = bytes(selector + body)
+
+    def calldata(self, token: str, deadline: int, amount_out_min: int = 0) -> bytes:
+        data = bytearray(self._template)
+        data[self._AMOUNT_OUT_MIN:self._AMOUNT_OUT_MIN + 32] = amount_out_min.to_bytes(32, 'big')
+        data[self._DEADLINE:self._DEADLINE + 32] = deadline.to_bytes(32, 'big')
+        data[self._TOKEN + 12:self._TOKEN + 32] = to_canonical_address(token)
+        return bytes(data)
+
+
+class NonceManager:
+    """Hands out nonces for one wallet locally; the chain is only asked at sync time."""
+
+    def __init__(self, rpc: JsonRpcClient, address: str):
+        self.rpc = rpc
+        self.address = address
+        self._next: Optional[int] = None
+
+    @property
+    def synced(self) -> bool:
+        return self._next is not None
+
+    async def sync(self):
+        """Reload the pending nonce from the node (start-up and after a nonce error)."""
+        self._next = int(await self.rpc.call('eth_getTransactionCount', [self.address, 'pending']), 16)
+
+    def reserve(self) -> int:
+        """Take the next nonce without any I/O."""
+        if self._next is None:
+            raise RuntimeError(f"Nonce manager for {self.address} has not been synced")
+        nonce = self._next
+        self._next += 1
+        return nonce
+
+    def release(self, nonce: int):
+        """Give back a nonce whose transaction never reached the node."""
+        if self._next == nonce + 1:
+            self._next = nonce
+        else:
+            # A later nonce is already out; SnipeExecutor.execute() resyncs before the next trade.
+            self._next = None
+
+
+class FeeOracle:
+    """EIP-1559 fee estimate refreshed in the background, read synchronously on the hot path."""
+
+    def __init__(self, rpc: JsonRpcClient, interval: float = 2.0, base_fee_multiplier: int = 2,
+                 priority_fee_boost: float = 1.5):
+        self.rpc = rpc
+        self.interval = interval
+        self.base_fee_multiplier = base_fee_multiplier
+        self.priority_fee_boost = priority_fee_boost
+        self.max_fee: Optional[int] = None
+        self.priority_fee: Optional[int] = None
+        self.updated = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self):
+        block, tip = await self.rpc.batch([('eth_getBlockByNumber', ['latest', False]),
+                                           ('eth_maxPriorityFeePerGas', [])])
+        tip = int(tip, 16)
+        base_fee = int(block['baseFeePerGas'], 16)
+        self.priority_fee = int(tip * self.priority_fee_boost)
+        self.max_fee = base_fee * self.base_fee_multiplier + self.priority_fee
+        self.updated = time.monotonic()
+
+    def fees(self) -> Dict[str, int]:
+        if self.max_fee is None:
+            raise RuntimeError("Fee oracle has no estimate yet")
+        return {'maxFeePerGas': self.max_fee, 'maxPriorityFeePerGas': self.priority_fee}
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as error:
+                logger.warning(f"Fee refresh failed: {error!r}")
+            await asyncio.sleep(self.interval)
+
+
+def sign_dynamic_fee_tx(private_key: keys.PrivateKey, chain_id: int, nonce: int, max_priority_fee: int,
+                        max_fee: int, gas: int, to: bytes, value: int, data: bytes) -> bytes:
+    """RLP-encode and sign an EIP-1559 (type 2) transaction without eth-account's validation layers."""
+    fields = [chain_id, nonce, max_priority_fee, max_fee, gas, to, value, data, []]
+    signature = private_key.sign_msg_hash(keccak(b'\x02' + rlp.encode(fields)))
+    return b'\x02' + rlp.encode(fields + [signature.v, signature.r, signature.s])
+
+
+class SnipeExecutor:
+    """Turns a token signal plus a per-group ETH limit into a signed, broadcast swap.
+
+    Everything slow (nonce lookup, fee estimation, calldata encoding) happens
+    ahead of time, so build() does no I/O: patch the template, take a nonce,
+    read the cached fees and sign.
+    """
+
+    def __init__(self, rpc: JsonRpcClient, private_key: bytes, chain_id: int = BASE_CHAIN_ID,
+                 router: str = BASE_UNISWAP_V2_ROUTER, weth: str = BASE_WETH, gas_limit: int = SWAP_GAS_LIMIT,
+                 deadline_seconds: int = 120, fee_oracle: Optional[FeeOracle] = None,
+                 clock: Callable[[], float] = time.time):
+        self.rpc = rpc
+        self.private_key = keys.PrivateKey(private_key)
+        self.address = self.private_key.public_key.to_checksum_address()
+        self.chain_id = chain_id
+        self.router = to_canonical_address(router)
+        self.gas_limit = gas_limit
+        self.deadline_seconds = deadline_seconds
+        self.clock = clock
+        self.template = SwapTemplate(self.address, weth)
+        self.nonces = NonceManager(rpc, self.address)
+        self.fees = fee_oracle or FeeOracle(rpc)
+
+    async def start(self):
+        """Sync the nonce, take a first fee estimate and keep fees fresh in the background."""
+        await self.nonces.sync()
+        await self.fees.refresh()
+        self.fees.start()
+
+    async def stop(self):
+        await self.fees.stop()
+
+    def build(self, token: str, eth_amount: float, amount_out_min: int = 0) -> SignedSwap:
+        """Build and sign a buy of `token` for `eth_amount` ETH, without I/O."""
+        value = int(eth_amount * WEI_PER_ETH)
+        fees = self.fees.fees()
+        nonce = self.nonces.reserve()
+        data = self.template.calldata(token, int(self.clock()) + self.deadline_seconds, amount_out_min)
+        raw = sign_dynamic_fee_tx(self.private_key, self.chain_id, nonce, fees['maxPriorityFeePerGas'],
+                                  fees['maxFeePerGas'], self.gas_limit, self.router, value, data)
+        return SignedSwap(raw, '0x' + keccak(raw).hex(), nonce, to_checksum_address(token), value)
+
+    async def send(self, swap: SignedSwap) -> str:
+        """Broadcast a signed swap; the nonce is returned to the pool if the node rejects it."""
+        try:
+            return await self.rpc.call('eth_sendRawTransaction', ['0x' + swap.raw.hex()])
+        except RpcError as error:
+            message = str(error).lower()
+            if 'nonce' in message:
+                await self.nonces.sync()
+            else:
+                self.nonces.release(swap.nonce)
+            raise
+        except Exception:
+            self.nonces.release(swap.nonce)
+            raise
+
+    async def execute(self, token: str, eth_amount: float) -> SignedSwap:
+        """Build, sign and broadcast a buy."""
+        if not self.nonces.synced:
+            await self.nonces.sync()
+        swap = self.build(token, eth_amount)
+        await self.send(swap)
+        logger.info(f"Sent buy of {swap.token} for {eth_amount} ETH, nonce {swap.nonce}, tx {swap.tx_hash}")
+        return swap
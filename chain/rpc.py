@@ -0,0 +1,166 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class RpcError(Exception):
+    """A JSON-RPC call returned an error object."""
+
+    def __init__(self, method: str, error: Any):
+        self.method = method
+        self.error = error
+        message = error.get('message') if isinstance(error, dict) else error
+        super().__init__(f"{method}: {message}")
+
+
+class RpcUnavailable(Exception):
+    """No configured endpoint answered."""
+
+
+class _Endpoint:
+    __slots__ = ('url', 'down_until', 'failures')
+
+    def __init__(self, url: str):
+        self.url = url
+        self.down_until = 0.0
+        self.failures = 0
+
+
+class JsonRpcClient:
+    """Async JSON-RPC client with a keep-alive connection pool, batching and endpoint failover.
+
+    Calls made in the same event-loop tick (or within batch_window seconds)
+    are flushed together as one JSON-RPC batch, so concurrent signals share
+    round-trips. A batch that fails at the transport level (connection error,
+    timeout, 5xx) is retried on the next healthy endpoint and the failing one
+    is benched for `cooldown` seconds.
+    """
+
+    def __init__(self, urls: Union[str, Sequence[str]], timeout: float = 10.0, pool_size: int = 32,
+                 batch_window: float = 0.0, max_batch: int = 100, cooldown: float = 30.0):
+        self.endpoints = [_Endpoint(url) for url in ([urls] if isinstance(urls, str) else urls)]
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.pool_size = pool_size
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.cooldown = cooldown
+        self.round_trips = 0
+        self.requests = 0
+        self._ids = itertools.count(1)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._flush_scheduled = False
+
+    @property
+    def url(self) -> str:
+        return self.endpoints[0].url
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                                  json_serialize=json.dumps)
+        return self._session
+
+    def call(self, method: str, params: Optional[List[Any]] = None, batched: bool = True) -> 'asyncio.Future[Any]':
+        """Queue one request for the next batch; await the returned future for its result.
+
+        With batched=False the request is sent on its own right away, for slow
+        calls that must not hold up or fail a batch.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        payload = {'jsonrpc': '2.0', 'id': next(self._ids), 'method': method, 'params': params or []}
+        self.requests += 1
+        if not batched:
+            loop.create_task(self._send([(payload, future)]))
+            return future
+        self._pending.append((payload, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif not self._flush_scheduled:
+            self._flush_scheduled = True
+            if self.batch_window:
+                loop.call_later(self.batch_window, self._flush)
+            else:
+                loop.call_soon(self._flush)
+        return future
+
+    async def batch(self, calls: Sequence[Tuple[str, List[Any]]], raise_errors: bool = True) -> List[Any]:
+        """Send several calls in one round-trip and return their results in order.
+
+        With raise_errors=False failed calls come back as RpcError instances.
+        """
+        futures = [self.call(method, params) for method, params in calls]
+        results = await asyncio.gather(*futures, return_exceptions=not raise_errors)
+        return list(results)
+
+    def _flush(self):
+        self._flush_scheduled = False
+        while self._pending:
+            chunk, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            asyncio.get_running_loop().create_task(self._send(chunk))
+
+    async def _send(self, chunk: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        payload: Union[Dict[str, Any], List[Dict[str, Any]]] = [item for item, _ in chunk]
+        if len(chunk) == 1:
+            payload = payload[0]
+        try:
+            body = await self._post(payload)
+        except Exception as error:
+            for _, future in chunk:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        try:
+            answers = {answer.get('id'): answer for answer in (body if isinstance(body, list) else [body])
+                       if isinstance(answer, dict)}
+            for request, future in chunk:
+                if future.done():
+                    continue
+                answer = answers.get(request['id'])
+                if answer is None:
+                    future.set_exception(RpcError(request['method'], 'missing response in batch'))
+                elif answer.get('error') is not None:
+                    future.set_exception(RpcError(request['method'], answer['error']))
+                else:
+                    future.set_result(answer.get('result'))
+        except Exception as error:
+            # A reply that is not JSON-RPC must not leave any caller waiting forever
+            for request, future in chunk:
+                if not future.done():
+                    future.set_exception(RpcError(request['method'], f'malformed response: {error!r}'))
+
+    async def _post(self, payload: Any) -> Any:
+        session = await self._get_session()
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if e.down_until <= now] or list(self.endpoints)
+        last_error: Optional[Exception] = None
+        for endpoint in candidates:
+            try:
+                self.round_trips += 1
+                async with session.post(endpoint.url, json=payload) as response:
+                    if response.status >= 500 or response.status == 429:
+                        raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                          status=response.status)
+                    body = await response.json(content_type=None)
+                endpoint.failures = 0
+                return body
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as error:
+                endpoint.failures += 1
+                endpoint.down_until = time.monotonic() + self.cooldown
+                logger.warning(f"RPC endpoint {endpoint.url} failed ({error!r}), failing over")
+                last_error = error
+        raise RpcUnavailable(f"All RPC endpoints failed: {last_error!r}")
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
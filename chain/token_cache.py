@@ -0,0 +1,139 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+
+from chain.tokens import TokenInfo, TokenReader
+from repo.config_cache import LRUTTLCache
+
+REJECT_NOT_A_TOKEN = 'not an ERC-20 token'
+REJECT_NO_LIQUIDITY = 'no WETH liquidity'
+REJECT_REVERTED = 'buy reverted'
+
+
+class TokenCache:
+    """Token metadata cache between the signal parser and the chain reads.
+
+    Static fields (decimals, pair, creation block) are kept for static_ttl;
+    supply and reserves are only trusted for volatile_ttl, after which a
+    cheaper volatile-only read refreshes them. Lookups never wait for the
+    slow log query that dates a token: its creation block is filled into the
+    static entry in the background. Rejected tokens are cached as
+    negative results so repeated shills of a dead or honeypot contract cost
+    nothing. Concurrent lookups of one address share a single in-flight read.
+    """
+
+    def __init__(self, reader: TokenReader, maxsize: int = 20000, static_ttl: float = 24 * 3600.0,
+                 volatile_ttl: float = 3.0, negative_ttl: float = 600.0, no_liquidity_ttl: float = 15.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.reader = reader
+        self.negative_ttl = negative_ttl
+        self.no_liquidity_ttl = no_liquidity_ttl
+        self.static = LRUTTLCache(maxsize, static_ttl, clock)
+        self.volatile = LRUTTLCache(maxsize, volatile_ttl, clock)
+        self.negative = LRUTTLCache(maxsize, negative_ttl, clock)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._dating: Set[asyncio.Task] = set()
+        # A full read is its batch plus the log query; the cache splits it into fields, then block number and logs
+        self._full_cost = len(reader.requests('0x' + '00' * 20)) + 1
+        self._fields_cost = len(reader.requests('0x' + '00' * 20, with_creation_block=False))
+        self._volatile_cost = len(reader.volatile_requests('0x' + '00' * 20))
+        self.lookups = 0
+        self.coalesced = 0
+        self.full_reads = 0
+        self.volatile_reads = 0
+        self.log_reads = 0
+
+    def rejection(self, token: str) -> Optional[str]:
+        """Why `token` is currently rejected, or None."""
+        return self.negative.peek(token.lower())
+
+    def reject(self, token: str, reason: str, ttl: Optional[float] = None):
+        """Cache a negative verdict, e.g. from a honeypot check or a reverted buy."""
+        key = token.lower()
+        self.volatile.invalidate(key)
+        self.negative.set(key, reason, ttl)
+
+    async def get(self, token: str) -> Optional[TokenInfo]:
+        """Return fresh metadata of `token`, or None when it is rejected."""
+        self.lookups += 1
+        key = token.lower()
+        if self.negative.get(key) is not None:
+            return None
+        info = self.volatile.get(key)
+        if info is not None:
+            return info
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            info = await self._load(key, token)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as error:
+            future.set_exception(error)
+            # Mark it retrieved so a flight nobody joined is not logged as an unhandled error
+            future.exception()
+            raise
+        else:
+            future.set_result(info)
+            return info
+        finally:
+            del self._inflight[key]
+
+    async def get_many(self, tokens: Sequence[str]) -> List[Optional[TokenInfo]]:
+        """Look up several tokens; the misses are read in one batch."""
+        return list(await asyncio.gather(*(self.get(token) for token in tokens)))
+
+    async def _load(self, key: str, token: str) -> Optional[TokenInfo]:
+        static = self.static.get(key)
+        if static is not None:
+            self.volatile_reads += 1
+            total_supply, reserve_token, reserve_weth = await self.reader.read_volatile(token)
+            info = static._replace(total_supply=total_supply, reserve_token=reserve_token,
+                                   reserve_weth=reserve_weth)
+        else:
+            self.full_reads += 1
+            info = await self.reader.read(token, with_creation_block=False)
+        if info.decimals is None:
+            self.negative.set(key, REJECT_NOT_A_TOKEN)
+            return None
+        if static is None:
+            self.static.set(key, info)
+            task = asyncio.get_running_loop().create_task(self._date(key, token))
+            self._dating.add(task)
+            task.add_done_callback(self._dating.discard)
+        if not info.has_liquidity:
+            self.negative.set(key, REJECT_NO_LIQUIDITY, self.no_liquidity_ttl)
+            return None
+        self.volatile.set(key, info)
+        return info
+
+    async def _date(self, key: str, token: str):
+        """Fill the creation block into the static entry of a token once the log query answers."""
+        self.log_reads += 1
+        creation_block = await self.reader.creation_block(token)
+        static = self.static.peek(key)
+        if creation_block is not None and static is not None:
+            self.static.set(key, static._replace(creation_block=creation_block))
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and the RPC calls saved compared with reading every lookup in full."""
+        calls = (self.full_reads * self._fields_cost + self.log_reads * (self._full_cost - self._fields_cost)
+                 + self.volatile_reads * self._volatile_cost)
+        served = self.volatile.hits + self.negative.hits + self.coalesced
+        return {
+            'lookups': self.lookups,
+            'hit_rate': served / self.lookups if self.lookups else 0.0,
+            'negative_hits': self.negative.hits,
+            'coalesced': self.coalesced,
+            'full_reads': self.full_reads,
+            'volatile_reads': self.volatile_reads,
+            'log_reads': self.log_reads,
+            'rpc_calls': calls,
+            'rpc_calls_saved': self.lookups * self._full_cost - calls,
+            'size': len(self.static) + len(self.volatile) + len(self.negative),
+        }
@@ -0,0 +1,167 @@
+import asyncio
+from functools import lru_cache
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+
+from eth_abi import decode, encode
+from eth_utils import keccak, to_canonical_address, to_checksum_address
+
+from chain.execution import BASE_WETH, WEI_PER_ETH
+from chain.rpc import JsonRpcClient, RpcError, RpcUnavailable
+
+# Uniswap V2 on Base. Pair addresses are derived with CREATE2, so no getPair() lookup is needed.
+BASE_UNISWAP_V2_FACTORY = '0x8909Dc15e40173Ff4699343b6eB8132c65e18eC6'
+UNISWAP_V2_PAIR_INIT_CODE_HASH = bytes.fromhex('96e8ac4277198ff8b6f785478aa9a39f403cb768dd02cbee326c3e7da348845f')
+# Multicall3 is deployed at the same address on every EVM chain.
+MULTICALL3 = '0xcA11bde05977b3631167028862bE2a173976CA11'
+
+PAIR_CREATED_TOPIC = '0x' + keccak(text='PairCreated(address,address,address,uint256)').hex()
+
+DECIMALS = keccak(text='decimals()')[:4]
+TOTAL_SUPPLY = keccak(text='totalSupply()')[:4]
+GET_RESERVES = keccak(text='getReserves()')[:4]
+AGGREGATE3 = keccak(text='aggregate3((address,bool,bytes)[])')[:4]
+
+
+class TokenInfo(NamedTuple):
+    address: str
+    decimals: Optional[int]
+    total_supply: Optional[int]
+    pair: str
+    reserve_token: int
+    reserve_weth: int
+    creation_block: Optional[int]
+
+    @property
+    def has_liquidity(self) -> bool:
+        return self.reserve_token > 0 and self.reserve_weth > 0
+
+    @property
+    def market_cap_eth(self) -> Optional[float]:
+        """Fully diluted market cap priced off the WETH pair."""
+        if not self.has_liquidity or self.total_supply is None:
+            return None
+        return self.total_supply * self.reserve_weth / self.reserve_token / WEI_PER_ETH
+
+
+def _topic(address: bytes) -> str:
+    return '0x' + address.rjust(32, b'\0').hex()
+
+
+@lru_cache(maxsize=4096)
+def pair_for(token: str, weth: str = BASE_WETH, factory: str = BASE_UNISWAP_V2_FACTORY,
+             init_code_hash: bytes = UNISWAP_V2_PAIR_INIT_CODE_HASH) -> Tuple[str, bytes, bytes]:
+    """Return (pair address, token0, token1) of the token/WETH Uniswap V2 pair."""
+    token0, token1 = sorted((to_canonical_address(token), to_canonical_address(weth)))
+    digest = keccak(b'\xff' + to_canonical_address(factory) + keccak(token0 + token1) + init_code_hash)
+    return to_checksum_address(digest[12:]), token0, token1
+
+
+class TokenReader:
+    """Reads everything the buy filters need about a token in a single RPC round-trip.
+
+    The calls for one token (decimals, totalSupply, pair reserves and the
+    current block number) go out as one JSON-RPC batch, with the eth_calls
+    folded into a single Multicall3 aggregate3 when use_multicall is set.
+    Reads for different tokens issued concurrently share the client's batch as
+    well. The PairCreated log that dates the launch is queried on its own
+    afterwards and only over the last `log_blocks` blocks: nodes often refuse
+    or time out log queries over long ranges, and one that does must not fail
+    the batch.
+    """
+
+    def __init__(self, rpc: JsonRpcClient, weth: str = BASE_WETH, factory: str = BASE_UNISWAP_V2_FACTORY,
+                 multicall: str = MULTICALL3, use_multicall: bool = True, log_blocks: int = 50_000):
+        self.rpc = rpc
+        self.weth = weth
+        self.factory = factory
+        self.multicall = multicall
+        self.use_multicall = use_multicall
+        self.log_blocks = log_blocks
+
+    def _call_requests(self, calls: List[Tuple[str, bytes]]) -> List[Tuple[str, List[Any]]]:
+        if self.use_multicall:
+            data = AGGREGATE3 + encode(['(address,bool,bytes)[]'], [[(to, True, cd) for to, cd in calls]])
+            return [('eth_call', [{'to': self.multicall, 'data': '0x' + data.hex()}, 'latest'])]
+        return [('eth_call', [{'to': to, 'data': '0x' + cd.hex()}, 'latest']) for to, cd in calls]
+
+    async def _execute(self, calls: List[Tuple[str, bytes]],
+                       extra: Sequence[Tuple[str, List[Any]]] = ()) -> Tuple[List[bytes], List[Any]]:
+        """Run the eth_calls plus any extra requests in one batch.
+
+        Failed eth_calls come back empty and failed extra requests as their exception.
+        """
+        requests = self._call_requests(calls)
+        results = await self.rpc.batch(requests + list(extra), raise_errors=False)
+        results, extra_results = results[:len(requests)], results[len(requests):]
+        if self.use_multicall:
+            if isinstance(results[0], Exception):
+                raise results[0]
+            returned = decode(['(bool,bytes)[]'], bytes.fromhex(results[0][2:]))[0]
+            return [data if ok else b'' for ok, data in returned], extra_results
+        return [b'' if isinstance(r, Exception) else bytes.fromhex(r[2:]) for r in results], extra_results
+
+    def _logs_request(self, token0: bytes, token1: bytes, head: int) -> Tuple[str, List[Any]]:
+        logs_filter = {'address': self.factory, 'fromBlock': hex(max(0, head - self.log_blocks)),
+                       'toBlock': hex(head), 'topics': [PAIR_CREATED_TOPIC, _topic(token0), _topic(token1)]}
+        return 'eth_getLogs', [logs_filter]
+
+    def requests(self, token: str, with_creation_block: bool = True) -> List[Tuple[str, List[Any]]]:
+        """The batched JSON-RPC calls of one token read; with the creation block, the log query follows alone."""
+        pair, _, _ = pair_for(token, self.weth, self.factory)
+        requests = self._call_requests([(token, DECIMALS), (token, TOTAL_SUPPLY), (pair, GET_RESERVES)])
+        return requests + [('eth_blockNumber', [])] if with_creation_block else requests
+
+    def volatile_requests(self, token: str) -> List[Tuple[str, List[Any]]]:
+        """The JSON-RPC calls of read_volatile()."""
+        pair, _, _ = pair_for(token, self.weth, self.factory)
+        return self._call_requests([(token, TOTAL_SUPPLY), (pair, GET_RESERVES)])
+
+    async def read(self, token: str, with_creation_block: bool = True) -> TokenInfo:
+        """Fetch decimals, supply, reserves and, unless told not to, the pair creation block of `token`."""
+        pair, _, _ = pair_for(token, self.weth, self.factory)
+        calls = [(token, DECIMALS), (token, TOTAL_SUPPLY), (pair, GET_RESERVES)]
+        if not with_creation_block:
+            return self._parse(token, (await self._execute(calls))[0], None)
+        returned, (head,) = await self._execute(calls, [('eth_blockNumber', [])])
+        creation_block = None if isinstance(head, Exception) else await self.creation_block(token, int(head, 16))
+        return self._parse(token, returned, creation_block)
+
+    async def creation_block(self, token: str, head: Optional[int] = None) -> Optional[int]:
+        """Block the token's WETH pair was created in; None when older than log_blocks or the query fails."""
+        _, token0, token1 = pair_for(token, self.weth, self.factory)
+        try:
+            if head is None:
+                head = int(await self.rpc.call('eth_blockNumber'), 16)
+            logs = await self.rpc.call(*self._logs_request(token0, token1, head), batched=False)
+        except (RpcError, RpcUnavailable):
+            return None
+        return int(logs[0]['blockNumber'], 16) if logs else None
+
+    async def read_volatile(self, token: str) -> Tuple[Optional[int], int, int]:
+        """Fetch only the fields that move: (total supply, token reserve, WETH reserve)."""
+        pair, _, _ = pair_for(token, self.weth, self.factory)
+        supply_data, reserves_data = (await self._execute([(token, TOTAL_SUPPLY), (pair, GET_RESERVES)]))[0]
+        total_supply = decode(['uint256'], supply_data)[0] if len(supply_data) >= 32 else None
+        return (total_supply,) + self._reserves(token, reserves_data)
+
+    async def read_many(self, tokens: Sequence[str]) -> List[TokenInfo]:
+        """Read several tokens; all of their calls are flushed in the same batch."""
+        return list(await asyncio.gather(*(self.read(token) for token in tokens)))
+
+    def _reserves(self, token: str, reserves_data: bytes) -> Tuple[int, int]:
+        if len(reserves_data) < 96:
+            return 0, 0
+        _, token0, _ = pair_for(token, self.weth, self.factory)
+        reserve0, reserve1, _ = decode(['uint112', 'uint112', 'uint32'], reserves_data)
+        if token0 == to_canonical_address(token):
+            return reserve0, reserve1
+        return reserve1, reserve0
+
+    def _parse(self, token: str, returned: List[bytes], creation_block: Optional[int]) -> TokenInfo:
+        pair, _, _ = pair_for(token, self.weth, self.factory)
+        decimals_data, supply_data, reserves_data = returned
+        decimals = decode(['uint8'], decimals_data)[0] if len(decimals_data) >= 32 else None
+        total_supply = decode(['uint256'], supply_data)[0] if len(supply_data) >= 32 else None
+        reserve_token, reserve_weth = self._reserves(token, reserves_data)
+        return TokenInfo(to_checksum_address(token), decimals, total_supply, pair,
+                         reserve_token, reserve_weth, creation_block)
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Deque, Dict, Optional
+
+from eth_keyfile import create_keyfile_json, decode_keyfile_json
+from eth_keys import keys
+from eth_utils import to_checksum_address
+from pymongo.errors import PyMongoError
+
+from chain.execution import FeeOracle, SnipeExecutor
+from chain.rpc import JsonRpcClient
+from repo.wallet import AsyncWalletRepository
+
+logger = logging.getLogger(__name__)
+
+
+def generate_wallet(password: str, iterations: Optional[int] = None) -> Dict[str, Any]:
+    """Create a private key and its scrypt-encrypted V3 keystore; CPU-bound (about a second by default).
+
+    `iterations` is the scrypt work factor n, eth-keyfile's default (2**18) when None.
+    """
+    while True:
+        try:
+            private_key = keys.PrivateKey(os.urandom(32))
+            break
+        except Exception:
+            # Outside the curve order, about one in 2**128
+            continue
+    keystore = create_keyfile_json(private_key.to_bytes(), password.encode(), kdf='scrypt', iterations=iterations)
+    return {'address': to_checksum_address(private_key.public_key.to_canonical_address()), 'keystore': keystore}
+
+
+def decrypt_wallet(keystore: Dict[str, Any], password: str) -> bytes:
+    """The private key of a keystore; as slow as generating it."""
+    return bytes(decode_keyfile_json(keystore, password.encode()))
+
+
+class WalletPool:
+    """Pre-generated encrypted wallets, handed out in O(1) and topped up in the background.
+
+    Keys and keystores are made in a process pool, so the scrypt work never
+    runs on the event loop. Each generated batch is stored as unassigned
+    (AsyncWalletRepository.add_to_pool) before it joins the in-memory queue,
+    and start() reloads the stored pool, so a restart keeps what was made.
+    Taking a wallet pops the queue and marks it assigned with one conditional
+    update; once the queue falls to `low_water` the refill task is woken.
+    """
+
+    def __init__(self, repo: AsyncWalletRepository, password: str, size: int = 32,
+                 low_water: Optional[int] = None, workers: int = 1, iterations: Optional[int] = None,
+                 executor: Optional[Executor] = None):
+        self.repo = repo
+        self.password = password
+        self.size = size
+        self.low_water = size // 2 if low_water is None else low_water
+        self.workers = workers
+        self.iterations = iterations
+        self.executor = executor
+        self._own_executor = executor is None
+        self._ready: Deque[Dict[str, Any]] = deque()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.generated = 0
+        self.handed_out = 0
+        self.made_on_demand = 0
+
+    def __len__(self) -> int:
+        return len(self._ready)
+
+    async def start(self):
+        """Load the stored pool and start topping it up."""
+        if self._task is not None:
+            return
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            self._ready.extend(await self.repo.find_pool(self.size))
+        except PyMongoError as error:
+            logger.error(f"Could not load the stored wallet pool: {error!r}")
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the refill task; wallets being generated are dropped."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._own_executor and self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def take(self, tg_id: int) -> Dict[str, Any]:
+        """Give a wallet to a user: a pooled one when available, else one made now (still off the loop)."""
+        while self._ready:
+            wallet = self._ready.popleft()
+            self._refill_if_low()
+            # Another shard may have handed out the same stored wallet
+            if await self.repo.assign(wallet['address'], tg_id):
+                self.handed_out += 1
+                return wallet
+        self._refill_if_low()
+        wallet = await self._generate()
+        await self.repo.add_to_pool([wallet])
+        await self.repo.assign(wallet['address'], tg_id)
+        self.made_on_demand += 1
+        self.handed_out += 1
+        return wallet
+
+    def _refill_if_low(self):
+        if len(self._ready) <= self.low_water and self._wake is not None:
+            self._wake.set()
+
+    async def _generate(self) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, generate_wallet, self.password, self.iterations)
+
+    async def _run(self):
+        while True:
+            missing = self.size - len(self._ready)
+            if missing <= 0:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            try:
+                # One wallet per worker at a time, stored before anyone can be given one
+                batch = await asyncio.gather(*(self._generate() for _ in range(min(missing, self.workers))))
+                await self.repo.add_to_pool(batch)
+            except PyMongoError as error:
+                logger.warning(f"Storing generated wallets failed, retrying: {error!r}")
+                await asyncio.sleep(1)
+                continue
+            self.generated += len(batch)
+            self._ready.extend(batch)
+
+    def stats(self) -> Dict[str, int]:
+        """Counters: wallets ready, generated in the background, handed out and made on demand."""
+        return {
+            'ready': len(self._ready),
+            'generated': self.generated,
+            'handed_out': self.handed_out,
+            'made_on_demand': self.made_on_demand,
+        }
+
+
+class WalletExecutors:
+    """A SnipeExecutor per user, signing with the wallet the pool handed them.
+
+    A user's first buy loads their keystore, decrypts it off the event loop
+    and syncs the wallet's nonce; later buys reuse that executor, so every
+    wallet has a single local nonce manager. Concurrent first buys of one
+    user share the load. All executors share the RPC client and one fee
+    oracle, kept fresh between start() and stop().
+    """
+
+    def __init__(self, repo: AsyncWalletRepository, password: str, rpc: JsonRpcClient,
+                 executor: Optional[Executor] = None, **options: Any):
+        self.repo = repo
+        self.password = password
+        self.rpc = rpc
+        self.executor = executor
+        self.options = options
+        self.fees = FeeOracle(rpc)
+        self._wallets: Dict[int, SnipeExecutor] = {}
+        self._loading: Dict[int, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._wallets)
+
+    async def start(self):
+        """Take a first fee estimate and keep fees fresh in the background."""
+        await self.fees.refresh()
+        self.fees.start()
+
+    async def stop(self):
+        await self.fees.stop()
+
+    async def get(self, tg_id: int) -> Optional[SnipeExecutor]:
+        """The executor of a user's wallet; None when they have not been given one."""
+        wallet = self._wallets.get(tg_id)
+        if wallet is not None:
+            return wallet
+        task = self._loading.get(tg_id)
+        if task is None:
+            task = self._loading[tg_id] = asyncio.create_task(self._load(tg_id))
+        return await task
+
+    async def _load(self, tg_id: int) -> Optional[SnipeExecutor]:
+        try:
+            stored = await self.repo.find_by_tg_id(tg_id)
+            if stored is None:
+                return None
+            loop = asyncio.get_running_loop()
+            key = await loop.run_in_executor(self.executor, decrypt_wallet, stored['keystore'], self.password)
+            wallet = SnipeExecutor(self.rpc, key, fee_oracle=self.fees, **self.options)
+            await wallet.nonces.sync()
+            self._wallets[tg_id] = wallet
+            return wallet
+        finally:
+            del self._loading[tg_id]
@@ -12,4 +12,8 @@ class State(Enum):
     AWAITING_ETH_LIMIT = 7,
     AWAITING_BLACKLIST_ADD = 8,
     AWAITING_BLACKLIST_REMOVE = 9,
-    AWAITING_INPUT_TIME_SLOT = 10
\ No newline at end of file
+    AWAITING_INPUT_TIME_SLOT = 10,
+    AWAITING_GROUP = 11
+
+# Settings a user starts with until they configure their own.
+DEFAULT_TIMINGS = '00:00 - 00:00'
@@ -1,219 +1,478 @@
+import asyncio
 import logging
+import os
 import re
+from typing import List, Optional, Set
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackQueryHandler, ConversationHandler
+from pymongo.errors import PyMongoError
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import Application, CommandHandler, MessageHandler, filters, ConversationHandler
 from telegram.ext import CallbackContext
+from telegram.helpers import escape_markdown
+from telegram.request import BaseRequest
 
+import metrics
 from constants import State
-from repo.user import UserRepository
+from bot.menus import MenuEngine, Rows, Screen
+from bot.outbound import OutboundDispatcher, Priority
+from bot.shards import ShardLink, run_sharded
+from bot.updates import ChatOrderedUpdateProcessor
+from bot.webhook import run_webhook
+from chain.rpc import JsonRpcClient, RpcError
+from chain.token_cache import REJECT_REVERTED, TokenCache
+from chain.wallets import WalletExecutors, WalletPool
+from chain.tokens import TokenReader
+from repo.config_cache import ConfigCache, build_user_config, config_document
+from repo.dbhelper import AsyncMongoHelper, close_async_clients
+from repo.group import AsyncGroupRepository
+from repo.persistence import MongoPersistence
+from repo.user import AsyncUserRepository
+from repo.wallet import AsyncWalletRepository
+from signals.access import AccessIndex
+from signals.active_hours import ActiveHoursScheduler, compile_slots
+from signals.dedup import SeenWindow, fresh_per_recipient
+from signals.groups import GroupDirectory
+from signals.journal import SignalJournal
+from signals.parser import TokenMention, extract_from_message, is_buyable
+from signals.subscriptions import SubscriptionIndex, index_user_rules
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Setup DB
-user_repo = UserRepository()
-
-
-# A dictionary to store user data temporarily during the setup
-# todo: To be replace by DB
-user_data = {
-    'u_id': 2,
-    'tx_id': 'test',
-    'timings' : '00:00 - 00:00'
-}
-
-# Store group configurations
-# todo: To be replace by DB and group ids
-group_configs = {
-    'Group1': {
-        'eth_limit': 0.1,
-        'sol_limit': 0.8,
-        'blacklist': set()
-    },
-    'Group2': {
-        'eth_limit': 0.1,
-        'sol_limit': 0.8,
-        'blacklist': set()
-    }
-}
+# Setup DB; USER_WRITE_BEHIND=<seconds> batches the menu writes into periodic bulk writes
+user_repo = AsyncUserRepository(write_behind=float(os.environ.get('USER_WRITE_BEHIND', '0')))
+
+# User and group configurations, cached in memory in front of the DB
+config_cache = ConfigCache(user_repo)
+
+# Blacklist/whitelist rules per (user, group), resolved to sender ids
+access_index = AccessIndex()
+
+# Users whose active time slot is currently open
+active_hours = ActiveHoursScheduler()
+
+# Group chat -> the users subscribed to it and their buy limits, so a group message fans out without DB queries
+subscriptions = SubscriptionIndex()
+
+# Titles of the group chats seen, and which groups each bot user posts in, for the group menu;
+# stored in the DB and shared with the other shards so it survives restarts
+group_directory = GroupDirectory()
+group_repo = AsyncGroupRepository()
+_group_writes: Set[asyncio.Task] = set()
+
+# (user, token) calls already acted on, so reposts across groups fire once
+seen_signals = SeenWindow(window=float(os.environ.get('SIGNAL_DEDUP_WINDOW', '300')))
+
+# Token calls seen in subscribed groups, journalled for replay when SIGNAL_JOURNAL_DIR is set
+journal: Optional[SignalJournal] = None
+
+# Every outgoing Bot API call goes through this rate-limited queue
+outbound = OutboundDispatcher()
+
+# Pre-generated wallets for the Wallet Generate button, enabled when WALLET_KEYSTORE_PASSWORD is set
+wallet_repo = AsyncWalletRepository()
+wallet_pool: Optional[WalletPool] = None
+
+# Buys signed with each user's own wallet, enabled when RPC_URL and WALLET_KEYSTORE_PASSWORD are set
+executors: Optional[WalletExecutors] = None
+token_cache: Optional[TokenCache] = None
+
+# Latency metrics, served over HTTP when METRICS_PORT is set; /stats is limited to ADMIN_IDS
+metrics_server: Optional[metrics.MetricsServer] = None
+ADMIN_IDS = {int(admin) for admin in os.environ.get('ADMIN_IDS', '').split(',') if admin.strip()}
+
+# This process's link to the ingress when running as one of BOT_SHARDS worker processes
+shard: Optional[ShardLink] = None
+
+# todo To be replaced by TG bot token
+BOT_TOKEN = "YOUR_BOT_TOKEN"
+
+def apply_user_rules(tg_id: int, config: dict) -> None:
+    """Put a user's subscriptions, blacklists and active hours into the hot-path indexes."""
+    try:
+        index_user_rules(tg_id, config, subscriptions, access_index, active_hours)
+    except ValueError:
+        logger.warning(f"User {tg_id} has an invalid stored time slot: {config['timings']}")
+
+def sync_subscriptions(tg_id: int, config: dict) -> None:
+    """Settings listener: follow a user's limit changes in the subscription index."""
+    subscriptions.sync_user(tg_id, config)
+
+config_cache.listeners.append(sync_subscriptions)
+
+async def load_subscriptions() -> int:
+    """Fill the hot-path indexes with every user who has group settings stored; returns their number."""
+    docs = await user_repo.find_with_groups()
+    for doc in docs:
+        apply_user_rules(doc['tg_id'], build_user_config(doc))
+    group_directory.add_users(doc['tg_id'] for doc in docs)
+    return len(docs)
+
+async def load_group_directory() -> int:
+    """Fill the group directory from the DB, with every user who has started the bot as a member candidate."""
+    groups = await group_repo.find_groups()
+    group_directory.load(groups)
+    group_directory.add_users(await user_repo.find_tg_ids())
+    return len(groups)
+
+def record_group(group: str, title: Optional[str], member: Optional[int] = None, publish: bool = True) -> None:
+    """Put a group's title and a member into the directory; anything new is stored and sent to the other shards."""
+    if not group_directory.observe(group, title, member) or not publish:
+        return
+    task = asyncio.ensure_future(store_group(group, title, member))
+    _group_writes.add(task)
+    task.add_done_callback(_group_writes.discard)
+    if shard is not None:
+        shard.publish_group(group, title, member)
+
+async def store_group(group: str, title: Optional[str], member: Optional[int]) -> None:
+    try:
+        await group_repo.record(group, title, member)
+    except PyMongoError as error:
+        logger.warning(f"Could not store group {group}: {error!r}")
+
+async def load_user_rules(tg_id: int, publish: bool = True) -> None:
+    """Load the stored settings of a user into the hot-path indexes."""
+    config = await config_cache.get_user_config(tg_id)
+    apply_user_rules(tg_id, config)
+    group_directory.add_users((tg_id,))
+    if shard is not None and publish:
+        # Group messages for this user may be handled by any shard
+        publish_user_config(tg_id, config)
+
+def publish_user_config(tg_id: int, config: Optional[dict]) -> None:
+    """Send a user's settings to the other shards."""
+    shard.publish_config(tg_id, config_document(config) if config is not None else None)
+
+async def reload_user_rules(tg_id: int, document: Optional[dict]) -> None:
+    """Another shard loaded or changed the settings of a user: take their copy."""
+    if document is None:
+        config_cache.invalidate(tg_id)
+    else:
+        config_cache.adopt(tg_id, document)
+    await load_user_rules(tg_id, publish=False)
 
 async def start(update: Update, context: CallbackContext) -> State:
     """Handle the /start command."""
     logger.info(f"User {update.message.from_user.id} started the bot")
-    user_repo.initiate_doc(tg_id = update.message.from_user.id)
-    return await show_main_menu(update, context)
+    await user_repo.initiate_doc(tg_id = update.message.from_user.id)
+    await load_user_rules(update.message.from_user.id)
+    return await menus.show(update, context, State.SELECTING_CONFIG)
 
 async def configure(update: Update, context: CallbackContext) -> State:
     """Handle the /configure command."""
     logger.info(f"User {update.message.from_user.id} configure the bot")
-    user_repo.initiate_doc(tg_id = update.message.from_user.id)
-    return await show_main_menu(update, context)
+    await user_repo.initiate_doc(tg_id = update.message.from_user.id)
+    await load_user_rules(update.message.from_user.id)
+    return await menus.show(update, context, State.SELECTING_CONFIG)
 
 async def echo(update: Update, context: CallbackContext) -> None:
     """Echo the user message."""
-    user_text = update.message.text  # Get the user's message
+    span = metrics.span()
+    span.mark('receive')
+    user_text = update.message.text or update.message.caption  # Get the user's message
     if update.message.chat.type in ['group', 'supergroup']:
-        # Send the reply in DM (Direct Message) to the user
+        # Send the reply in DM (Direct Message) to every subscriber of the group
         user_id = update.message.from_user.id
-        u_id = user_data['u_id']
+        group = str(update.message.chat.id)
+        access_index.observe(user_id, update.message.from_user.username)
+        # Only bot users are tracked as members, not every sender
+        record_group(group, update.message.chat.title, user_id if user_id in group_directory else None)
+        recipients = subscriptions.select(group, user_id, active_hours, access_index)
+        # With the journal on, calls nobody acted on are kept too, for replays with other settings
+        if not recipients and (journal is None or subscriptions.subscribers(group) is None):
+            return
+        span.mark('filter')
+        tokens = extract_from_message(update.message)
+        span.mark('parse')
+        if tokens:
+            signals = fresh_per_recipient(recipients, tokens, seen_signals)
+            if shard is not None:
+                # Reposts in groups owned by other shards are only visible to the ingress; one claim for everyone
+                keys = [(tg_id, token.address) for tg_id, _, fresh in signals for token in fresh]
+                claimed = iter(await shard.claim(keys)) if keys else iter(())
+                signals = [(tg_id, eth_limit, [token for token in fresh if next(claimed)])
+                           for tg_id, eth_limit, fresh in signals]
+            if journal is not None:
+                journal_signals(update.message, tokens, len(recipients), signals)
+            signals = [signal for signal in signals if signal[2]]
+            if not signals:
+                return
+        elif not recipients:
+            return
+        else:
+            signals = [(tg_id, eth_limit, []) for tg_id, eth_limit in recipients]
+        span.mark('decide')
         user_name = update.message.from_user.first_name
-        await context.bot.send_message(u_id,
-                                       f"""{user_name} Yes, working""")
+        for tg_id, _, fresh in signals:
+            found = "".join(f"\n{token.address} ({token.chain or token.kind})" for token in fresh)
+            outbound.send_message(tg_id, f"""{user_name} Yes, working{found}""", coalesce_key='alpha')
+        span.mark('send')
+        if tokens:
+            await asyncio.gather(*(snipe(tg_id, group, fresh, span, eth_limit) for tg_id, eth_limit, fresh in signals))
     else:
-        await update.message.reply_text(f"You said: {user_text}")
+        outbound.reply_to(update.message, f"You said: {user_text}", priority=Priority.NOTIFY)
+
+def journal_signals(message, tokens: List[TokenMention], recipients: int, signals: list) -> None:
+    """Append the token calls of a group message to the journal, with how many recipients acted on each."""
+    fired = {}
+    for _, _, fresh in signals:
+        for token in fresh:
+            fired[token.address] = fired.get(token.address, 0) + 1
+    sender = message.from_user
+    # One time for every token of the message, which is how replay tells messages apart
+    timestamp = journal.clock()
+    for token in tokens:
+        journal.append(message.chat.id, sender.id, sender.username, token, recipients, fired.get(token.address, 0),
+                       timestamp)
+
+def forget_signals(keys: List[tuple], publish: bool = True) -> None:
+    """Let (user, token) calls that were not bought through again, so their next repost is acted on."""
+    for key in keys:
+        seen_signals.forget(key)
+    if shard is not None and publish and keys:
+        # The shared window and the shard that saw the call remember it too
+        shard.forget(keys)
+
+async def snipe(tg_id: int, group: str, tokens: List[TokenMention], span=metrics.NULL_SPAN,
+                eth_limit: Optional[float] = None) -> None:
+    """Buy the EVM tokens of a signal from the user's wallet with the group's ETH limit (looked up when not given)."""
+    if eth_limit is None:
+        config = config_cache.peek_user_config(tg_id)
+        group_config = config['groups'].get(group) if config else None
+        eth_limit = group_config['eth_limit'] if group_config else 0
+    if eth_limit <= 0:
+        return
+    if shard is not None and not shard.is_owner:
+        # Only the owner shard signs, so each wallet's nonces are handed out by a single process
+        shard.forward_snipe({'tg_id': tg_id, 'group': group, 'tokens': [list(token) for token in tokens],
+                             'eth_limit': eth_limit})
+        return
+    if executors is None:
+        return
+    candidates = [token for token in tokens if is_buyable(token.kind, token.chain)]
+    if not candidates:
+        return
+    try:
+        executor = await executors.get(tg_id)
+    except Exception as error:
+        logger.error(f"Loading the wallet of user {tg_id} failed: {error!r}")
+        forget_signals([(tg_id, token.address) for token in candidates])
+        return
+    if executor is None:
+        outbound.send_message(tg_id, "⚠️ No wallet to buy with: press 🔑 Wallet Generate and fund it.",
+                              priority=Priority.SNIPE)
+        return
+    # Cached metadata first; the misses share one RPC round-trip
+    try:
+        infos = await token_cache.get_many([token.address for token in candidates])
+    except Exception as error:
+        logger.error(f"Token checks for user {tg_id} failed: {error!r}")
+        forget_signals([(tg_id, token.address) for token in candidates])
+        return
+    span.mark('token_checks')
+    # Calls the checks rejected can be acted on when reposted, e.g. once liquidity is added
+    forget_signals([(tg_id, token.address) for token, info in zip(candidates, infos) if info is None])
+    for token, info in zip(candidates, infos):
+        if info is None:
+            logger.info(f"Skipping {token.address} for user {tg_id}: {token_cache.rejection(token.address)}")
+            continue
+        try:
+            swap = await executor.execute(token.address, eth_limit)
+        except Exception as error:
+            logger.error(f"Buy of {token.address} for user {tg_id} failed: {error!r}")
+            if isinstance(error, RpcError) and 'revert' in str(error).lower():
+                # The token itself refused the swap; other users' calls of it are skipped too
+                token_cache.reject(token.address, REJECT_REVERTED)
+            outbound.send_message(tg_id, f"❌ Buy of {token.address} failed: {error}", priority=Priority.SNIPE)
+            forget_signals([(tg_id, token.address)])
+            continue
+        span.mark('buy')
+        outbound.send_message(tg_id, f"✅ Bought {token.address} for {eth_limit} ETH\nTx: {swap.tx_hash}",
+                              priority=Priority.SNIPE)
+
+async def snipe_forwarded(request: dict) -> None:
+    """Run a buy that another shard decided on."""
+    await snipe(request['tg_id'], request['group'], [TokenMention(*token) for token in request['tokens']],
+                eth_limit=request.get('eth_limit'))
+
+MAIN_MENU_TEXT = "Welcome to AixTG Bot. You sleep, I ape!\n\nPlease choose an option below:"
+MAIN_MENU_KEYBOARD = (
+    (("🚀 Configure Groups", 'configure_groups'),),
+    (("⏰ Configure Activation Timings", 'configure_timings'),),
+    (("🔑 Wallet Generate", 'gen_eth_wallet'),),
+    (("📊 Current Status", 'status'),),
+    (("🔚 Exit", 'exit'),),
+)
+BACK_TO_MAIN = (("🔙 Back to Main Menu", 'back_to_main'),)
+ADD_GROUP = (("➕ Add Group", 'add_group'),)
+GROUP_OPTIONS_KEYBOARD = (
+    (("💰 Set Limits", 'set_limits'),),
+    (("🚫 Set Blacklist", 'set_blacklist'),),
+    (("🔄 Back", 'back_to_groups'),),
+)
+LIMITS_KEYBOARD = (
+    (("Set ETH Limit(for base chain)", 'set_eth_limit'),),
+    (("🔄 Back", 'back_to_group_options'),),
+)
+BLACKLIST_KEYBOARD = (
+    (("➕ Add to Blacklist", 'add_blacklist'),),
+    (("➖ Remove from Blacklist", 'remove_blacklist'),),
+    (("🔄 Back", 'back_to_group_options'),),
+)
+TIME_KEYBOARD = (
+    (("⏰ Set Custom Time Slot", 'set_time_slot'),),
+    (("🔄 Back to Main Menu", 'back_to_main'),),
+)
+
+# Buttons on the group list; groups with settings come first
+MAX_LISTED_GROUPS = 20
+
+def selected_group_config(config: dict, context: CallbackContext) -> dict:
+    """Settings of the group picked in the menu; a group without any yet has none."""
+    return config['groups'].get(context.user_data['selected_group'], {'eth_limit': 0.0, 'blacklist': set()})
+
+async def wallet_text(update: Update, context: CallbackContext) -> str:
+    """The user's wallet, handing them one from the pre-generated pool on first use."""
+    if wallet_pool is None:
+        return "Wallet generation is not available right now."
+    user_id = update.callback_query.from_user.id
+    try:
+        wallet = await wallet_repo.find_by_tg_id(user_id) or await wallet_pool.take(user_id)
+    except PyMongoError as error:
+        logger.error(f"Could not hand a wallet to user {user_id}: {error!r}")
+        return "❌ Your wallet could not be loaded right now. Please try again later."
+    return f"🔑 Your wallet:\n`{wallet['address']}`\n\nSend ETH on Base to this address to fund your buys."
+
+async def group_list(update: Update, context: CallbackContext) -> Rows:
+    """Two groups per row, by title; the callback data carries the group key."""
+    user_id = update.callback_query.from_user.id
+    config = await config_cache.get_user_config(user_id)
+    listed = [(group_directory.title(group), f"group:{group}")
+              for group in group_directory.groups_of(user_id, config['groups'], MAX_LISTED_GROUPS)]
+    return tuple(tuple(listed[index:index + 2]) for index in range(0, len(listed), 2)) + (ADD_GROUP, BACK_TO_MAIN)
+
+async def select_group(update: Update, context: CallbackContext) -> State:
+    context.user_data['selected_group'] = update.callback_query.data.split(':', 1)[1]
+    return State.SELECTING_GROUP_OPTIONS
 
-async def exit_conv(update: Update, context: CallbackContext) -> int:
-    await update.callback_query.edit_message_text("👋👋👋 Goodbye! Use /start to restart the bot.👋👋👋")
-    return ConversationHandler.END
+# A group typed in by hand: its chat id, @username or t.me link
+GROUP_ID = re.compile(r'-\d+')
+GROUP_LINK = re.compile(r'(?:(?:https?://)?t\.me/|@)(\w{4,})/?')
 
-async def back_to_main(update: Update, context: CallbackContext) -> State:
-    """Handle the back to main menu button."""
-    logger.info(f"User {update.callback_query.from_user.id} is returning to the main menu")
-    await update.callback_query.answer()
-    return await show_main_menu(update, context, is_new=False)
-
-async def show_time(update: Update, context: CallbackContext) -> State:
-    query = update.callback_query
-    logger.info(f"User {str(query.from_user.id)[:4]}... is configuring time.")
-    await query.answer()
-
-    keyboard = [
-        [InlineKeyboardButton("⏰ Set Custom Time Slot", callback_data='set_time_slot')],
-        [InlineKeyboardButton("🔄 Back to Main Menu", callback_data='back_to_main')]
-    ]
-
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(
-        "⏰Time Configuration\n\n"
-        f"Activate Time for the Bot (in UTC): {user_data['timings']}\n\n"
-        "Choose an action:"
-        "",
-        reply_markup=reply_markup,
-        parse_mode="Markdown"
-    )
-    return State.SELECTING_BOT_TIME
+async def add_group(update: Update, context: CallbackContext) -> State:
+    """Handle a group the user typed in, for groups they read but never post in."""
+    text = update.message.text.strip()
+    user_id = update.message.from_user.id
+    if GROUP_ID.fullmatch(text):
+        group, title = text, None
+    else:
+        link = GROUP_LINK.fullmatch(text)
+        chat = None
+        if link:
+            try:
+                chat = await context.bot.get_chat('@' + link.group(1))
+            except TelegramError as error:
+                logger.info(f"User {user_id} added unknown group {text}: {error!r}")
+        if chat is None or chat.type not in ('group', 'supergroup'):
+            menus.reply(update.message,
+                "❌ Group not found! Please enter the group's chat id (e.g., -1001234567890), @username or t.me link.",
+                ((("🔄 Cancel", 'back_to_groups'),),)
+            )
+            return State.AWAITING_GROUP
+        group, title = str(chat.id), chat.title
+    record_group(group, title, user_id)
+    context.user_data['selected_group'] = group
+    return await menus.show(update, context, State.SELECTING_GROUP_OPTIONS)
+
+async def group_options_text(update: Update, context: CallbackContext) -> str:
+    title = escape_markdown(group_directory.title(context.user_data['selected_group']))
+    return f"{title} Configuration\n\nChoose what you want to configure:"
+
+async def limits_text(update: Update, context: CallbackContext) -> str:
+    config = selected_group_config(await config_cache.get_user_config(update.effective_user.id), context)
+    title = escape_markdown(group_directory.title(context.user_data['selected_group']))
+    return (f"Current Limits for {title}\n\n"
+            f"ETH Limit(for base chain): {config['eth_limit']}\n"
+            "Select an option to modify:")
+
+async def blacklist_text(update: Update, context: CallbackContext) -> str:
+    blacklist = selected_group_config(await config_cache.get_user_config(update.effective_user.id),
+                                      context)['blacklist']
+    title = escape_markdown(group_directory.title(context.user_data['selected_group']))
+    listed = "\n".join(sorted(blacklist)) if blacklist else "No users in blacklist"
+    return f"Blacklist for {title}\n\n{listed}\n\nChoose an action:"
+
+async def time_text(update: Update, context: CallbackContext) -> str:
+    config = await config_cache.get_user_config(update.effective_user.id)
+    return f"⏰Time Configuration\n\nActivate Time for the Bot (in UTC): {config['timings']}\n\nChoose an action:"
 
-async def time_slot_menu(update: Update, context: CallbackContext) -> State:
-    """Ask user to enter a custom time slot."""
-    query = update.callback_query
-    await query.answer()
+async def request_limit(update: Update, context: CallbackContext) -> State:
+    """Remember which limit the typed number is for."""
+    context.user_data['setting_limit'] = update.callback_query.data
+    return State.AWAITING_ETH_LIMIT
 
-    keyboard = [[InlineKeyboardButton("🔙 Back to Main Menu", callback_data='back_to_main')]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+async def request_blacklist_handle(update: Update, context: CallbackContext) -> State:
+    """Remember whether the typed handle is added or removed."""
+    action = update.callback_query.data
+    context.user_data['blacklist_action'] = action
+    return State.AWAITING_BLACKLIST_ADD if action == 'add_blacklist' else State.AWAITING_BLACKLIST_REMOVE
 
-    await query.edit_message_text(
-        "Please enter a custom time slot in the format `HH:MM - HH:MM` (e.g., 09:00 - 18:00):",
-        reply_markup=reply_markup,
-        parse_mode="Markdown"
-    )
-    return State.AWAITING_INPUT_TIME_SLOT
+async def exit_conv(update: Update, context: CallbackContext) -> int:
+    menus.edit(update.callback_query, "👋👋👋 Goodbye! Use /start to restart the bot.👋👋👋")
+    return ConversationHandler.END
 
 async def input_time_slot(update: Update, context: CallbackContext) -> State:
     """Handle user input for custom time slots."""
     user_input = update.message.text.strip()
 
-    # Validate time slot format
-    time_slot_pattern = r"^\d{2}:\d{2} - \d{2}:\d{2}$"
-    if not re.match(time_slot_pattern, user_input):
-        keyboard = [[InlineKeyboardButton("🔄 Cancel", callback_data='back_to_main')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(
+    # Validate and compile the time slots
+    try:
+        window = compile_slots(user_input)
+    except ValueError:
+        menus.reply(update.message,
             "❌ Invalid format! Please enter a time slot in the format `HH:MM - HH:MM` (e.g., 09:00 - 18:00).",
-            reply_markup=reply_markup,
-            parse_mode="Markdown"
+            ((("🔄 Cancel", 'back_to_main'),),)
         )
         return State.AWAITING_INPUT_TIME_SLOT
 
     # Store the valid time slot
     context.user_data['custom_time_slot'] = user_input
-    user_data['timings'] = user_input
+    await config_cache.set_timings(update.message.from_user.id, user_input)
+    active_hours.set_window(update.message.from_user.id, window)
 
     # Confirm and return to the main menu
-    keyboard = [[InlineKeyboardButton("🔙 Back to Main Menu", callback_data='back_to_main')]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await update.message.reply_text(
-        f"✅ Custom time slot set to: `{user_input}`",
-        reply_markup=reply_markup,
-        parse_mode="Markdown"
-    )
+    menus.reply(update.message, f"✅ Custom time slot set to: `{user_input}`", (BACK_TO_MAIN,))
     return State.SELECTING_CONFIG
 
-async def show_blacklist(update: Update, context: CallbackContext) -> State:
-    """Show current blacklist and options."""
-    query = update.callback_query
-    await query.answer()
-
-    group = context.user_data['selected_group']
-    blacklist = group_configs[group]['blacklist']
-
-    blacklist_text = "\n".join(blacklist) if blacklist else "No users in blacklist"
-
-    keyboard = [
-        [InlineKeyboardButton("➕ Add to Blacklist", callback_data='add_blacklist')],
-        [InlineKeyboardButton("➖ Remove from Blacklist", callback_data='remove_blacklist')],
-        [InlineKeyboardButton("🔄 Back", callback_data='back_to_group_options')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await query.edit_message_text(
-        f"Blacklist for {group}\n\n"
-        f"{blacklist_text}\n\n"
-        "Choose an action:",
-        reply_markup=reply_markup,
-        parse_mode="Markdown"
-    )
-    return State.SETTING_BLACKLIST
-
 async def handle_blacklist_update(update: Update, context: CallbackContext) -> State:
     """Handle adding or removing from blacklist."""
     handle = update.message.text.strip()
     if not handle.startswith('@'):
         handle = '@' + handle
 
+    user_id = update.message.from_user.id
     group = context.user_data['selected_group']
     action = context.user_data['blacklist_action']
+    config = await config_cache.get_user_config(user_id)
 
     if action == 'add_blacklist':
-        group_configs[group]['blacklist'].add(handle)
+        await config_cache.add_to_blacklist(user_id, group, handle)
+        access_index.deny_handle((user_id, group), handle)
         message = f"✅ Added {handle} to blacklist"
     else:
-        if handle in group_configs[group]['blacklist']:
-            group_configs[group]['blacklist'].remove(handle)
+        if handle in selected_group_config(config, context)['blacklist']:
+            await config_cache.remove_from_blacklist(user_id, group, handle)
+            access_index.remove_handle((user_id, group), handle)
             message = f"✅ Removed {handle} from blacklist"
         else:
             message = f"❌ {handle} was not in the blacklist"
 
-    keyboard = [[InlineKeyboardButton("🔄 Back to Blacklist", callback_data='back_to_blacklist')]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await update.message.reply_text(
-        message,
-        reply_markup=reply_markup,
-        parse_mode="Markdown"
-    )
+    menus.reply(update.message, message, ((("🔄 Back to Blacklist", 'back_to_blacklist'),),))
     return State.SETTING_BLACKLIST
 
-async def request_blacklist_handle(update: Update, context: CallbackContext) -> State:
-    """Request Telegram handle for blacklist operation."""
-    query = update.callback_query
-    await query.answer()
-
-    action = query.data
-    context.user_data['blacklist_action'] = action
-
-    keyboard = [[InlineKeyboardButton("🔄 Cancel", callback_data='cancel_blacklist')]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await query.edit_message_text(
-        f"Please enter the Telegram handle to {'add to' if action == 'add_blacklist' else 'remove from'} the blacklist:",
-        reply_markup=reply_markup,
-        parse_mode="Markdown"
-    )
-    return State.AWAITING_BLACKLIST_ADD if action == 'add_blacklist' else State.AWAITING_BLACKLIST_REMOVE
-
 async def set_new_limit(update: Update, context: CallbackContext) -> State:
     """Handle the new limit value."""
     try:
@@ -225,208 +484,256 @@ async def set_new_limit(update: Update, context: CallbackContext) -> State:
         group = context.user_data['selected_group']
         limit_type = context.user_data['setting_limit']
 
-        if limit_type == 'set_eth_limit':
-            group_configs[group]['eth_limit'] = new_limit
-        else:
-            group_configs[group]['sol_limit'] = new_limit
-
-        keyboard = [[InlineKeyboardButton("🔄 Back to Limits", callback_data='set_limits')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        field = 'eth_limit' if limit_type == 'set_eth_limit' else 'sol_limit'
+        await config_cache.set_group_limit(update.message.from_user.id, group, field, new_limit)
 
-        await update.message.reply_text(
+        menus.reply(update.message,
             f"Limit Updated Successfully!\n\n"
             f"New {'ETH' if limit_type == 'set_eth_limit' else 'SOL'} limit: {new_limit}",
-            reply_markup=reply_markup,
-            parse_mode="Markdown"
+            ((("🔄 Back to Limits", 'set_limits'),),)
         )
         return State.SETTING_LIMITS
 
     except ValueError:
-        await update.message.reply_text(
-            "Please enter a valid positive number.",
-            parse_mode="Markdown"
-        )
+        menus.reply(update.message, "Please enter a valid positive number.")
         return State.AWAITING_ETH_LIMIT
 
-async def request_limit(update: Update, context: CallbackContext) -> State:
-    """Request new limit value from user."""
-    query = update.callback_query
-    logger.info(f"User {str(query.from_user.id)[:4]}... is setting a new limit.")
-    await query.answer()
-
-    limit_type = query.data
-    context.user_data['setting_limit'] = limit_type
-
-    keyboard = [[InlineKeyboardButton("🔄 Cancel", callback_data='cancel_limit_setting')]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await query.edit_message_text(
-        f"Please enter the new ETH limit as a number:",
-        reply_markup=reply_markup,
-        parse_mode="Markdown"
-    )
-    return State.AWAITING_ETH_LIMIT
-
-async def show_limits(update: Update, context: CallbackContext) -> State:
-    """Show current limits and options to set new ones."""
-    query = update.callback_query
-    logger.info(f"User {str(query.from_user.id)[:4]}... is viewing current limits.")
-    await query.answer()
-
-    print(context.user_data['selected_group'])
-    group = context.user_data['selected_group']
-    config = group_configs[group]
-
-    keyboard = [
-        [InlineKeyboardButton("Set ETH Limit(for base chain)", callback_data='set_eth_limit')],
-        [InlineKeyboardButton("🔄 Back", callback_data='back_to_group_options')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await query.edit_message_text(
-        f"Current Limits for {group}\n\n"
-        f"ETH Limit(for base chain): {config['eth_limit']}\n"
-        "Select an option to modify:",
-        reply_markup=reply_markup,
-        parse_mode="Markdown"
-    )
-    return State.SETTING_LIMITS
-
-async def show_group_options(update: Update, context: CallbackContext) -> State:
-    """Show options for the selected group."""
-    query = update.callback_query
-    logger.info(f"User {str(query.from_user.id)[:4]}... is viewing group options.")
-    await query.answer()
-
-
-    if query.data in ['Group1', 'Group2']:
-        grp_ch = query.data
-        context.user_data['selected_group'] = grp_ch
-    elif context.user_data['selected_group'] in ['Group1', 'Group2']:
-        grp_ch = context.user_data['selected_group']
-        context.user_data['selected_group'] = grp_ch
-
-    print(context.user_data['selected_group'])
-    keyboard = [
-        [InlineKeyboardButton("💰 Set Limits", callback_data='set_limits')],
-        [InlineKeyboardButton("🚫 Set Blacklist", callback_data='set_blacklist')],
-        [InlineKeyboardButton("🔄 Back", callback_data='back_to_groups')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await query.edit_message_text(
-        f"{grp_ch} Configuration\n\n"
-        "Choose what you want to configure:",
-        reply_markup=reply_markup,
-        parse_mode="Markdown"
-    )
-    return State.SELECTING_GROUP_OPTIONS
-
-async def configure_groups(update: Update, context: CallbackContext) -> State:
-    """Start the group configuration."""
-    query = update.callback_query
-    logger.info(f"User {str(query.from_user.id)[:4]}... is configuring groups.")
-    await query.answer()
-    keyboard = [
-        [InlineKeyboardButton("🔒 Group1", callback_data="Group1"),
-         InlineKeyboardButton("🔓 Group2", callback_data="Group2")],
-        [InlineKeyboardButton("🔄 Back to Main Menu", callback_data='back_to_main')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(
-        "Group Configuration\n\n"
-        "Select the group you want to configure:",
-        reply_markup=reply_markup,
-        parse_mode="Markdown"
-    )
-    return State.SELECTING_GROUP
-
-async def show_main_menu(update: Update, context: CallbackContext, is_new: bool = True) -> State:
-    """Show the main menu with all options."""
-    logger.info("Displaying the main menu")
-    keyboard = [
-        [InlineKeyboardButton("🚀 Configure Groups", callback_data='configure_groups')],
-        [InlineKeyboardButton("⏰ Configure Activation Timings", callback_data='configure_timings')],
-        [InlineKeyboardButton("🔑 Wallet Generate", callback_data='gen_eth_wallet')],
-        [InlineKeyboardButton("📊 Current Status", callback_data='status')],
-        [InlineKeyboardButton("🔚 Exit", callback_data='exit')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    text = "Welcome to AixTG Bot. You sleep, I ape!\n\nPlease choose an option below:"
-
-    if is_new:
-        await update.message.reply_text(text, reply_markup=reply_markup, parse_mode="Markdown")
-    else:
-        await update.callback_query.edit_message_text(text, reply_markup=reply_markup, parse_mode="Markdown")
-    return State.SELECTING_CONFIG
-
-
-def main() -> None:
-    """Run the bot."""
-    # todo To be replaced by TG bot token
-    application = Application.builder().token("YOUR_BOT_TOKEN").build()
-
-    states_in = {
-
-        State.SELECTING_CONFIG: [
-            CallbackQueryHandler(configure_groups, pattern="^configure_groups$"),
-            CallbackQueryHandler(show_time, pattern="^configure_timings$"),
-            CallbackQueryHandler(exit_conv, pattern="^exit$"),
-            # CallbackQueryHandler(gen_eth_wallet, pattern="^gen_eth_wallet"),
-            # CallbackQueryHandler(menu_option, pattern="^status"),
-            CallbackQueryHandler(back_to_main, pattern="^back_to_main$")
-        ],
-        State.SELECTING_GROUP: [
-            CallbackQueryHandler(show_group_options, pattern="^(Group1|Group2)$"),
-            CallbackQueryHandler(back_to_main, pattern="^back_to_main$")
-        ],
-        State.SELECTING_GROUP_OPTIONS: [
-            CallbackQueryHandler(show_limits, pattern="^set_limits$"),
-            CallbackQueryHandler(show_blacklist, pattern="^set_blacklist$"),
-            CallbackQueryHandler(configure_groups, pattern="^back_to_groups$")
-        ],
-        State.SELECTING_BOT_TIME: [
-            CallbackQueryHandler(time_slot_menu, pattern="set_time_slot"),
-            CallbackQueryHandler(back_to_main, pattern="^back_to_main$")
-        ],
-        State.SETTING_LIMITS: [
-            CallbackQueryHandler(request_limit, pattern="^set_eth_limit$"),
-            CallbackQueryHandler(show_limits, pattern="^set_limits$"),
-            CallbackQueryHandler(show_group_options, pattern="^back_to_group_options$")
-        ],
-        State.SETTING_BLACKLIST: [
-            CallbackQueryHandler(request_blacklist_handle, pattern="^(add|remove)_blacklist$"),
-            CallbackQueryHandler(show_group_options, pattern="^back_to_group_options$"),
-            CallbackQueryHandler(show_blacklist, pattern="^back_to_blacklist$")
-        ],
-        State.AWAITING_ETH_LIMIT: [
-            MessageHandler(filters.TEXT & ~filters.COMMAND, set_new_limit),
-            CallbackQueryHandler(show_limits, pattern="^cancel_limit_setting$")
-        ],
-        State.AWAITING_BLACKLIST_ADD: [
-            MessageHandler(filters.TEXT & ~filters.COMMAND, handle_blacklist_update),
-            CallbackQueryHandler(show_blacklist, pattern="^cancel_blacklist$")
-        ],
-        State.AWAITING_BLACKLIST_REMOVE: [
-            MessageHandler(filters.TEXT & ~filters.COMMAND, handle_blacklist_update),
-            CallbackQueryHandler(show_blacklist, pattern="^cancel_blacklist$")
-        ],
-        State.AWAITING_INPUT_TIME_SLOT: [
-            MessageHandler(filters.TEXT & ~filters.COMMAND, input_time_slot),
-            CallbackQueryHandler(back_to_main, pattern="^back_to_main$")
-        ],
-    }
+# The menu tree: each screen's text, buttons and where the buttons lead.
+# The ConversationHandler states are built from it.
+menus = MenuEngine([
+    Screen(State.SELECTING_CONFIG, MAIN_MENU_TEXT, MAIN_MENU_KEYBOARD, {
+        'configure_groups': State.SELECTING_GROUP,
+        'configure_timings': State.SELECTING_BOT_TIME,
+        'gen_eth_wallet': State.SELECTING_WALLET,
+        'exit': exit_conv,
+        'back_to_main': State.SELECTING_CONFIG,
+    }),
+    Screen(State.SELECTING_WALLET, wallet_text, (BACK_TO_MAIN,), {
+        'back_to_main': State.SELECTING_CONFIG,
+    }),
+    Screen(State.SELECTING_GROUP, "Group Configuration\n\nSelect the group you want to configure:", group_list, {
+        'group:.+': select_group,
+        'add_group': State.AWAITING_GROUP,
+        'back_to_main': State.SELECTING_CONFIG,
+    }),
+    Screen(State.AWAITING_GROUP, "Please enter the group's chat id (e.g., -1001234567890), @username or t.me link:",
+           ((("🔄 Cancel", 'back_to_groups'),),), {
+        'back_to_groups': State.SELECTING_GROUP,
+    }, on_text=add_group),
+    Screen(State.SELECTING_GROUP_OPTIONS, group_options_text, GROUP_OPTIONS_KEYBOARD, {
+        'set_limits': State.SETTING_LIMITS,
+        'set_blacklist': State.SETTING_BLACKLIST,
+        'back_to_groups': State.SELECTING_GROUP,
+    }),
+    Screen(State.SELECTING_BOT_TIME, time_text, TIME_KEYBOARD, {
+        'set_time_slot': State.AWAITING_INPUT_TIME_SLOT,
+        'back_to_main': State.SELECTING_CONFIG,
+    }),
+    Screen(State.SETTING_LIMITS, limits_text, LIMITS_KEYBOARD, {
+        'set_eth_limit': request_limit,
+        'set_limits': State.SETTING_LIMITS,
+        'back_to_group_options': State.SELECTING_GROUP_OPTIONS,
+    }),
+    Screen(State.SETTING_BLACKLIST, blacklist_text, BLACKLIST_KEYBOARD, {
+        '(add|remove)_blacklist': request_blacklist_handle,
+        'back_to_group_options': State.SELECTING_GROUP_OPTIONS,
+        'back_to_blacklist': State.SETTING_BLACKLIST,
+    }),
+    Screen(State.AWAITING_ETH_LIMIT, "Please enter the new ETH limit as a number:",
+           ((("🔄 Cancel", 'cancel_limit_setting'),),), {
+        'cancel_limit_setting': State.SETTING_LIMITS,
+    }, on_text=set_new_limit),
+    Screen(State.AWAITING_BLACKLIST_ADD, "Please enter the Telegram handle to add to the blacklist:",
+           ((("🔄 Cancel", 'cancel_blacklist'),),), {
+        'cancel_blacklist': State.SETTING_BLACKLIST,
+    }, on_text=handle_blacklist_update),
+    Screen(State.AWAITING_BLACKLIST_REMOVE, "Please enter the Telegram handle to remove from the blacklist:",
+           ((("🔄 Cancel", 'cancel_blacklist'),),), {
+        'cancel_blacklist': State.SETTING_BLACKLIST,
+    }, on_text=handle_blacklist_update),
+    Screen(State.AWAITING_INPUT_TIME_SLOT,
+           "Please enter a custom time slot in the format `HH:MM - HH:MM` (e.g., 09:00 - 18:00).\n"
+           "Separate several slots with commas (e.g., 22:00 - 02:00, 09:00 - 12:00):",
+           (BACK_TO_MAIN,), {
+        'back_to_main': State.SELECTING_CONFIG,
+    }, on_text=input_time_slot),
+], lambda: outbound)
+
+
+async def stats(update: Update, context: CallbackContext) -> None:
+    """Handle the /stats admin command: latency percentiles of the pipeline."""
+    if update.message.from_user.id not in ADMIN_IDS:
+        return
+    if not metrics.REGISTRY.enabled:
+        outbound.reply_to(update.message, "Metrics are disabled, set METRICS_PORT to enable them.")
+        return
+    outbound.reply_to(update.message, metrics.format_summary(metrics.REGISTRY.summary()))
+
+
+async def on_startup(application: Application) -> None:
+    """Start the background tasks that live alongside the bot."""
+    global executors, token_cache, metrics_server, wallet_pool, journal
+    try:
+        await user_repo.ensure_indexes()
+    except PyMongoError as error:
+        logger.error(f"Could not create the user indexes: {error!r}")
+    try:
+        logger.info(f"Loaded the group subscriptions of {await load_subscriptions()} users")
+    except PyMongoError as error:
+        logger.error(f"Could not load the group subscriptions: {error!r}")
+    try:
+        await group_repo.ensure_indexes()
+        logger.info(f"Loaded {await load_group_directory()} groups into the group directory")
+    except PyMongoError as error:
+        logger.error(f"Could not load the group directory: {error!r}")
+    user_repo.start()
+    if os.environ.get('WALLET_KEYSTORE_PASSWORD'):
+        try:
+            await wallet_repo.ensure_indexes()
+        except PyMongoError as error:
+            logger.error(f"Could not create the wallet indexes: {error!r}")
+        wallet_pool = WalletPool(wallet_repo, os.environ['WALLET_KEYSTORE_PASSWORD'],
+                                 size=int(os.environ.get('WALLET_POOL_SIZE', '32')),
+                                 workers=int(os.environ.get('WALLET_POOL_WORKERS', '1')))
+        await wallet_pool.start()
+    if os.environ.get('SIGNAL_JOURNAL_DIR'):
+        # One directory per shard, so each process appends to its own segments
+        directory = os.environ['SIGNAL_JOURNAL_DIR']
+        journal = SignalJournal(os.path.join(directory, f'shard-{shard.index}') if shard else directory,
+                                segment_records=int(os.environ.get('SIGNAL_JOURNAL_SEGMENT', str(1 << 20))))
+    active_hours.start()
+    outbound.start(application.bot)
+    if metrics.REGISTRY.enabled:
+        metrics.REGISTRY.gauge('bot_update_queue_depth', 'Updates received but not yet picked up',
+                               application.update_queue.qsize)
+        if isinstance(application.update_processor, ChatOrderedUpdateProcessor):
+            metrics.REGISTRY.gauge('bot_updates_in_flight', 'Updates being handled or waiting for their turn',
+                                   lambda: application.update_processor.in_flight)
+        metrics.REGISTRY.gauge('outbound_queue_depth', 'Bot API calls queued for sending', outbound.__len__)
+        # Shard i serves on METRICS_PORT + i
+        metrics_server = metrics.MetricsServer(os.environ.get('METRICS_HOST', '0.0.0.0'),
+                                               int(os.environ['METRICS_PORT']) + (shard.index if shard else 0))
+        await metrics_server.start()
+    owns_wallets = shard is None or shard.is_owner
+    if owns_wallets and os.environ.get('RPC_URL') and os.environ.get('WALLET_KEYSTORE_PASSWORD'):
+        # RPC_URL may list several comma-separated endpoints, tried in order
+        rpc = JsonRpcClient([url.strip() for url in os.environ['RPC_URL'].split(',') if url.strip()])
+        token_cache = TokenCache(TokenReader(rpc))
+        executors = WalletExecutors(wallet_repo, os.environ['WALLET_KEYSTORE_PASSWORD'], rpc)
+        await executors.start()
+
+async def on_shutdown(application: Application) -> None:
+    """Stop the background tasks."""
+    await user_repo.stop()
+    if wallet_pool is not None:
+        await wallet_pool.stop()
+    await active_hours.stop()
+    if journal is not None:
+        journal.close()
+    await outbound.stop()
+    if metrics_server is not None:
+        await metrics_server.stop()
+    if executors is not None:
+        await executors.stop()
+        await executors.rpc.close()
+    await asyncio.gather(*_group_writes)
+    await close_async_clients()
+
+
+def build_application(token: str, concurrent_updates: int = 16, request: Optional[BaseRequest] = None,
+                      persistence: Optional[MongoPersistence] = None) -> Application:
+    """Build the Application with every handler; `request` replaces the HTTP transport (benchmarks, tests).
+
+    With `persistence` the menu conversation and user_data survive restarts.
+    """
+    # Updates run concurrently except those of one user in one chat, which stay in order;
+    # a user's stored state is loaded in their update's turn, before their first update is handled
+    processor = ChatOrderedUpdateProcessor(concurrent_updates, preload=persistence.load if persistence else None)
+    builder = (Application.builder().token(token)
+               .concurrent_updates(processor)
+               .post_init(on_startup).post_shutdown(on_shutdown))
+    if request is not None:
+        builder = builder.request(request)
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    application = builder.build()
 
     # Create the conversation handler
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler("start", start),
                       CommandHandler("configure", configure)],
-        states = states_in ,
+        states=menus.states(),
         fallbacks=[CommandHandler("start", start)],
+        name="menu",
+        persistent=persistence is not None,
     )
     application.add_handler(conv_handler)
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, echo))
-    application.run_polling()
+    application.add_handler(MessageHandler((filters.TEXT | filters.CAPTION) & ~filters.COMMAND, echo))
+    application.add_handler(CommandHandler("stats", stats))
+    if persistence is not None:
+        persistence.attach(application)
+    # No-op unless METRICS_PORT is set
+    metrics.instrument_handlers(application.handlers[0])
+    return application
+
+
+def attach_shard(link: ShardLink) -> None:
+    """Make this process one shard of a sharded deployment."""
+    global shard, outbound
+    shard = link
+    # Telegram's global rate limit is shared by all shards
+    outbound = OutboundDispatcher(global_rate=30.0 / link.shards)
+    config_cache.listeners.append(publish_user_config)
+    link.on_config = reload_user_rules
+    link.on_snipe = snipe_forwarded
+    link.on_forget = lambda keys: forget_signals(keys, publish=False)
+    link.on_group = lambda group, title, member: record_group(group, title, member, publish=False)
+
+
+def build_persistence() -> MongoPersistence:
+    """Conversation state and user_data store, flushed every BOT_PERSIST_INTERVAL seconds."""
+    interval = float(os.environ.get('BOT_PERSIST_INTERVAL', '5'))
+    return MongoPersistence(AsyncMongoHelper('mydb', 'conversations'), update_interval=interval,
+                            idle_ttl=float(os.environ.get('BOT_STATE_IDLE_TTL', '3600')))
+
+
+def build_shard(link: ShardLink) -> Application:
+    """Worker process setup in sharded mode."""
+    attach_shard(link)
+    return build_application(BOT_TOKEN, int(os.environ.get('BOT_CONCURRENT_UPDATES', '16')),
+                             persistence=build_persistence())
+
+
+def main() -> None:
+    """Run the bot."""
+    concurrent_updates = int(os.environ.get('BOT_CONCURRENT_UPDATES', '16'))
+    webhook = os.environ.get('BOT_MODE', 'polling') == 'webhook'
+
+    # BOT_SHARDS=N routes updates by chat to N worker processes, each running the handlers below
+    shards = int(os.environ.get('BOT_SHARDS', '1'))
+    if shards > 1:
+        options = {}
+        if webhook:
+            options = dict(webhook_url=os.environ['WEBHOOK_URL'], secret_token=os.environ['WEBHOOK_SECRET'],
+                           host=os.environ.get('WEBHOOK_HOST', '0.0.0.0'),
+                           port=int(os.environ.get('WEBHOOK_PORT', '8443')),
+                           path=os.environ.get('WEBHOOK_PATH', '/telegram'), max_connections=concurrent_updates)
+        run_sharded(build_shard, BOT_TOKEN, shards, seen_signals.window, **options)
+        return
+
+    application = build_application(BOT_TOKEN, concurrent_updates, persistence=build_persistence())
+
+    # BOT_MODE=webhook receives updates through the embedded aiohttp server instead of long polling
+    if webhook:
+        run_webhook(application,
+                    webhook_url=os.environ['WEBHOOK_URL'],
+                    secret_token=os.environ['WEBHOOK_SECRET'],
+                    host=os.environ.get('WEBHOOK_HOST', '0.0.0.0'),
+                    port=int(os.environ.get('WEBHOOK_PORT', '8443')),
+                    path=os.environ.get('WEBHOOK_PATH', '/telegram'),
+                    max_connections=concurrent_updates)
+    else:
+        application.run_polling()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,266 @@
+"""Latency histograms for the update pipeline, exposed as Prometheus text and via /stats.
+
+Instrumentation is switched on by setting METRICS_PORT. When it is off,
+handlers are not wrapped, Mongo gets no command listener and span() hands
+out a shared no-op object, so the hot path pays nothing but one attribute
+check per update.
+"""
+import functools
+import logging
+import math
+import os
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds from 1us to ~90s, each 1.5x the previous one
+DEFAULT_BUCKETS = tuple(1e-6 * 1.5 ** i for i in range(46))
+
+# perf_counter() at which the update processor picked up the current update
+received_at: ContextVar[Optional[float]] = ContextVar('received_at', default=None)
+
+
+class _Series:
+    __slots__ = ('bounds', 'counts', 'total', 'count')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Histogram:
+    """Fixed-bucket latency histogram with one series per label tuple."""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], _Series] = {}
+
+    def labels(self, *labels: str) -> _Series:
+        """The series for one label tuple; keep it around to skip the lookup on every observation."""
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = _Series(self.buckets)
+        return series
+
+    def observe(self, value: float, *labels: str):
+        self.labels(*labels).observe(value)
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series.count if series else 0
+
+    def quantile(self, q: float, *labels: str) -> Optional[float]:
+        """Estimate the q-quantile by interpolating inside the bucket that holds it."""
+        series = self._series.get(labels)
+        if not series or not series.count:
+            return None
+        rank = q * series.count
+        seen = 0
+        for index, bucket_count in enumerate(series.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else lower
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def series(self) -> List[Tuple[str, ...]]:
+        return sorted(labels for labels, series in self._series.items() if series.count)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels in self.series():
+            series = self._series[labels]
+            pairs = [f'{name}="{value}"' for name, value in zip(self.label_names, labels)]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), series.counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == math.inf else f'{bound:.6g}'
+                bucket_pairs = pairs + [f'le="{le}"']
+                lines.append(f"{self.name}_bucket{{{','.join(bucket_pairs)}}} {cumulative}")
+            label_text = f"{{{','.join(pairs)}}}" if pairs else ''
+            lines.append(f"{self.name}_sum{label_text} {series.total:.9g}")
+            lines.append(f"{self.name}_count{label_text} {series.count}")
+        return lines
+
+
+class Registry:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.histograms: Dict[str, Histogram] = {}
+        self.gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Histogram:
+        if name not in self.histograms:
+            self.histograms[name] = Histogram(name, help, labels)
+        return self.histograms[name]
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]):
+        """Register a gauge that is read only when scraped."""
+        self.gauges[name] = (help, read)
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines = []
+        for name, (help, read) in sorted(self.gauges.items()):
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {read()}"]
+        for histogram in self.histograms.values():
+            lines += histogram.render()
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> List[Tuple[str, str, int, float, float, float]]:
+        """(metric, labels, count, p50, p95, p99) for every series with data."""
+        rows = []
+        for histogram in self.histograms.values():
+            for labels in histogram.series():
+                rows.append((histogram.name, '/'.join(labels), histogram.count(*labels),
+                             histogram.quantile(0.5, *labels), histogram.quantile(0.95, *labels),
+                             histogram.quantile(0.99, *labels)))
+        return rows
+
+
+REGISTRY = Registry(enabled=bool(os.environ.get('METRICS_PORT')))
+
+HANDLER_SECONDS = REGISTRY.histogram('bot_handler_seconds', 'Handler callback duration', ('handler',))
+STAGE_SECONDS = REGISTRY.histogram('bot_stage_seconds', 'Group message pipeline stage duration', ('stage',))
+MONGO_SECONDS = REGISTRY.histogram('mongo_command_seconds', 'MongoDB command duration', ('command',))
+TELEGRAM_SECONDS = REGISTRY.histogram('telegram_call_seconds', 'Outbound Bot API call duration', ('method',))
+
+
+_stage_series: Dict[str, _Series] = {}
+
+
+class Span:
+    """Times consecutive stages of one update; mark(stage) records the time since the previous mark."""
+
+    __slots__ = ('last',)
+
+    def __init__(self, start: float):
+        self.last = start
+
+    def mark(self, stage: str):
+        now = perf_counter()
+        series = _stage_series.get(stage)
+        if series is None:
+            series = _stage_series[stage] = STAGE_SECONDS.labels(stage)
+        series.observe(now - self.last)
+        self.last = now
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def mark(self, stage: str):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+def span() -> Any:
+    """Start a stage span at the time the update was picked up (or now)."""
+    if not REGISTRY.enabled:
+        return NULL_SPAN
+    return Span(received_at.get() or perf_counter())
+
+
+def timed_handler(callback: Callable, name: Optional[str] = None) -> Callable:
+    """Wrap an async handler callback so its duration lands in HANDLER_SECONDS."""
+    if not REGISTRY.enabled or getattr(callback, 'timed', False):
+        return callback
+    series = HANDLER_SECONDS.labels(name or callback.__name__)
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            series.observe(perf_counter() - started)
+    wrapper.timed = True
+    return wrapper
+
+
+def instrument_handlers(handlers: Iterable[Any]):
+    """Time the callbacks of the given handlers in place, descending into ConversationHandlers."""
+    if not REGISTRY.enabled:
+        return
+    for handler in handlers:
+        if hasattr(handler, 'states'):
+            instrument_handlers(handler.entry_points)
+            instrument_handlers(nested for state in handler.states.values() for nested in state)
+            instrument_handlers(handler.fallbacks)
+        elif hasattr(handler, 'callback'):
+            handler.callback = timed_handler(handler.callback)
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """pymongo command listener feeding MONGO_SECONDS."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, event.command_name)
+
+    def failed(self, event):
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, event.command_name)
+
+
+def mongo_listeners() -> List[monitoring.CommandListener]:
+    return [MongoCommandTimer()] if REGISTRY.enabled else []
+
+
+def format_summary(rows: List[Tuple[str, str, int, float, float, float]]) -> str:
+    """Plain-text table of the summary rows for the /stats command."""
+    if not rows:
+        return "No samples yet."
+    lines = ["metric / labels: count  p50  p95  p99 (ms)"]
+    for name, labels, count, p50, p95, p99 in rows:
+        lines.append(f"{name.removesuffix('_seconds')} {labels}: {count}  "
+                     f"{p50 * 1000:.3g}  {p95 * 1000:.3g}  {p99 * 1000:.3g}")
+    return '\n'.join(lines)
+
+
+class MetricsServer:
+    """Serves REGISTRY.render() at /metrics."""
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 9100, registry: Registry = REGISTRY):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._runner: Optional[web.AppRunner] = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.registry.render(), content_type='text/plain', charset='utf-8',
+                            headers={'X-Content-Type-Options': 'nosniff'})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Metrics served on {self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
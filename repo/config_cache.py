@@ -0,0 +1,177 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from constants import DEFAULT_TIMINGS
+from repo.user import AsyncUserRepository
+
+
+class LRUTTLCache:
+    """Bounded in-memory cache with per-entry expiry and least-recently-used eviction."""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > self.clock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None when missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] <= self.clock():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value without touching recency or counters."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self.clock():
+            return None
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store a value, evicting the least recently used entry when full; ttl overrides the default."""
+        self._entries[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Drop a single entry."""
+        self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every entry."""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the hit/miss counters used to size the cache."""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+def build_user_config(doc: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge a stored user document over the default settings; only groups with stored settings are listed."""
+    doc = doc or {}
+    groups: Dict[str, Dict[str, Any]] = {}
+    for group, stored in (doc.get('groups') or {}).items():
+        config = groups.setdefault(group, {'eth_limit': 0.0, 'sol_limit': 0.0, 'blacklist': set()})
+        config.update({k: v for k, v in stored.items() if k != 'blacklist'})
+        config['blacklist'] = set(stored.get('blacklist', config['blacklist']))
+    return {
+        'timings': doc.get('timings', DEFAULT_TIMINGS),
+        'groups': groups,
+    }
+
+
+def config_document(config: Dict[str, Any]) -> Dict[str, Any]:
+    """The stored-document form of a settings dict (blacklists as sorted lists); the inverse of build_user_config."""
+    return {
+        'timings': config['timings'],
+        'groups': {group: {**group_config, 'blacklist': sorted(group_config['blacklist'])}
+                   for group, group_config in config['groups'].items()},
+    }
+
+
+class ConfigCache:
+    """Read-through/write-through cache of user and group settings over AsyncUserRepository.
+
+    Menu handlers read with get_user_config and write through the setters, which
+    persist first and then update the cached copy. The message hot path uses
+    peek_user_config, which never touches the database. Callables in
+    `listeners` are called with the tg_id and the updated settings after
+    every write; a user whose entry has expired is read through first.
+    """
+
+    def __init__(self, repo: AsyncUserRepository, maxsize: int = 10000, ttl: float = 300.0):
+        self.repo = repo
+        self.cache = LRUTTLCache(maxsize, ttl)
+        self.listeners: List[Callable[[int, Dict[str, Any]], Any]] = []
+
+    async def get_user_config(self, tg_id: int) -> Dict[str, Any]:
+        """Return the settings of a user, loading them from the DB on a miss."""
+        config = self.cache.get(tg_id)
+        if config is None:
+            config = build_user_config(await self.repo.find_by_tg_id(tg_id))
+            self.cache.set(tg_id, config)
+        return config
+
+    def peek_user_config(self, tg_id: int) -> Optional[Dict[str, Any]]:
+        """Return the cached settings of a user without any I/O."""
+        return self.cache.get(tg_id)
+
+    def invalidate(self, tg_id: int):
+        """Forget the cached settings of a user."""
+        self.cache.invalidate(tg_id)
+
+    def adopt(self, tg_id: int, doc: Dict[str, Any]):
+        """Cache settings that were written elsewhere, given in stored-document form."""
+        self.cache.set(tg_id, build_user_config(doc))
+
+    async def set_timings(self, tg_id: int, timings: str):
+        """Persist a new active time slot."""
+        await self.repo.set_timings(tg_id, timings)
+        await self._apply(tg_id, lambda config: config.__setitem__('timings', timings))
+
+    async def set_group_limit(self, tg_id: int, group: str, field: str, value: float):
+        """Persist a new buy limit for one group."""
+        await self.repo.set_group_value(tg_id, group, field, value)
+        await self._apply(tg_id, lambda config: self._group(config, group).__setitem__(field, value))
+
+    async def add_to_blacklist(self, tg_id: int, group: str, handle: str):
+        """Persist a handle added to a group blacklist."""
+        await self.repo.add_to_blacklist(tg_id, group, handle)
+        await self._apply(tg_id, lambda config: self._group(config, group)['blacklist'].add(handle))
+
+    async def remove_from_blacklist(self, tg_id: int, group: str, handle: str):
+        """Persist a handle removed from a group blacklist."""
+        await self.repo.remove_from_blacklist(tg_id, group, handle)
+        await self._apply(tg_id, lambda config: self._group(config, group)['blacklist'].discard(handle))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the hit/miss counters of the underlying cache."""
+        return self.cache.stats()
+
+    @staticmethod
+    def _group(config: Dict[str, Any], group: str) -> Dict[str, Any]:
+        return config['groups'].setdefault(group, {'eth_limit': 0.0, 'sol_limit': 0.0, 'blacklist': set()})
+
+    async def _apply(self, tg_id: int, mutate: Callable[[Dict[str, Any]], Any]):
+        """Update the cached copy after a write, or drop it if it cannot be updated, then notify listeners."""
+        config = self.cache.peek(tg_id)
+        if config is None:
+            # Not cached (or expired): reload, the stored copy already has the write and mutate repeats it
+            config = await self.get_user_config(tg_id)
+        try:
+            mutate(config)
+        except Exception:
+            self.cache.invalidate(tg_id)
+            raise
+        self.cache.set(tg_id, config)
+        for listener in self.listeners:
+            listener(tg_id, config)
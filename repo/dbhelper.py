@@ -1,6 +1,9 @@
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient, MongoClient
+from pymongo.asynchronous.collection import AsyncCollection
 from pymongo.collection import Collection
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import mongo_listeners
 
 
 class MongoHelper:
@@ -28,10 +31,10 @@ class MongoHelper:
         cursor = self.collection.find(query).limit(limit)
         return list(cursor)
 
-    def update_one(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool) -> bool:
-        """Update a single document based on the query."""
-        result = self.collection.update_one(query, {'$set': update})
-        return result.modified_count > 0
+    def update_one(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> bool:
+        """Update a single document based on the query, inserting it when upsert is set."""
+        result = self.collection.update_one(query, {'$set': update}, upsert=upsert)
+        return result.modified_count > 0 or result.upserted_id is not None
 
     def update_many(self, query: Dict[str, Any], update: Dict[str, Any]) -> int:
         """Update multiple documents matching the query."""
@@ -59,3 +62,92 @@ class MongoHelper:
     def close(self):
         """Close the MongoDB connection."""
         self.client.close()
+
+
+# One pooled AsyncMongoClient per (host, port), shared by every async repository.
+_async_clients: Dict[Tuple[str, int], AsyncMongoClient] = {}
+
+
+def get_async_client(host: str = 'localhost', port: int = 27017) -> AsyncMongoClient:
+    """Return the shared AsyncMongoClient for host:port, creating it on first use."""
+    key = (host, port)
+    client = _async_clients.get(key)
+    if client is None:
+        client = AsyncMongoClient(host, port, event_listeners=mongo_listeners())
+        _async_clients[key] = client
+    return client
+
+
+async def close_async_clients():
+    """Close every shared AsyncMongoClient; for application shutdown, after the last repository call."""
+    clients = list(_async_clients.values())
+    _async_clients.clear()
+    for client in clients:
+        await client.close()
+
+
+class AsyncMongoHelper:
+    """Non-blocking counterpart of MongoHelper for use inside the event loop."""
+
+    def __init__(self, db_name: str, collection_name: str, host: str = 'localhost', port: int = 27017):
+        self.client = get_async_client(host, port)
+        self.db = self.client[db_name]
+        self.collection: AsyncCollection = self.db[collection_name]
+
+    async def insert_one(self, document: Dict[str, Any]) -> str:
+        """Insert a single document into the collection."""
+        result = await self.collection.insert_one(document)
+        return str(result.inserted_id)
+
+    async def insert_many(self, documents: List[Dict[str, Any]]) -> List[str]:
+        """Insert multiple documents into the collection."""
+        result = await self.collection.insert_many(documents)
+        return [str(id) for id in result.inserted_ids]
+
+    async def find_one(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Find one document based on the query."""
+        return await self.collection.find_one(query)
+
+    async def find_all(self, query: Dict[str, Any] = {}, limit: int = 0) -> List[Dict[str, Any]]:
+        """Find multiple documents matching the query."""
+        cursor = self.collection.find(query).limit(limit)
+        return await cursor.to_list(None)
+
+    async def update_one(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> bool:
+        """Update a single document based on the query."""
+        result = await self.collection.update_one(query, {'$set': update}, upsert=upsert)
+        return result.modified_count > 0 or result.upserted_id is not None
+
+    async def update_many(self, query: Dict[str, Any], update: Dict[str, Any]) -> int:
+        """Update multiple documents matching the query."""
+        result = await self.collection.update_many(query, {'$set': update})
+        return result.modified_count
+
+    async def delete_one(self, query: Dict[str, Any]) -> bool:
+        """Delete a single document based on the query."""
+        result = await self.collection.delete_one(query)
+        return result.deleted_count > 0
+
+    async def delete_many(self, query: Dict[str, Any]) -> int:
+        """Delete multiple documents matching the query."""
+        result = await self.collection.delete_many(query)
+        return result.deleted_count
+
+    async def count_documents(self, query: Dict[str, Any] = {}) -> int:
+        """Count the number of documents that match the query."""
+        return await self.collection.count_documents(query)
+
+    async def aggregate(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Run an aggregation pipeline."""
+        cursor = await self.collection.aggregate(pipeline)
+        return await cursor.to_list(None)
+
+    async def bulk_write(self, requests: List[Any], ordered: bool = True) -> Any:
+        """Send several write operations in one round trip."""
+        return await self.collection.bulk_write(requests, ordered=ordered)
+
+    async def close(self):
+        """Nothing to release: the connection pool is shared by every async repository.
+
+        Call close_async_clients() once at application shutdown instead.
+        """
@@ -0,0 +1,36 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING
+
+from repo.dbhelper import AsyncMongoHelper
+
+GROUP_INDEXES: List[Tuple[List[Tuple[str, Any]], Dict[str, Any]]] = [
+    ([('group', ASCENDING)], {'name': 'group_unique', 'unique': True}),
+]
+
+
+class AsyncGroupRepository(AsyncMongoHelper):
+    """The group directory's store: one document per group chat with its title and the bot users seen in it."""
+
+    def __init__(self, db_name: str = 'mydb', collection_name: str = 'groups',
+                 host: str = 'localhost', port: int = 27017):
+        super().__init__(db_name, collection_name, host, port)
+
+    async def ensure_indexes(self) -> List[str]:
+        """Create the group indexes if they are missing."""
+        return [await self.collection.create_index(keys, **options) for keys, options in GROUP_INDEXES]
+
+    async def record(self, group: str, title: Optional[str] = None, member: Optional[int] = None) -> bool:
+        """Store a group's title and/or one more member, creating the group's document on first use."""
+        update: Dict[str, Any] = {'$set': {'group': group}}
+        if title:
+            update['$set']['title'] = title
+        if member is not None:
+            update['$addToSet'] = {'members': member}
+        result = await self.collection.update_one({'group': group}, update, upsert=True)
+        return result.modified_count > 0 or result.upserted_id is not None
+
+    async def find_groups(self) -> List[Dict[str, Any]]:
+        """Every stored group with its title and members."""
+        cursor = self.collection.find({}, {'group': 1, 'title': 1, 'members': 1})
+        return await cursor.to_list(None)
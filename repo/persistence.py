@@ -0,0 +1,297 @@
+import asyncio
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+from telegram import Update
+from telegram.ext import Application, BasePersistence, ConversationHandler, PersistenceInput
+
+from repo.dbhelper import AsyncMongoHelper
+
+ConversationKey = Tuple[int, ...]
+
+
+def encode_key(key: ConversationKey) -> str:
+    return '_'.join(str(part) for part in key)
+
+
+def decode_key(text: str) -> ConversationKey:
+    return tuple(int(part) for part in text.split('_'))
+
+
+def encode_state(state: Any) -> Any:
+    return state.name if isinstance(state, Enum) else state
+
+
+class MongoPersistence(BasePersistence):
+    """user_data and ConversationHandler states in MongoDB, one document per user, loaded on demand.
+
+    Nothing is read at boot. load() runs before each update is dispatched (see
+    ChatOrderedUpdateProcessor.preload) and reads a user's document the first
+    time they show up in a private chat or press a button. Group messages only
+    mark their sender as seen.
+
+    Writes are incremental. The Application hands over the entries touched
+    since its last run every update_interval seconds. Only fields that differ
+    from what was last stored become $set/$unset operations, and every change
+    of one run goes out in a single bulk_write. Users idle for idle_ttl
+    seconds are dropped from memory and are loaded again on their next update.
+
+    Document shape:
+        {'_id': user_id, 'user_data': {...}, 'conversations': {name: {'<chat>_<user>': state}}}
+    """
+
+    def __init__(self, helper: AsyncMongoHelper, update_interval: float = 5.0, idle_ttl: float = 3600.0,
+                 clock: Callable[[], float] = time.monotonic):
+        super().__init__(PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+                         update_interval)
+        if idle_ttl < 2 * update_interval:
+            # An entry must have been written before it can be dropped from memory
+            raise ValueError("idle_ttl must be at least twice the update_interval")
+        self.helper = helper
+        self.idle_ttl = idle_ttl
+        self.clock = clock
+        self.application: Optional[Application] = None
+        self._handlers: Dict[str, ConversationHandler] = {}
+        self._states: Dict[str, Dict[str, Any]] = {}
+        # user_id -> last update, oldest first
+        self._seen: 'OrderedDict[int, float]' = OrderedDict()
+        self._loaded: Set[int] = set()
+        self._loading: Dict[int, asyncio.Future] = {}
+        # What the database holds, to write only what changed
+        self._saved_user_data: Dict[int, Dict[str, Any]] = {}
+        self._saved_states: Dict[Tuple[str, ConversationKey], Any] = {}
+        self._conversation_keys: Dict[int, Set[Tuple[str, ConversationKey]]] = {}
+        self._pending: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        self._batch: Optional[asyncio.Future] = None
+        self.loads = 0
+        self.writes = 0
+        self.written_ops = 0
+        self.unchanged = 0
+        self.evictions = 0
+
+    def attach(self, application: Application):
+        """Find the persistent ConversationHandlers of an application whose handlers are all added."""
+        self.application = application
+        for handlers in application.handlers.values():
+            for handler in handlers:
+                if isinstance(handler, ConversationHandler) and handler.persistent:
+                    if not handler.per_user or handler.per_message:
+                        raise ValueError(f"Conversation {handler.name} must be per_user and not per_message")
+                    self._handlers[handler.name] = handler
+                    self._states[handler.name] = {encode_state(state): state for state in handler.states}
+
+    def _user_position(self, name: str) -> int:
+        return 1 if self._handlers[name].per_chat else 0
+
+    # Loading
+
+    async def load(self, update: object):
+        """Make sure the sender's stored state is in memory before the update is handled."""
+        if not isinstance(update, Update) or update.effective_user is None:
+            return
+        user_id = update.effective_user.id
+        now = self.clock()
+        self._seen[user_id] = now
+        self._seen.move_to_end(user_id)
+        self._evict(now)
+        chat = update.effective_chat
+        if user_id in self._loaded or (chat is not None and chat.type != 'private' and update.callback_query is None):
+            return
+        loading = self._loading.get(user_id)
+        if loading is None:
+            loading = self._loading[user_id] = asyncio.ensure_future(self._read(user_id))
+            loading.add_done_callback(lambda _: self._loading.pop(user_id, None))
+        await asyncio.shield(loading)
+
+    async def _read(self, user_id: int):
+        doc = await self.helper.find_one({'_id': user_id}) or {}
+        self.loads += 1
+        stored = doc.get('user_data') or {}
+        # State created while the read was in flight is newer than the stored copy
+        user_data = self.application.user_data[user_id]
+        for field, value in stored.items():
+            user_data.setdefault(field, value)
+        self._saved_user_data[user_id] = dict(stored)
+        for name, entries in (doc.get('conversations') or {}).items():
+            handler = self._handlers.get(name)
+            if handler is None:
+                continue
+            conversations = handler._conversations
+            for text, encoded in entries.items():
+                key = decode_key(text)
+                if key not in conversations:
+                    conversations.update_no_track({key: self._states[name].get(encoded, encoded)})
+                self._saved_states[(name, key)] = encoded
+                self._conversation_keys.setdefault(user_id, set()).add((name, key))
+        self._loaded.add(user_id)
+
+    def _evict(self, now: float):
+        """Drop the in-memory state of users idle for idle_ttl, oldest first."""
+        marked = getattr(self.application, '_user_ids_to_be_updated_in_persistence', set())
+        while self._seen:
+            user_id, seen = next(iter(self._seen.items()))
+            if seen > now - self.idle_ttl:
+                return
+            if user_id in self._pending or user_id in marked:
+                # Not written yet; look again after the next run
+                self._seen[user_id] = now
+                self._seen.move_to_end(user_id)
+                continue
+            del self._seen[user_id]
+            # Application.user_data is a read-only view; dropping an entry without deleting
+            # the stored copy (drop_user_data) needs the dict behind it
+            self.application._user_data.pop(user_id, None)
+            for name, key in self._conversation_keys.pop(user_id, ()):
+                # Bypasses the write tracking, so the stored state is kept
+                self._handlers[name]._conversations.data.pop(key, None)
+                self._saved_states.pop((name, key), None)
+            self._saved_user_data.pop(user_id, None)
+            self._loaded.discard(user_id)
+            self.evictions += 1
+
+    # Writing
+
+    def _set(self, user_id: int, path: str, value: Any):
+        ops = self._pending.setdefault(user_id, {'$set': {}, '$unset': {}})
+        ops['$unset'].pop(path, None)
+        ops['$set'][path] = value
+
+    def _unset(self, user_id: int, path: str):
+        ops = self._pending.setdefault(user_id, {'$set': {}, '$unset': {}})
+        ops['$set'].pop(path, None)
+        ops['$unset'][path] = ''
+
+    async def _schedule(self):
+        """Write the changes of this run together: every update_* call of one tick shares a bulk_write."""
+        if self._batch is None:
+            loop = asyncio.get_running_loop()
+            self._batch = loop.create_future()
+            loop.call_soon(lambda: asyncio.ensure_future(self._write_batch()))
+        await asyncio.shield(self._batch)
+
+    async def _write_batch(self):
+        batch, self._batch = self._batch, None
+        try:
+            await self.flush()
+        except Exception as error:
+            batch.set_exception(error)
+        else:
+            batch.set_result(None)
+
+    async def flush(self) -> None:
+        """Send every pending change; a failed batch stays pending and is sent with the next one."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        requests = [UpdateOne({'_id': user_id}, {op: fields for op, fields in ops.items() if fields}, upsert=True)
+                    for user_id, ops in pending.items() if ops['$set'] or ops['$unset']]
+        try:
+            if requests:
+                await self.helper.bulk_write(requests, ordered=False)
+        except BaseException:
+            # $set and $unset are idempotent, so newer changes can simply be merged over the failed ones
+            for user_id, ops in self._pending.items():
+                for path, value in ops['$set'].items():
+                    pending.setdefault(user_id, {'$set': {}, '$unset': {}})['$unset'].pop(path, None)
+                    pending[user_id]['$set'][path] = value
+                for path in ops['$unset']:
+                    pending.setdefault(user_id, {'$set': {}, '$unset': {}})['$set'].pop(path, None)
+                    pending[user_id]['$unset'][path] = ''
+            self._pending = pending
+            raise
+        self.writes += 1
+        self.written_ops += len(requests)
+
+    async def update_user_data(self, user_id: int, data: Dict[str, Any]) -> None:
+        saved = self._saved_user_data.get(user_id, {})
+        changed = False
+        for field, value in data.items():
+            if field not in saved or saved[field] != value:
+                self._set(user_id, f'user_data.{field}', value)
+                changed = True
+        for field in saved.keys() - data.keys():
+            self._unset(user_id, f'user_data.{field}')
+            changed = True
+        if not changed:
+            self.unchanged += 1
+            return
+        self._saved_user_data[user_id] = data
+        await self._schedule()
+
+    async def update_conversation(self, name: str, key: ConversationKey, new_state: Optional[object]) -> None:
+        user_id = key[self._user_position(name)]
+        encoded = None if new_state is None or new_state == ConversationHandler.END else encode_state(new_state)
+        if self._saved_states.get((name, key)) == encoded:
+            self.unchanged += 1
+            return
+        path = f'conversations.{name}.{encode_key(key)}'
+        keys = self._conversation_keys.setdefault(user_id, set())
+        if encoded is None:
+            self._unset(user_id, path)
+            self._saved_states.pop((name, key), None)
+            keys.discard((name, key))
+        else:
+            self._set(user_id, path, encoded)
+            self._saved_states[(name, key)] = encoded
+            keys.add((name, key))
+        await self._schedule()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._unset(user_id, 'user_data')
+        self._saved_user_data.pop(user_id, None)
+        await self._schedule()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters: documents read, bulk writes and their operations, unchanged entries skipped, evictions."""
+        return {
+            'in_memory': len(self._seen),
+            'loaded': len(self._loaded),
+            'loads': self.loads,
+            'writes': self.writes,
+            'written_ops': self.written_ops,
+            'unchanged': self.unchanged,
+            'evictions': self.evictions,
+        }
+
+    # Loaded lazily by load(), so nothing to read at boot
+
+    async def get_user_data(self) -> Dict[int, Dict[str, Any]]:
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, Dict[Hashable, Any]]:
+        return {}
+
+    async def get_bot_data(self) -> Dict[Hashable, Any]:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[ConversationKey, object]:
+        return {}
+
+    # Chat data, bot data and callback data are not stored
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Hashable, Any]) -> None:
+        pass
+
+    async def update_bot_data(self, data: Dict[Hashable, Any]) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[str, Any]) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Hashable, Any]) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict[Hashable, Any]) -> None:
+        pass
@@ -1,11 +1,64 @@
-from repo.dbhelper import MongoHelper
-from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+from repo.dbhelper import AsyncMongoHelper, MongoHelper
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# (keys, options) of every index the user queries rely on; creating them again is a no-op
+USER_INDEXES: List[Tuple[List[Tuple[str, Any]], Dict[str, Any]]] = [
+    ([('tg_id', ASCENDING)], {'name': 'tg_id_unique', 'unique': True}),
+    # Group subscription lookups such as {'groups.<group>.eth_limit': {'$gt': 0}}
+    ([('groups.$**', ASCENDING)], {'name': 'groups_wildcard'}),
+]
+
+
+def subscribers_query(group: str) -> Dict[str, Any]:
+    """Users with a buy limit set for a group."""
+    return {f'groups.{group}.eth_limit': {'$gt': 0}}
+
+
+def _overlaps(path: str, other: str) -> bool:
+    return path == other or path.startswith(other + '.') or other.startswith(path + '.')
+
+
+def merge_update(into: Dict[str, Any], update: Dict[str, Any]) -> bool:
+    """Fold an update document into a queued one; False when the two would touch the same path differently.
+
+    Repeated $set of a path keeps the last value, $addToSet values are
+    collected with $each and $pull values with $in.
+    """
+    for operator, fields in update.items():
+        for path in fields:
+            for queued_operator, queued in into.items():
+                if any(_overlaps(path, other) and (operator != queued_operator or path != other)
+                       for other in queued):
+                    return False
+    for operator, fields in update.items():
+        queued = into.setdefault(operator, {})
+        for path, value in fields.items():
+            if operator in ('$addToSet', '$pull'):
+                modifier = '$each' if operator == '$addToSet' else '$in'
+                items = queued.setdefault(path, {modifier: []})[modifier]
+                for item in value[modifier] if isinstance(value, dict) else [value]:
+                    if item not in items:
+                        items.append(item)
+            else:
+                queued[path] = value
+    return True
 
 
 class UserRepository(MongoHelper):
     def __init__(self, db_name: str = 'mydb', collection_name: str = 'users'):
         super().__init__(db_name, collection_name)
 
+    def ensure_indexes(self) -> List[str]:
+        """Create the user indexes if they are missing."""
+        return [self.collection.create_index(keys, **options) for keys, options in USER_INDEXES]
+
     def find_by_tg_id(self, tg_id: int) -> Optional[Dict[str, Any]]:
         """Find a user by tg_id."""
         return self.find_one({'tg_id': tg_id})
@@ -14,4 +67,173 @@ class UserRepository(MongoHelper):
         """save a user by tg_id."""
         return  self.update_one({'tg_id' : tg_id},
                                 {'tg_id' : tg_id, 'status' : 'started'},
-                                True)
\ No newline at end of file
+                                True)
+
+
+class AsyncUserRepository(AsyncMongoHelper):
+    """Users and their settings, one document per tg_id.
+
+    With write_behind > 0 the writes below only queue their change. Changes of
+    one user are merged, and every write_behind seconds (sooner once max_batch
+    users are waiting) all of them go out in a single bulk_write. Reading a
+    user with queued changes flushes first, and stop() flushes what is left.
+    """
+
+    def __init__(self, db_name: str = 'mydb', collection_name: str = 'users',
+                 host: str = 'localhost', port: int = 27017, write_behind: float = 0.0, max_batch: int = 1000):
+        super().__init__(db_name, collection_name, host, port)
+        self.write_behind = write_behind
+        self.max_batch = max_batch
+        self._pending: Dict[int, List[Dict[str, Any]]] = {}
+        self._in_flight: Dict[int, List[Dict[str, Any]]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wake: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+        self.queued = 0
+        self.flushes = 0
+        self.flushed_ops = 0
+
+    async def ensure_indexes(self) -> List[str]:
+        """Create the user indexes if they are missing."""
+        return [await self.collection.create_index(keys, **options) for keys, options in USER_INDEXES]
+
+    async def find_by_tg_id(self, tg_id: int) -> Optional[Dict[str, Any]]:
+        """Find a user by tg_id."""
+        if tg_id in self._pending or tg_id in self._in_flight:
+            await self.flush()
+        return await self.find_one({'tg_id': tg_id})
+
+    async def find_subscribers(self, group: str) -> List[int]:
+        """tg_ids of the users with a buy limit set for a group."""
+        if self._pending or self._in_flight:
+            await self.flush()
+        cursor = self.collection.find(subscribers_query(group), {'tg_id': 1})
+        return [doc['tg_id'] for doc in await cursor.to_list(None)]
+
+    async def find_with_groups(self) -> List[Dict[str, Any]]:
+        """tg_id, groups and timings of every user with stored group settings."""
+        if self._pending or self._in_flight:
+            await self.flush()
+        cursor = self.collection.find({'groups': {'$exists': True}}, {'tg_id': 1, 'groups': 1, 'timings': 1})
+        return await cursor.to_list(None)
+
+    async def find_tg_ids(self) -> List[int]:
+        """tg_ids of every user who has started the bot."""
+        if self._pending or self._in_flight:
+            await self.flush()
+        cursor = self.collection.find({}, {'tg_id': 1})
+        return [doc['tg_id'] for doc in await cursor.to_list(None)]
+
+    async def initiate_doc(self, tg_id: int):
+        """save a user by tg_id."""
+        return await self._write(tg_id, {'$set': {'tg_id': tg_id, 'status': 'started'}})
+
+    async def set_timings(self, tg_id: int, timings: str) -> bool:
+        """Store the active time slot of a user."""
+        return await self._write(tg_id, {'$set': {'timings': timings}})
+
+    async def set_group_value(self, tg_id: int, group: str, field: str, value: Any) -> bool:
+        """Store a single per-group setting of a user."""
+        return await self._write(tg_id, {'$set': {f'groups.{group}.{field}': value}})
+
+    async def add_to_blacklist(self, tg_id: int, group: str, handle: str) -> bool:
+        """Add a handle to the blacklist of one of the user's groups."""
+        return await self._write(tg_id, {'$addToSet': {f'groups.{group}.blacklist': handle}})
+
+    async def remove_from_blacklist(self, tg_id: int, group: str, handle: str) -> bool:
+        """Remove a handle from the blacklist of one of the user's groups."""
+        return await self._write(tg_id, {'$pull': {f'groups.{group}.blacklist': handle}}, upsert=False)
+
+    async def _write(self, tg_id: int, update: Dict[str, Any], upsert: bool = True) -> bool:
+        """Apply an update now, or queue it in write-behind mode (where True only means accepted)."""
+        if not self.write_behind:
+            result = await self.collection.update_one({'tg_id': tg_id}, update, upsert=upsert)
+            return result.modified_count > 0 or result.upserted_id is not None
+        queued = self._pending.setdefault(tg_id, [])
+        if not queued or not merge_update(queued[-1], update):
+            queued.append({})
+            merge_update(queued[-1], update)
+        self.queued += 1
+        if len(self._pending) >= self.max_batch and self._wake is not None and not self._wake.done():
+            self._wake.set_result(None)
+        return True
+
+    @property
+    def pending(self) -> int:
+        """Users with changes not yet sent."""
+        return len(self._pending)
+
+    async def flush(self) -> int:
+        """Send every queued change in one bulk_write and return the number of operations sent.
+
+        Every queued change is idempotent ($set, $addToSet, $pull), so a batch
+        that fails or is cancelled is put back in front of newer changes and
+        sent again later.
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            self._in_flight = batch
+            # Upserts throughout, as a $pull may now be merged with changes that create the user
+            requests = [UpdateOne({'tg_id': tg_id}, update, upsert=True)
+                        for tg_id, updates in batch.items() for update in updates]
+            try:
+                # Order only matters between the changes of one user
+                await self.collection.bulk_write(requests, ordered=len(requests) > len(batch))
+            except BaseException:
+                for tg_id, updates in self._pending.items():
+                    batch.setdefault(tg_id, []).extend(updates)
+                self._pending = batch
+                raise
+            finally:
+                self._in_flight = {}
+            self.flushes += 1
+            self.flushed_ops += len(requests)
+            return len(requests)
+
+    def start(self):
+        """Start flushing queued changes in the background (write-behind mode only)."""
+        if self.write_behind and self._task is None:
+            # A fresh lock, so the repository can be restarted on a new loop
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background flusher and send whatever is still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except PyMongoError as error:
+            logger.error(f"Dropping {len(self._pending)} users' unsaved changes: {error!r}")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Woken by the interval, or early by _write once max_batch users are waiting
+            self._wake = wake = loop.create_future()
+            timer = loop.call_later(self.write_behind, lambda: wake.done() or wake.set_result(None))
+            try:
+                await wake
+            finally:
+                timer.cancel()
+            try:
+                await self.flush()
+            except PyMongoError as error:
+                logger.warning(f"Flushing {len(self._pending)} users' changes failed, retrying: {error!r}")
+
+    def write_stats(self) -> Dict[str, Any]:
+        """Write-behind counters: changes queued, bulk writes sent and the operations they carried."""
+        return {
+            'queued': self.queued,
+            'flushes': self.flushes,
+            'flushed_ops': self.flushed_ops,
+            'coalesced': self.queued - self.flushed_ops - sum(map(len, self._pending.values())),
+            'pending': self.pending,
+        }
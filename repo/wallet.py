@@ -0,0 +1,51 @@
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING
+
+from repo.dbhelper import AsyncMongoHelper
+
+WALLET_INDEXES: List[Tuple[List[Tuple[str, Any]], Dict[str, Any]]] = [
+    ([('address', ASCENDING)], {'name': 'address_unique', 'unique': True}),
+    # Both the pool ({'tg_id': None}) and a user's wallet
+    ([('tg_id', ASCENDING)], {'name': 'tg_id'}),
+]
+
+
+class AsyncWalletRepository(AsyncMongoHelper):
+    """Generated wallets as encrypted keystores, one document per address.
+
+    A wallet without a tg_id belongs to the pre-generated pool; handing it to
+    a user sets tg_id, conditionally, so a wallet is never given out twice.
+    """
+
+    def __init__(self, db_name: str = 'mydb', collection_name: str = 'wallets',
+                 host: str = 'localhost', port: int = 27017):
+        super().__init__(db_name, collection_name, host, port)
+
+    async def ensure_indexes(self) -> List[str]:
+        """Create the wallet indexes if they are missing."""
+        return [await self.collection.create_index(keys, **options) for keys, options in WALLET_INDEXES]
+
+    async def add_to_pool(self, wallets: List[Dict[str, Any]]) -> List[str]:
+        """Store freshly generated wallets as unassigned."""
+        created_at = time.time()
+        return await self.insert_many([{'address': wallet['address'], 'keystore': wallet['keystore'],
+                                        'tg_id': None, 'created_at': created_at} for wallet in wallets])
+
+    async def find_pool(self, limit: int = 0) -> List[Dict[str, Any]]:
+        """Unassigned wallets, oldest first."""
+        cursor = self.collection.find({'tg_id': None}, {'address': 1, 'keystore': 1}).sort('created_at', ASCENDING)
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(None)
+
+    async def assign(self, address: str, tg_id: int) -> bool:
+        """Give a pool wallet to a user; False when it was already taken."""
+        result = await self.collection.update_one({'address': address, 'tg_id': None},
+                                                  {'$set': {'tg_id': tg_id, 'assigned_at': time.time()}})
+        return result.modified_count > 0
+
+    async def find_by_tg_id(self, tg_id: int) -> Optional[Dict[str, Any]]:
+        """The wallet of a user, if they have one."""
+        return await self.find_one({'tg_id': tg_id})
@@ -0,0 +1,235 @@
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional, Set, Tuple
+
+
+def normalize_handle(handle: str) -> str:
+    """Normalize a Telegram handle once, at the time it is added."""
+    return handle.strip().lstrip('@').lower()
+
+
+class BloomFilter:
+    """Compact bit-array pre-filter over integer ids (no false negatives).
+
+    With the default two probes and 16 bits per entry the false-positive
+    rate stays below 1.5%. Probe positions come from tuple hashing, which is
+    deterministic for ints and much cheaper than big-int mixing in Python.
+    """
+
+    _SEEDS = (0x5bd1e995, 0x27d4eb2f, 0x165667b1, 0x61c88647)
+
+    def __init__(self, capacity: int, bits_per_entry: int = 16, hashes: int = 2):
+        self.size = max(64, max(capacity, 1) * bits_per_entry)
+        self.seeds = self._SEEDS[:hashes]
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def add(self, item: int):
+        for seed in self.seeds:
+            position = hash((item, seed)) % self.size
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: int) -> bool:
+        bits = self.bits
+        size = self.size
+        for seed in self.seeds:
+            position = hash((item, seed)) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class SharedDenyList:
+    """Large deny list shared by every group, stored as a sorted int64 array behind a Bloom filter.
+
+    Removals only touch the exact array; the filter is rebuilt when it has
+    grown past its capacity, so stale bits merely cost an extra bisect.
+    """
+
+    def __init__(self, ids: Iterable[int] = (), bits_per_entry: int = 16):
+        self.bits_per_entry = bits_per_entry
+        self._ids = array('q', sorted(set(ids)))
+        self._rebuild()
+
+    def _rebuild(self):
+        self.capacity = max(1024, len(self._ids) * 2)
+        self.bloom = BloomFilter(self.capacity, self.bits_per_entry)
+        for user_id in self._ids:
+            self.bloom.add(user_id)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, user_id: int) -> bool:
+        if user_id not in self.bloom:
+            return False
+        ids = self._ids
+        index = bisect_left(ids, user_id)
+        return index < len(ids) and ids[index] == user_id
+
+    def add(self, user_id: int):
+        ids = self._ids
+        index = bisect_left(ids, user_id)
+        if index < len(ids) and ids[index] == user_id:
+            return
+        ids.insert(index, user_id)
+        if len(ids) > self.capacity:
+            self._rebuild()
+        else:
+            self.bloom.add(user_id)
+
+    def discard(self, user_id: int):
+        ids = self._ids
+        index = bisect_left(ids, user_id)
+        if index < len(ids) and ids[index] == user_id:
+            del ids[index]
+
+
+class AccessIndex:
+    """Per-scope allow/deny rules resolved to numeric Telegram user ids.
+
+    A scope is whatever a rule list belongs to, e.g. (subscriber tg_id, group).
+    Handles are resolved to ids as soon as the bot sees that username speak;
+    until then they wait in a pending table. Only the `max_handles` most
+    recently seen handles are remembered for rules added later. allows() is a
+    single dict lookup plus, when a shared deny list is configured, a Bloom
+    filter probe.
+    """
+
+    def __init__(self, shared_deny: Optional[SharedDenyList] = None, max_handles: int = 100_000):
+        self.shared_deny = shared_deny
+        self.max_handles = max_handles
+        self._verdicts: Dict[Tuple[Hashable, int], bool] = {}
+        # The handles whose rules resolved to each (scope, id), in the order added; the last one decides
+        self._named_by: Dict[Tuple[Hashable, int], Dict[str, bool]] = {}
+        # The same verdicts by sender, for checking one message against many scopes
+        self._by_sender: Dict[int, Dict[Hashable, bool]] = {}
+        self._allow_only: Dict[Hashable, int] = {}
+        self._directory: 'OrderedDict[str, int]' = OrderedDict()
+        self._pending: Dict[str, Dict[Hashable, bool]] = {}
+        self._rules: Dict[Hashable, Dict[str, bool]] = {}
+        # The id each rule was resolved to, which outlives later renames and takeovers of the handle
+        self._resolved: Dict[Tuple[Hashable, str], int] = {}
+
+    def observe(self, user_id: int, username: Optional[str]):
+        """Record the current handle of a sender, resolving rules waiting on it."""
+        if not username:
+            return
+        handle = username.lower()
+        directory = self._directory
+        known = directory.get(handle) == user_id
+        directory[handle] = user_id
+        directory.move_to_end(handle)
+        if known:
+            return
+        if len(directory) > self.max_handles:
+            directory.popitem(last=False)
+        waiting = self._pending.pop(handle, None)
+        if waiting:
+            for scope, allowed in waiting.items():
+                self._resolved[(scope, handle)] = user_id
+                self._set_verdict(scope, user_id, handle, allowed)
+
+    def resolve(self, handle: str) -> Optional[int]:
+        """Return the user id last seen using a handle."""
+        return self._directory.get(normalize_handle(handle))
+
+    def allows(self, scope: Hashable, user_id: int) -> bool:
+        """Whether a message from user_id should be acted on within scope."""
+        verdict = self._verdicts.get((scope, user_id))
+        if verdict is not None:
+            return verdict
+        if scope in self._allow_only:
+            return False
+        return self.shared_deny is None or user_id not in self.shared_deny
+
+    def sender_rules(self, user_id: int) -> Tuple[Dict[Hashable, bool], bool, Dict[Hashable, int]]:
+        """What allows() needs about a sender, for checking many scopes at once.
+
+        Returns the verdicts naming the sender by scope, the verdict for
+        scopes without one (False when the shared deny list has the sender)
+        and the scopes that whitelist, which deny everyone not named. The
+        dicts are the index's own and must not be modified.
+        """
+        default = self.shared_deny is None or user_id not in self.shared_deny
+        return self._by_sender.get(user_id, {}), default, self._allow_only
+
+    def deny_handle(self, scope: Hashable, handle: str):
+        """Ignore messages from a handle within scope."""
+        self._add_rule(scope, handle, False)
+
+    def allow_handle(self, scope: Hashable, handle: str):
+        """Whitelist a handle; a scope with any whitelisted handle ignores everyone else."""
+        self._add_rule(scope, handle, True)
+
+    def remove_handle(self, scope: Hashable, handle: str):
+        """Drop whichever rule a scope has for a handle."""
+        handle = normalize_handle(handle)
+        allowed = self._rules.get(scope, {}).pop(handle, None)
+        if allowed is None:
+            return
+        waiting = self._pending.get(handle)
+        if waiting is not None:
+            waiting.pop(scope, None)
+            if not waiting:
+                del self._pending[handle]
+        user_id = self._resolved.pop((scope, handle), None)
+        if user_id is not None:
+            self._drop_verdict(scope, user_id, handle)
+        if allowed:
+            self._allow_only[scope] -= 1
+            if not self._allow_only[scope]:
+                del self._allow_only[scope]
+
+    def sync_scope(self, scope: Hashable, denied: Iterable[str] = (), allowed: Iterable[str] = ()):
+        """Bring a scope in line with stored lists, touching only the handles that differ."""
+        wanted = {normalize_handle(handle): False for handle in denied}
+        wanted.update({normalize_handle(handle): True for handle in allowed})
+        current = self._rules.get(scope, {})
+        for handle in [h for h, allow in current.items() if wanted.get(h) != allow]:
+            self.remove_handle(scope, handle)
+        for handle, allow in wanted.items():
+            if handle not in self._rules.get(scope, {}):
+                self._add_rule(scope, handle, allow)
+
+    def handles(self, scope: Hashable) -> Set[str]:
+        """Return the normalized handles with a rule in scope."""
+        return set(self._rules.get(scope, {}))
+
+    def _add_rule(self, scope: Hashable, handle: str, allowed: bool):
+        handle = normalize_handle(handle)
+        if self._rules.get(scope, {}).get(handle) is not None:
+            self.remove_handle(scope, handle)
+        self._rules.setdefault(scope, {})[handle] = allowed
+        if allowed:
+            self._allow_only[scope] = self._allow_only.get(scope, 0) + 1
+        user_id = self._directory.get(handle)
+        if user_id is None:
+            self._pending.setdefault(handle, {})[scope] = allowed
+        else:
+            self._resolved[(scope, handle)] = user_id
+            self._set_verdict(scope, user_id, handle, allowed)
+
+    def _set_verdict(self, scope: Hashable, user_id: int, handle: str, allowed: bool):
+        self._named_by.setdefault((scope, user_id), {})[handle] = allowed
+        self._verdicts[(scope, user_id)] = allowed
+        self._by_sender.setdefault(user_id, {})[scope] = allowed
+
+    def _drop_verdict(self, scope: Hashable, user_id: int, handle: str):
+        named_by = self._named_by.get((scope, user_id))
+        if named_by is None:
+            return
+        named_by.pop(handle, None)
+        if named_by:
+            # Another handle of the same sender still has a rule in scope
+            allowed = next(reversed(named_by.values()))
+            self._verdicts[(scope, user_id)] = allowed
+            self._by_sender[user_id][scope] = allowed
+            return
+        del self._named_by[(scope, user_id)]
+        self._verdicts.pop((scope, user_id), None)
+        verdicts = self._by_sender.get(user_id)
+        if verdicts is not None:
+            verdicts.pop(scope, None)
+            if not verdicts:
+                del self._by_sender[user_id]
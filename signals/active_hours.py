@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import re
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+_FULL_DAY = (1 << MINUTES_PER_DAY) - 1
+_SLOT = re.compile(r'^\s*(\d{2}):(\d{2})\s*-\s*(\d{2}):(\d{2})\s*$')
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def minute_of_day(moment: datetime) -> int:
+    return moment.hour * 60 + moment.minute
+
+
+class ActiveWindow:
+    """A set of daily time slots compiled into a 1440-bit minute-of-day mask.
+
+    Slots are half-open [start, end); a slot that ends before it starts wraps
+    past midnight and one whose start equals its end covers the whole day.
+    """
+
+    __slots__ = ('mask', 'edges', 'text')
+
+    def __init__(self, mask: int, text: str = ''):
+        self.mask = mask
+        self.text = text
+        # Minutes at which the state flips, i.e. where bit m differs from bit m-1.
+        previous = (mask << 1 | mask >> (MINUTES_PER_DAY - 1)) & _FULL_DAY
+        changes = mask ^ previous
+        self.edges: List[int] = []
+        while changes:
+            lowest = changes & -changes
+            self.edges.append(lowest.bit_length() - 1)
+            changes ^= lowest
+
+    def is_active(self, minute: int) -> bool:
+        """Whether the window covers a minute of the day (0-1439)."""
+        return bool(self.mask >> minute & 1)
+
+    def is_active_at(self, moment: datetime) -> bool:
+        """Whether the window covers the minute of a datetime."""
+        return self.is_active(minute_of_day(moment))
+
+    def next_edge(self, minute: int) -> Optional[int]:
+        """Return the first minute after the given one at which the state flips."""
+        if not self.edges:
+            return None
+        index = bisect_right(self.edges, minute)
+        return self.edges[index % len(self.edges)]
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ActiveWindow) and other.mask == self.mask
+
+    def __repr__(self) -> str:
+        return f'ActiveWindow({self.text!r})'
+
+
+def compile_slots(text: str) -> ActiveWindow:
+    """Compile 'HH:MM - HH:MM' slots, separated by commas, into an ActiveWindow.
+
+    Raises ValueError on malformed input or out-of-range times.
+    """
+    mask = 0
+    slots = [slot for slot in re.split(r'[,;\n]', text) if slot.strip()]
+    if not slots:
+        raise ValueError('No time slot given')
+    for slot in slots:
+        match = _SLOT.match(slot)
+        if not match:
+            raise ValueError(f'Invalid time slot: {slot.strip()}')
+        start_h, start_m, end_h, end_m = map(int, match.groups())
+        if start_h > 23 or end_h > 23 or start_m > 59 or end_m > 59:
+            raise ValueError(f'Invalid time of day: {slot.strip()}')
+        start, end = start_h * 60 + start_m, end_h * 60 + end_m
+        if start == end:
+            mask = _FULL_DAY
+        elif start < end:
+            mask |= ((1 << (end - start)) - 1) << start
+        else:
+            mask |= (_FULL_DAY >> start << start) | ((1 << end) - 1)
+    return ActiveWindow(mask, ', '.join(slot.strip() for slot in slots))
+
+
+class ActiveHoursScheduler:
+    """Keeps the set of users whose active window is currently open.
+
+    Edges of every registered window are bucketed on a 1440-slot timer wheel;
+    a single asyncio task sleeps until the next populated minute and flips the
+    affected users in or out of `armed`. Users without a registered window are
+    always considered armed, matching the default all-day slot; `disarmed`
+    holds the users whose window is registered and closed.
+    """
+
+    def __init__(self, clock: Callable[[], datetime] = utc_now,
+                 sleep: Callable[[float], Awaitable] = asyncio.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.armed: Set[Hashable] = set()
+        self.disarmed: Set[Hashable] = set()
+        self._windows: Dict[Hashable, ActiveWindow] = {}
+        self._wheel: Dict[int, Set[Hashable]] = {}
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def is_armed(self, user: Hashable) -> bool:
+        """Whether a user's window is open right now (O(1), no time parsing)."""
+        return user not in self.disarmed
+
+    def set_window(self, user: Hashable, window: ActiveWindow):
+        """Register or replace the window of a user and arm/disarm them right away."""
+        self._unschedule(user)
+        self._windows[user] = window
+        for edge in window.edges:
+            self._wheel.setdefault(edge, set()).add(user)
+        self._apply(user, minute_of_day(self.clock()))
+        self._changed.set()
+
+    def remove(self, user: Hashable):
+        """Forget the window of a user."""
+        self._unschedule(user)
+        self._windows.pop(user, None)
+        self.armed.discard(user)
+        self.disarmed.discard(user)
+        self._changed.set()
+
+    def tick(self, minute: int) -> List[Tuple[Hashable, bool]]:
+        """Apply the edges falling on a minute; returns the (user, armed) flips."""
+        flips = []
+        for user in self._wheel.get(minute, ()):
+            if self._apply(user, minute):
+                flips.append((user, user in self.armed))
+        return flips
+
+    def next_edge(self, minute: int) -> Optional[int]:
+        """Return the next populated wheel minute after the given one."""
+        if not self._wheel:
+            return None
+        for offset in range(1, MINUTES_PER_DAY + 1):
+            candidate = (minute + offset) % MINUTES_PER_DAY
+            if candidate in self._wheel:
+                return candidate
+        return None
+
+    def start(self):
+        """Start the timer task on the running event loop."""
+        if self._task is None:
+            # A fresh event, so a scheduler can be restarted on a new loop
+            self._changed = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the timer task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def resync(self) -> List[Tuple[Hashable, bool]]:
+        """Re-evaluate every user against the current time; returns the flips."""
+        minute = minute_of_day(self.clock())
+        return [(user, user in self.armed) for user in list(self._windows) if self._apply(user, minute)]
+
+    async def _run(self):
+        while True:
+            now = self.clock()
+            self._changed.clear()
+            edge = self.next_edge(minute_of_day(now))
+            if edge is None:
+                await self._changed.wait()
+                continue
+            delay_minutes = (edge - minute_of_day(now)) % MINUTES_PER_DAY or MINUTES_PER_DAY
+            wake_at = now.replace(second=0, microsecond=0) + timedelta(minutes=delay_minutes)
+            sleeper = asyncio.ensure_future(self.sleep((wake_at - now).total_seconds() + 0.01))
+            changed = asyncio.ensure_future(self._changed.wait())
+            await asyncio.wait([sleeper, changed], return_when=asyncio.FIRST_COMPLETED)
+            sleeper.cancel()
+            changed.cancel()
+            if self._changed.is_set():
+                continue
+            # Woken on time only the edge bucket flips; after a stall re-check everyone.
+            flips = self.tick(edge) if minute_of_day(self.clock()) == edge else self.resync()
+            if flips:
+                logger.info(f"Active hours: {len(flips)} user(s) switched at minute {edge}")
+
+    def _apply(self, user: Hashable, minute: int) -> bool:
+        window = self._windows.get(user)
+        active = window is not None and window.is_active(minute)
+        if active or window is None:
+            self.disarmed.discard(user)
+        else:
+            self.disarmed.add(user)
+        if active == (user in self.armed):
+            return False
+        if active:
+            self.armed.add(user)
+        else:
+            self.armed.discard(user)
+        return True
+
+    def _unschedule(self, user: Hashable):
+        window = self._windows.get(user)
+        if window is None:
+            return
+        for edge in window.edges:
+            bucket = self._wheel.get(edge)
+            if bucket is not None:
+                bucket.discard(user)
+                if not bucket:
+                    del self._wheel[edge]
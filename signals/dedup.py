@@ -0,0 +1,91 @@
+import time
+from collections import deque
+from operator import attrgetter
+from typing import Any, Callable, Deque, Dict, Hashable, Iterable, List, Sequence, Tuple
+
+
+class SeenWindow:
+    """Expiring seen-set: a key passes once, then is suppressed for `window` seconds.
+
+    Entries live in a dict for O(1) membership plus a FIFO of expiry times.
+    Since every entry gets the same lifetime, the FIFO is ordered by expiry
+    and purging is a pop from its head, so memory tracks the arrival rate
+    times the window and never grows with uptime.
+    """
+
+    def __init__(self, window: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.clock = clock
+        self._expiry: Dict[Hashable, float] = {}
+        self._order: Deque[Tuple[float, Hashable]] = deque()
+        self.passed = 0
+        self.suppressed = 0
+        self.peak = 0
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    def first_seen(self, key: Hashable) -> bool:
+        """Record `key` and return True unless it was already seen inside the window."""
+        now = self.clock()
+        order, expiry = self._order, self._expiry
+        while order and order[0][0] <= now:
+            expires, old = order.popleft()
+            if expiry.get(old) == expires:
+                del expiry[old]
+        if key in expiry:
+            self.suppressed += 1
+            return False
+        expires = now + self.window
+        expiry[key] = expires
+        order.append((expires, key))
+        self.passed += 1
+        if len(expiry) > self.peak:
+            self.peak = len(expiry)
+        return True
+
+    def first_seen_many(self, keys: Iterable[Hashable]) -> List[bool]:
+        """first_seen() for several keys arriving together: one clock read and one purge for all of them."""
+        now = self.clock()
+        order, expiry = self._order, self._expiry
+        while order and order[0][0] <= now:
+            expires, old = order.popleft()
+            if expiry.get(old) == expires:
+                del expiry[old]
+        expires = now + self.window
+        passed = []
+        for key in keys:
+            if key in expiry:
+                passed.append(False)
+                continue
+            expiry[key] = expires
+            order.append((expires, key))
+            passed.append(True)
+        fresh = sum(passed)
+        self.passed += fresh
+        self.suppressed += len(passed) - fresh
+        if len(expiry) > self.peak:
+            self.peak = len(expiry)
+        return passed
+
+    def forget(self, key: Hashable):
+        """Let the next occurrence of `key` through again."""
+        self._expiry.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        seen = self.passed + self.suppressed
+        return {
+            'passed': self.passed,
+            'suppressed': self.suppressed,
+            'suppressed_rate': self.suppressed / seen if seen else 0.0,
+            'size': len(self._expiry),
+            'peak': self.peak,
+        }
+
+
+def fresh_per_recipient(recipients: Sequence[Tuple[int, float]], tokens: Sequence[Any], seen: SeenWindow,
+                        key: Callable[[Any], Hashable] = attrgetter('address')) -> List[Tuple[int, float, List[Any]]]:
+    """(tg_id, eth_limit, tokens) per recipient, keeping the tokens the recipient has not acted on yet."""
+    keys = [key(token) for token in tokens]
+    passed = iter(seen.first_seen_many([(tg_id, token_key) for tg_id, _ in recipients for token_key in keys]))
+    return [(tg_id, eth_limit, [token for token in tokens if next(passed)]) for tg_id, eth_limit in recipients]
@@ -0,0 +1,70 @@
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+
+class GroupDirectory:
+    """Titles of the group chats the bot has seen, and the groups each bot user posts in.
+
+    Groups are keyed like the settings, by the chat id as a string. Both maps
+    are filled from group messages, so the menus can list a user's real
+    groups by title without a Bot API call. Only senders registered with
+    add_users() (everyone who has started the bot) are tracked as members.
+    Each user keeps only their `max_groups_per_user` most recently joined
+    groups. The directory lives in memory; load() fills it from the stored
+    copy (AsyncGroupRepository) that the bot writes whenever observe()
+    reports something new.
+    """
+
+    def __init__(self, max_groups_per_user: int = 20):
+        self.max_groups_per_user = max_groups_per_user
+        self._titles: Dict[str, str] = {}
+        # tg_id -> groups in the order they were first seen, as an ordered set
+        self._members: Dict[int, Dict[str, None]] = {}
+        self._users: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._titles)
+
+    def __contains__(self, user_id: int) -> bool:
+        """Whether user_id is a bot user, whose groups are tracked."""
+        return user_id in self._users
+
+    def add_users(self, user_ids: Iterable[int]):
+        """Track the groups of these bot users from now on."""
+        self._users.update(user_ids)
+
+    def observe(self, group: str, title: Optional[str], user_id: Optional[int] = None) -> bool:
+        """Record a message in a group, and that user_id posts there when given; True if anything was new."""
+        changed = False
+        if title and self._titles.get(group) != title:
+            self._titles[group] = title
+            changed = True
+        if user_id is None:
+            return changed
+        self._users.add(user_id)
+        groups = self._members.get(user_id)
+        if groups is None:
+            groups = self._members[user_id] = {}
+        elif group in groups:
+            return changed
+        groups[group] = None
+        if len(groups) > self.max_groups_per_user:
+            del groups[next(iter(groups))]
+        return True
+
+    def load(self, documents: Iterable[Dict[str, Any]]):
+        """Take the stored groups: {'group', 'title', 'members'} documents."""
+        for document in documents:
+            self.observe(document['group'], document.get('title'))
+            for user_id in document.get('members', ()):
+                self.observe(document['group'], None, user_id)
+
+    def title(self, group: str) -> str:
+        """The last seen title of a group, the group key itself when unknown."""
+        return self._titles.get(group, group)
+
+    def groups_of(self, user_id: int, configured: Iterable[str] = (), limit: int = 0) -> List[str]:
+        """The groups to offer a user: those with settings first, then those they post in."""
+        groups = dict.fromkeys(configured)
+        groups.update(dict.fromkeys(self._members.get(user_id, ())))
+        ordered = list(groups)
+        return ordered[:limit] if limit else ordered
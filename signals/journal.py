@@ -0,0 +1,211 @@
+import heapq
+import mmap
+import os
+import struct
+import time
+from functools import lru_cache
+from operator import itemgetter
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from eth_utils import to_checksum_address
+
+from signals.parser import TokenMention, b58decode, b58encode
+
+# Segment layout: a 64-byte header, then `capacity` fixed-width records
+MAGIC = b'SIGJNL01'
+HEADER = struct.Struct('<8sIIQ')    # magic, record size, capacity, records written
+COUNT = struct.Struct('<Q')
+COUNT_OFFSET = 16
+HEADER_SIZE = 64
+# timestamp, chat id, sender id, recipients, recipients that acted, kind, chain, token, sender username
+RECORD = struct.Struct('<dqqIIBB32s32s2x')
+# The same records without the live decision, for replay
+REPLAY_RECORD = struct.Struct('<dqq8xBB32s32s2x')
+SEGMENT_SUFFIX = '.sigj'
+
+KIND_EVM, KIND_SOLANA = 0, 1
+KINDS = ('evm', 'solana')
+# Chain codes; chains outside the table are stored as 'other'
+CHAINS = (None, 'ethereum', 'base', 'bsc', 'arbitrum', 'solana', 'other')
+_CHAIN_CODES: Dict[Optional[str], int] = {chain: code for code, chain in enumerate(CHAINS)}
+OTHER_CHAIN = _CHAIN_CODES['other']
+
+
+class SignalRecord(NamedTuple):
+    timestamp: float
+    chat_id: int
+    sender_id: int
+    recipients: int
+    fired: int
+    token: TokenMention
+    username: str
+
+
+@lru_cache(maxsize=65536)
+def encode_token(address: str, kind: str) -> bytes:
+    """The 32 stored bytes of a token address: 20 for EVM (zero-padded by struct), 32 for a Solana mint."""
+    return bytes.fromhex(address[2:]) if kind == 'evm' else b58decode(address)
+
+
+def decode_token(raw: bytes, kind: int) -> str:
+    if kind == KIND_EVM:
+        return to_checksum_address(raw[:20])
+    return b58encode(raw)
+
+
+def segment_paths(directory: str) -> List[str]:
+    """The segment files of a journal directory, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith(SEGMENT_SUFFIX)]
+
+
+def _read_header(path: str) -> Tuple[int, int, int]:
+    with open(path, 'rb') as file:
+        magic, record_size, capacity, count = HEADER.unpack(file.read(HEADER.size))
+    if magic != MAGIC or record_size != RECORD.size:
+        raise ValueError(f"{path} is not a signal journal segment")
+    return record_size, capacity, count
+
+
+class SignalJournal:
+    """Append-only journal of the token calls seen in subscribed groups, in memory-mapped segments.
+
+    A segment file is created at its full size (`segment_records` records) and
+    mapped once, so appending is a struct pack into the mapping and a bump of
+    the record count in the header: no system call and no allocation beyond
+    the packed fields. A full segment is closed and the next one started.
+    The count is written after the record, so a reader never sees a partial
+    one. Records reach the page cache at once and survive a crash of the
+    process; flush() forces them to disk. Reopening a directory continues
+    its last segment.
+    """
+
+    def __init__(self, directory: str, segment_records: int = 1 << 20, clock: Callable[[], float] = time.time):
+        self.directory = directory
+        self.segment_records = segment_records
+        self.clock = clock
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._index = 0
+        self._capacity = 0
+        self._count = 0
+        self.appended = 0
+        self.segments = 0
+        os.makedirs(directory, exist_ok=True)
+        existing = segment_paths(directory)
+        if existing:
+            self._index = int(os.path.basename(existing[-1])[:-len(SEGMENT_SUFFIX)])
+            _, capacity, count = _read_header(existing[-1])
+            if count < capacity:
+                self._open(existing[-1], capacity, count)
+                return
+            self._index += 1
+        self._create()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _path(self, index: int) -> str:
+        return os.path.join(self.directory, f'{index:010d}{SEGMENT_SUFFIX}')
+
+    def _create(self):
+        path = self._path(self._index)
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, RECORD.size, self.segment_records, 0).ljust(HEADER_SIZE, b'\0'))
+        self._open(path, self.segment_records, 0)
+        self.segments += 1
+
+    def _open(self, path: str, capacity: int, count: int):
+        self._file = open(path, 'r+b')
+        # A closed segment was cut to its records; grow it back to take more
+        self._file.truncate(HEADER_SIZE + capacity * RECORD.size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._capacity = capacity
+        self._count = count
+
+    def _close_segment(self):
+        self._map.flush()
+        self._map.close()
+        self._file.truncate(HEADER_SIZE + self._count * RECORD.size)
+        self._file.close()
+        self._map = self._file = None
+
+    def append(self, chat_id: int, sender_id: int, username: Optional[str], token: TokenMention,
+               recipients: int, fired: int, timestamp: Optional[float] = None):
+        """Record one token call: where and from whom, who it went to and how many acted on it."""
+        if self._count == self._capacity:
+            self._close_segment()
+            self._index += 1
+            self._create()
+        RECORD.pack_into(self._map, HEADER_SIZE + self._count * RECORD.size,
+                         self.clock() if timestamp is None else timestamp, chat_id, sender_id, recipients, fired,
+                         KIND_EVM if token.kind == 'evm' else KIND_SOLANA, _CHAIN_CODES.get(token.chain, OTHER_CHAIN),
+                         encode_token(token.address, token.kind), username.encode() if username else b'')
+        self._count += 1
+        COUNT.pack_into(self._map, COUNT_OFFSET, self._count)
+        self.appended += 1
+
+    def flush(self):
+        """Write the mapped records to disk."""
+        if self._map is not None:
+            self._map.flush()
+
+    def close(self):
+        """Flush and close the current segment, trimmed to the records it holds."""
+        if self._map is not None:
+            self._close_segment()
+
+    def stats(self) -> Dict[str, int]:
+        """Counters: records appended by this process, segments started and records in the open segment."""
+        return {'appended': self.appended, 'segments': self.segments, 'in_segment': self._count}
+
+
+def read_segment(path: str, layout: struct.Struct = RECORD) -> Iterator[tuple]:
+    """The records of one segment as tuples of `layout`, unpacked straight from the mapping."""
+    _, _, count = _read_header(path)
+    if not count:
+        return
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+        if hasattr(mapping, 'madvise'):
+            mapping.madvise(mmap.MADV_SEQUENTIAL)
+        with memoryview(mapping) as view:
+            records = view[HEADER_SIZE:HEADER_SIZE + count * RECORD.size]
+            try:
+                yield from layout.iter_unpack(records)
+            finally:
+                records.release()
+
+
+class JournalReader:
+    """Reads one or more journal directories (one per shard) in time order.
+
+    The records of one directory are in append order; several directories
+    are merged by timestamp. Segments are read through read-only mappings,
+    so a journal can be read while it is being written.
+    """
+
+    def __init__(self, *directories: str):
+        self.directories = directories
+
+    def __len__(self) -> int:
+        return sum(_read_header(path)[2] for directory in self.directories for path in segment_paths(directory))
+
+    def _directory(self, directory: str, layout: struct.Struct) -> Iterator[tuple]:
+        for path in segment_paths(directory):
+            yield from read_segment(path, layout)
+
+    def records(self, layout: struct.Struct = RECORD) -> Iterator[tuple]:
+        """Every record as a raw tuple of `layout` (RECORD or REPLAY_RECORD)."""
+        if len(self.directories) == 1:
+            return self._directory(self.directories[0], layout)
+        return heapq.merge(*(self._directory(directory, layout) for directory in self.directories),
+                           key=itemgetter(0))
+
+    def signals(self) -> Iterator[SignalRecord]:
+        """Every record decoded, with the token as a TokenMention ('journal' as its source)."""
+        for timestamp, chat_id, sender_id, recipients, fired, kind, chain, token, username in self.records():
+            mention = TokenMention(decode_token(token, kind), CHAINS[chain] if chain < len(CHAINS) else 'other',
+                                   KINDS[kind], 'journal')
+            yield SignalRecord(timestamp, chat_id, sender_id, recipients, fired, mention,
+                               username.rstrip(b'\0').decode())
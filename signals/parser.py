@@ -0,0 +1,132 @@
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from eth_utils import to_checksum_address
+
+_BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+_BASE58_INDEX = {char: index for index, char in enumerate(_BASE58_ALPHABET)}
+
+_EVM = r'0x[0-9a-fA-F]{40}'
+_BASE58 = r'[1-9A-HJ-NP-Za-km-z]{32,44}'
+
+# Explorer / DEX hosts and the chain they imply. Hosts that serve several chains
+# carry the chain as the first path segment instead (see _MULTICHAIN_HOSTS).
+_HOST_CHAINS = {
+    'etherscan.io': 'ethereum',
+    'basescan.org': 'base',
+    'bscscan.com': 'bsc',
+    'arbiscan.io': 'arbitrum',
+    'solscan.io': 'solana',
+    'birdeye.so': 'solana',
+    'pump.fun': 'solana',
+    'photon-sol.tinyastro.io': 'solana',
+}
+_MULTICHAIN_HOSTS = {'dexscreener.com', 'dextools.io', 'geckoterminal.com', 'defined.fi'}
+_CHAIN_ALIASES = {'ether': 'ethereum', 'eth': 'ethereum', 'sol': 'solana', 'arbitrum': 'arbitrum', 'bnb': 'bsc'}
+
+_HOSTS = '|'.join(re.escape(host) for host in sorted({*_HOST_CHAINS, *_MULTICHAIN_HOSTS}, key=len, reverse=True))
+
+# Single pass over the message for anything shaped like an address. Link
+# context is only examined for the few characters in front of an actual match.
+_SCANNER = re.compile(rf'(?<![0-9A-Za-z])(?:(?P<evm>{_EVM})|(?P<sol>{_BASE58}))(?![0-9A-Za-z])')
+_LINK_PREFIX = re.compile(rf'(?:https?://)?(?:www\.)?(?P<host>{_HOSTS})/(?P<path>\S*)$')
+
+
+class TokenMention(NamedTuple):
+    address: str
+    chain: Optional[str]
+    kind: str
+    source: str
+
+
+@lru_cache(maxsize=65536)
+def normalize_evm(address: str) -> str:
+    """Return the EIP-55 checksummed form of a hex address."""
+    return to_checksum_address(address.lower())
+
+
+@lru_cache(maxsize=65536)
+def is_solana_mint(candidate: str) -> bool:
+    """Check that a base58 string decodes to a 32 byte public key."""
+    value = 0
+    for char in candidate:
+        value = value * 58 + _BASE58_INDEX[char]
+    leading_zeros = len(candidate) - len(candidate.lstrip('1'))
+    return leading_zeros + (value.bit_length() + 7) // 8 == 32
+
+
+def b58decode(text: str) -> bytes:
+    """Decode base58 (Bitcoin alphabet), keeping leading zero bytes."""
+    value = 0
+    for char in text:
+        value = value * 58 + _BASE58_INDEX[char]
+    leading_zeros = len(text) - len(text.lstrip('1'))
+    return b'\0' * leading_zeros + value.to_bytes((value.bit_length() + 7) // 8, 'big')
+
+
+def b58encode(data: bytes) -> str:
+    """The inverse of b58decode."""
+    value = int.from_bytes(data, 'big')
+    digits = []
+    while value:
+        value, digit = divmod(value, 58)
+        digits.append(_BASE58_ALPHABET[digit])
+    leading_zeros = len(data) - len(data.lstrip(b'\0'))
+    return '1' * leading_zeros + ''.join(reversed(digits))
+
+
+def is_buyable(kind: str, chain: Optional[str]) -> bool:
+    """Whether the executor can buy a token: an EVM address on Base, or on no chain in particular."""
+    return kind == 'evm' and chain in (None, 'base')
+
+
+def _link_chain(host: str, path: str) -> Optional[str]:
+    chain = _HOST_CHAINS.get(host)
+    if chain is None:
+        segments = [segment for segment in path.split('/') if segment]
+        if host == 'dextools.io' and segments[:1] == ['app']:
+            segments = segments[2:] if len(segments) > 2 and len(segments[1]) == 2 else segments[1:]
+        if segments:
+            chain = _CHAIN_ALIASES.get(segments[0].lower(), segments[0].lower())
+    return chain
+
+
+def _link_prefix(text: str, start: int):
+    """Return the explorer/DEX link match ending right before position start, if any."""
+    if start == 0 or text[start - 1] != '/':
+        return None
+    chunk_start = max(text.rfind(' ', 0, start), text.rfind('\n', 0, start), text.rfind('\t', 0, start)) + 1
+    return _LINK_PREFIX.search(text, chunk_start, start)
+
+
+def extract_tokens(text: Optional[str]) -> List[TokenMention]:
+    """Extract deduplicated token addresses from a chat message, in order of appearance."""
+    if not text:
+        return []
+    found: Dict[str, TokenMention] = {}
+    for match in _SCANNER.finditer(text):
+        evm = match.group('evm')
+        if evm is not None:
+            address, kind, chain = normalize_evm(evm), 'evm', None
+        else:
+            address, kind, chain = match.group('sol'), 'solana', 'solana'
+            if not is_solana_mint(address):
+                continue
+        source = 'text'
+        link = _link_prefix(text, match.start())
+        if link is not None:
+            chain = _link_chain(link.group('host'), link.group('path')) or chain
+            source = 'link'
+
+        previous = found.get(address)
+        if previous is None:
+            found[address] = TokenMention(address, chain, kind, source)
+        elif previous.chain is None and chain is not None:
+            found[address] = previous._replace(chain=chain)
+    return list(found.values())
+
+
+def extract_from_message(message: Any) -> List[TokenMention]:
+    """Extract token addresses from the text or caption of a Telegram message."""
+    return extract_tokens(message.text or getattr(message, 'caption', None))
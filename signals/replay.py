@@ -0,0 +1,101 @@
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from signals.access import AccessIndex
+from signals.active_hours import MINUTES_PER_DAY, ActiveHoursScheduler
+from signals.dedup import SeenWindow
+from signals.journal import CHAINS, KINDS
+from signals.parser import is_buyable
+from signals.subscriptions import SubscriptionIndex, index_user_rules
+
+
+class SignalReplay:
+    """Feeds journalled token calls through the live filter and decision code on their recorded time.
+
+    The settings to try are loaded into a private SubscriptionIndex,
+    AccessIndex and ActiveHoursScheduler, exactly as the bot loads stored
+    settings. Every record goes through SubscriptionIndex.select() and
+    SeenWindow.first_seen_many() the way echo runs them. Time is the
+    record's timestamp: the scheduler's edges are applied as replay time
+    crosses them and the dedup window expires on replay time, so nothing
+    waits on the wall clock. Records of groups without subscribers are
+    skipped before any other work.
+
+    run() returns the calls each user would have been sent and the buys and
+    ETH spent they would have triggered (before the executor's token checks).
+    """
+
+    def __init__(self, configs: Dict[int, Dict[str, Any]], dedup_window: float = 300.0):
+        self._now = 0.0
+        self.subscriptions = SubscriptionIndex()
+        self.access = AccessIndex()
+        self.hours = ActiveHoursScheduler(clock=lambda: datetime.fromtimestamp(self._now, timezone.utc))
+        self.seen = SeenWindow(dedup_window, clock=lambda: self._now)
+        # Users whose stored time slot does not parse; replayed with their other settings
+        self.invalid: List[int] = []
+        for tg_id, config in configs.items():
+            try:
+                index_user_rules(tg_id, config, self.subscriptions, self.access, self.hours)
+            except ValueError:
+                self.invalid.append(tg_id)
+
+    def run(self, records: Iterable[tuple], since: Optional[float] = None) -> Dict[str, Any]:
+        """Replay REPLAY_RECORD tuples (JournalReader.records(REPLAY_RECORD)), optionally from `since` on."""
+        subscriptions, access, hours = self.subscriptions, self.access, self.hours
+        select, first_seen_many = subscriptions.select, self.seen.first_seen_many
+        buyable = {(kind, chain): is_buyable(KINDS[kind], CHAINS[chain])
+                   for kind in range(len(KINDS)) for chain in range(len(CHAINS))}
+        groups: Dict[int, str] = {}
+        usernames: Dict[int, bytes] = {}
+        notified: Dict[int, int] = defaultdict(int)
+        buys: Dict[int, int] = defaultdict(int)
+        spent: Dict[int, float] = defaultdict(float)
+        replayed = skipped = 0
+        minute = None
+        message = recipients = None
+        for timestamp, chat_id, sender_id, kind, chain, token, username in records:
+            if since is not None and timestamp < since:
+                continue
+            replayed += 1
+            group = groups.get(chat_id)
+            if group is None:
+                group = groups[chat_id] = str(chat_id)
+            if subscriptions.subscribers(group) is None:
+                skipped += 1
+                continue
+            self._now = timestamp
+            current = int(timestamp // 60)
+            if current != minute:
+                if minute is None or not 0 < current - minute < MINUTES_PER_DAY:
+                    hours.resync()
+                else:
+                    for passed in range(minute + 1, current + 1):
+                        hours.tick(passed % MINUTES_PER_DAY)
+                minute = current
+            if usernames.get(sender_id) != username:
+                usernames[sender_id] = username
+                access.observe(sender_id, username.rstrip(b'\0').decode())
+            # The tokens of one message are consecutive records sharing its time, chat and sender
+            if message != (timestamp, chat_id, sender_id):
+                message = (timestamp, chat_id, sender_id)
+                recipients = select(group, sender_id, hours, access)
+            if not recipients:
+                continue
+            passed = first_seen_many([(tg_id, token) for tg_id, _ in recipients])
+            buy = buyable.get((kind, chain))
+            for (tg_id, eth_limit), fresh in zip(recipients, passed):
+                if fresh:
+                    notified[tg_id] += 1
+                    if buy and eth_limit > 0:
+                        buys[tg_id] += 1
+                        spent[tg_id] += eth_limit
+        return {
+            'replayed': replayed,
+            'skipped': skipped,
+            'notified': dict(notified),
+            'buys': dict(buys),
+            'eth_spent': dict(spent),
+        }
+
+
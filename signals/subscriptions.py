@@ -0,0 +1,165 @@
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from signals.access import AccessIndex
+from signals.active_hours import ActiveHoursScheduler, compile_slots
+
+
+class GroupSubscribers:
+    """Subscribers of one group as parallel arrays: tg_ids and their ETH limits.
+
+    Removal moves the last record into the freed slot, so every change is O(1)
+    and the arrays stay dense for the fan-out loop.
+    """
+
+    __slots__ = ('ids', 'eth_limits', '_slots')
+
+    def __init__(self):
+        self.ids = array('q')
+        self.eth_limits = array('d')
+        self._slots: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, tg_id: int) -> bool:
+        return tg_id in self._slots
+
+    def put(self, tg_id: int, eth_limit: float):
+        slot = self._slots.get(tg_id)
+        if slot is None:
+            self._slots[tg_id] = len(self.ids)
+            self.ids.append(tg_id)
+            self.eth_limits.append(eth_limit)
+        else:
+            self.eth_limits[slot] = eth_limit
+
+    def remove(self, tg_id: int):
+        slot = self._slots.pop(tg_id, None)
+        if slot is None:
+            return
+        last = len(self.ids) - 1
+        if slot != last:
+            moved = self.ids[last]
+            self.ids[slot] = moved
+            self.eth_limits[slot] = self.eth_limits[last]
+            self._slots[moved] = slot
+        del self.ids[last]
+        del self.eth_limits[last]
+
+
+class SubscriptionIndex:
+    """Inverted index from a group (the chat id as stored in the settings) to its subscribers.
+
+    A user subscribes to a group by setting a positive ETH limit for it, the
+    same condition as repo.user.subscribers_query. sync_user() brings one
+    user's entries in line with their settings and touches only the groups
+    that changed; select() evaluates all subscribers of a group for one
+    message without any I/O.
+    """
+
+    def __init__(self):
+        self._groups: Dict[str, GroupSubscribers] = {}
+        # tg_id -> {group: eth_limit}, to diff a user's new settings against
+        self._users: Dict[int, Dict[str, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def __contains__(self, tg_id: int) -> bool:
+        return tg_id in self._users
+
+    def subscribers(self, group: str) -> Optional[GroupSubscribers]:
+        """Return the subscribers of a group, None when it has none."""
+        return self._groups.get(group)
+
+    def groups_of(self, tg_id: int) -> Dict[str, float]:
+        """Return the groups a user is subscribed to, with their ETH limits."""
+        return dict(self._users.get(tg_id, {}))
+
+    def sync_user(self, tg_id: int, config: Dict[str, Any]):
+        """Update a user's subscriptions from their settings (as built by build_user_config)."""
+        wanted = {group: float(group_config['eth_limit']) for group, group_config in config['groups'].items()
+                  if group_config.get('eth_limit', 0) > 0}
+        current = self._users.get(tg_id, {})
+        for group in current.keys() - wanted.keys():
+            self._remove(tg_id, group)
+        for group, eth_limit in wanted.items():
+            if current.get(group) != eth_limit:
+                self._groups.setdefault(group, GroupSubscribers()).put(tg_id, eth_limit)
+        if wanted:
+            self._users[tg_id] = wanted
+        else:
+            self._users.pop(tg_id, None)
+
+    def remove_user(self, tg_id: int):
+        """Drop every subscription of a user."""
+        for group in self._users.pop(tg_id, {}):
+            self._remove(tg_id, group)
+
+    def _remove(self, tg_id: int, group: str):
+        subscribers = self._groups.get(group)
+        if subscribers is None:
+            return
+        subscribers.remove(tg_id)
+        if not subscribers:
+            del self._groups[group]
+
+    def select(self, group: str, sender_id: int, hours: ActiveHoursScheduler,
+               access: AccessIndex) -> List[Tuple[int, float]]:
+        """(tg_id, eth_limit) of the subscribers of a group who act on a message from sender_id.
+
+        A subscriber is skipped when their active window is closed or their
+        rules for the group filter the sender. The sender's rules and the
+        group's whitelists are resolved once per message into per-subscriber
+        exceptions, so the loop over the subscribers is set and dict lookups
+        on plain ids.
+        """
+        subscribers = self._groups.get(group)
+        if subscribers is None:
+            return []
+        verdicts, default, allow_only = access.sender_rules(sender_id)
+        overrides = {scope[0]: allowed for scope, allowed in verdicts.items()
+                     if isinstance(scope, tuple) and scope[1:] == (group,)}
+        if len(allow_only) <= len(subscribers):
+            # Whitelisting subscribers only accept the senders they named
+            closed = {scope[0] for scope in allow_only if isinstance(scope, tuple) and scope[1:] == (group,)}
+        else:
+            closed = {tg_id for tg_id in subscribers.ids if (tg_id, group) in allow_only}
+        disarmed = hours.disarmed
+        if not overrides and not closed:
+            if not default:
+                return []
+            return [(tg_id, eth_limit) for tg_id, eth_limit in zip(subscribers.ids, subscribers.eth_limits)
+                    if tg_id not in disarmed]
+        selected = []
+        for tg_id, eth_limit in zip(subscribers.ids, subscribers.eth_limits):
+            if tg_id in disarmed:
+                continue
+            allowed = overrides.get(tg_id)
+            if allowed is None:
+                allowed = default and tg_id not in closed
+            if allowed:
+                selected.append((tg_id, eth_limit))
+        return selected
+
+    def stats(self) -> Dict[str, int]:
+        """Sizes: subscribed users, groups with subscribers and subscriptions in total."""
+        return {
+            'users': len(self._users),
+            'groups': len(self._groups),
+            'subscriptions': sum(len(subscribers) for subscribers in self._groups.values()),
+        }
+
+
+def index_user_rules(tg_id: int, config: Dict[str, Any], subscriptions: SubscriptionIndex, access: AccessIndex,
+                     hours: ActiveHoursScheduler):
+    """Put a user's subscriptions, blacklists and active hours into the hot-path indexes.
+
+    `config` is as built by build_user_config. Raises ValueError for an
+    invalid stored time slot, once the rest is applied.
+    """
+    subscriptions.sync_user(tg_id, config)
+    for group, group_config in config['groups'].items():
+        access.sync_scope((tg_id, group), denied=group_config['blacklist'])
+    hours.set_window(tg_id, compile_slots(config['timings']))
@@ -0,0 +1,79 @@
+from signals.access import AccessIndex, SharedDenyList
+
+
+def test_pending_handle_resolves_on_first_message():
+    index = AccessIndex()
+    index.deny_handle((1, 'Group1'), '@Rugger')
+    assert index.allows((1, 'Group1'), 99)
+    index.observe(99, 'rugger')
+    assert not index.allows((1, 'Group1'), 99)
+    assert index.allows((2, 'Group1'), 99)
+
+
+def test_rule_follows_user_id_after_handle_change():
+    index = AccessIndex()
+    index.observe(99, 'rugger')
+    index.deny_handle('scope', 'rugger')
+    index.observe(99, 'new_name')
+    assert not index.allows('scope', 99)
+    index.remove_handle('scope', '@RUGGER')
+    assert index.allows('scope', 99)
+
+
+def test_whitelist_excludes_everyone_else():
+    index = AccessIndex()
+    index.allow_handle('scope', 'caller')
+    index.observe(5, 'caller')
+    assert index.allows('scope', 5)
+    assert not index.allows('scope', 6)
+    index.sync_scope('scope', denied=['@someone'])
+    assert index.allows('scope', 6)
+    assert index.handles('scope') == {'someone'}
+
+
+def test_shared_deny_list():
+    shared = SharedDenyList(range(0, 10000, 2))
+    index = AccessIndex(shared)
+    assert not index.allows('scope', 4)
+    assert index.allows('scope', 5)
+    shared.add(5)
+    shared.discard(4)
+    assert not index.allows('scope', 5)
+    assert index.allows('scope', 4)
+
+
+def test_remove_drops_the_rule_of_the_resolved_id_after_takeover():
+    index = AccessIndex()
+    index.observe(99, 'rugger')
+    index.deny_handle('scope', 'rugger')
+    # 99 renames and someone else takes the handle
+    index.observe(99, 'new_name')
+    index.observe(100, 'rugger')
+    assert not index.allows('scope', 99) and index.allows('scope', 100)
+    index.remove_handle('scope', 'rugger')
+    assert index.allows('scope', 99)
+    assert index.sender_rules(99)[0] == {}
+
+
+def test_two_handles_of_one_sender_keep_their_rules_apart():
+    index = AccessIndex()
+    index.deny_handle('scope', 'rugger')
+    index.observe(99, 'rugger')
+    index.observe(99, 'rugger_v2')
+    index.deny_handle('scope', 'rugger_v2')
+    index.remove_handle('scope', 'rugger')
+    assert not index.allows('scope', 99)
+    index.remove_handle('scope', 'rugger_v2')
+    assert index.allows('scope', 99) and index.sender_rules(99)[0] == {}
+
+
+def test_handle_directory_keeps_only_the_most_recent_handles():
+    index = AccessIndex(max_handles=2)
+    for user_id, handle in ((1, 'a'), (2, 'b'), (1, 'a'), (3, 'c')):
+        index.observe(user_id, handle)
+    assert (index.resolve('a'), index.resolve('b'), index.resolve('c')) == (1, None, 3)
+    # A rule on a handle no longer remembered waits for its next message
+    index.deny_handle('scope', 'b')
+    assert index.allows('scope', 2)
+    index.observe(2, 'b')
+    assert not index.allows('scope', 2)
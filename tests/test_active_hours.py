@@ -0,0 +1,60 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from signals.active_hours import ActiveHoursScheduler, compile_slots
+
+
+def test_window_wraps_midnight_and_merges_slots():
+    window = compile_slots('22:00 - 02:00, 09:00 - 10:30')
+    assert window.is_active(23 * 60) and window.is_active(60)
+    assert not window.is_active(2 * 60) and not window.is_active(12 * 60)
+    assert window.is_active(9 * 60) and not window.is_active(10 * 60 + 30)
+    assert window.edges == [120, 540, 630, 1320]
+    assert compile_slots('00:00 - 00:00').is_active(777)
+
+
+@pytest.mark.parametrize('text', ['9:00 - 10:00', '25:00 - 01:00', '10:61 - 11:00', ''])
+def test_rejects_bad_slots(text):
+    with pytest.raises(ValueError):
+        compile_slots(text)
+
+
+def test_scheduler_flips_users_at_edges():
+    now = [datetime(2025, 1, 1, 8, 59, 30, tzinfo=timezone.utc)]
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) > 1:
+            await asyncio.Event().wait()
+        now[0] += timedelta(seconds=seconds)
+
+    async def scenario():
+        scheduler = ActiveHoursScheduler(clock=lambda: now[0], sleep=fake_sleep)
+        scheduler.set_window('alice', compile_slots('09:00 - 10:00'))
+        assert not scheduler.is_armed('alice')
+        assert scheduler.is_armed('unconfigured')
+        scheduler.start()
+        for _ in range(10):
+            await asyncio.sleep(0)
+        armed = scheduler.is_armed('alice')
+        await scheduler.stop()
+        return armed, now[0]
+
+    armed, woke_at = asyncio.run(scenario())
+    assert armed
+    assert datetime(2025, 1, 1, 9, 0, tzinfo=timezone.utc) <= woke_at < datetime(2025, 1, 1, 9, 1, tzinfo=timezone.utc)
+
+
+def test_disarmed_tracks_registered_closed_windows():
+    scheduler = ActiveHoursScheduler(clock=lambda: datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc))
+    scheduler.set_window('night', compile_slots('22:00 - 06:00'))
+    scheduler.set_window('day', compile_slots('09:00 - 18:00'))
+    assert scheduler.disarmed == {'night'}
+    scheduler.set_window('night', compile_slots('00:00 - 00:00'))
+    scheduler.set_window('day', compile_slots('13:00 - 14:00'))
+    assert scheduler.disarmed == {'day'}
+    scheduler.remove('day')
+    assert scheduler.disarmed == set() and scheduler.is_armed('day')
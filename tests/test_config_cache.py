@@ -0,0 +1,81 @@
+import asyncio
+
+from bench.fakes import AsyncFakeCollection
+from repo.config_cache import ConfigCache, LRUTTLCache, config_document
+from repo.user import AsyncUserRepository
+
+
+def make_cache(**kwargs):
+    repo = AsyncUserRepository()
+    repo.collection = AsyncFakeCollection()
+    return ConfigCache(repo, **kwargs)
+
+
+def test_lru_ttl_eviction_and_expiry():
+    now = [0.0]
+    cache = LRUTTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    now[0] = 11
+    assert cache.get('a') is None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_write_through_updates_cached_config():
+    cache = make_cache()
+
+    async def scenario():
+        await cache.get_user_config(1)
+        await cache.set_group_limit(1, 'Group1', 'eth_limit', 0.5)
+        await cache.add_to_blacklist(1, 'Group1', '@rug')
+        await cache.set_timings(1, '01:00 - 02:00')
+        calls = cache.repo.collection.calls
+        config = cache.peek_user_config(1)
+        assert cache.repo.collection.calls == calls
+        cache.invalidate(1)
+        return config, await cache.get_user_config(1)
+
+    cached, reloaded = asyncio.run(scenario())
+    for config in (cached, reloaded):
+        assert config['groups']['Group1']['eth_limit'] == 0.5
+        assert config['groups']['Group1']['blacklist'] == {'@rug'}
+        assert config['timings'] == '01:00 - 02:00'
+
+
+def test_listeners_see_writes_and_adopt_round_trips():
+    writer, reader = make_cache(), make_cache()
+    published = []
+    writer.listeners.append(lambda tg_id, config: published.append((tg_id, config_document(config))))
+
+    async def scenario():
+        await writer.get_user_config(1)
+        await writer.add_to_blacklist(1, 'Group2', '@rug')
+        reader.adopt(*published[-1])
+        return reader.peek_user_config(1)
+
+    adopted = asyncio.run(scenario())
+    assert [tg_id for tg_id, _ in published] == [1]
+    assert adopted == writer.peek_user_config(1)
+    assert adopted['groups']['Group2']['blacklist'] == {'@rug'}
+    assert reader.repo.collection.calls == 0
+
+
+def test_write_after_expiry_reads_through_for_listeners():
+    cache = make_cache(ttl=300)
+    now = [0.0]
+    cache.cache.clock = lambda: now[0]
+    seen = []
+    cache.listeners.append(lambda tg_id, config: seen.append((tg_id, config['groups']['-100']['eth_limit'])))
+
+    async def scenario():
+        await cache.get_user_config(1)
+        now[0] = 301
+        await cache.set_group_limit(1, '-100', 'eth_limit', 0.3)
+    asyncio.run(scenario())
+
+    assert seen == [(1, 0.3)]
+    assert cache.peek_user_config(1)['groups']['-100']['eth_limit'] == 0.3
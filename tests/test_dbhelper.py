@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from bench.fakes import AsyncFakeCollection, FakeCollection
+from repo.dbhelper import get_async_client
+from repo.user import AsyncUserRepository, UserRepository
+
+
+def test_async_repositories_share_one_client():
+    first = AsyncUserRepository()
+    second = AsyncUserRepository(collection_name='wallets')
+    assert first.client is second.client
+    assert get_async_client() is first.client
+    # Closing one repository leaves the pool to the others
+    asyncio.run(second.close())
+    assert get_async_client() is first.client
+
+
+def test_async_initiate_doc_upserts():
+    repo = AsyncUserRepository()
+    repo.collection = AsyncFakeCollection()
+
+    async def scenario():
+        await repo.initiate_doc(tg_id=42)
+        await repo.initiate_doc(tg_id=42)
+        return await repo.find_by_tg_id(42), await repo.count_documents({})
+
+    user, count = asyncio.run(scenario())
+    assert user['status'] == 'started'
+    assert count == 1
+
+
+def test_sync_initiate_doc_upserts_and_indexes_are_idempotent():
+    repo = UserRepository()
+    repo.collection = FakeCollection()
+    assert repo.ensure_indexes() == repo.ensure_indexes() == ['tg_id_unique', 'groups_wildcard']
+    assert repo.initiate_doc(tg_id=42)
+    repo.initiate_doc(tg_id=42)
+    assert repo.count_documents({}) == 1
+    with pytest.raises(DuplicateKeyError):
+        repo.insert_one({'tg_id': 42})
+
+
+def test_write_behind_merges_changes_into_one_bulk_write():
+    repo = AsyncUserRepository(write_behind=60)
+    repo.collection = AsyncFakeCollection()
+
+    async def scenario():
+        repo.start()
+        await repo.initiate_doc(1)
+        for limit in (0.1, 0.2, 0.3):
+            await repo.set_group_value(1, 'Group1', 'eth_limit', limit)
+        await repo.add_to_blacklist(1, 'Group1', '@a')
+        await repo.add_to_blacklist(1, 'Group1', '@b')
+        await repo.remove_from_blacklist(1, 'Group1', '@a')
+        await repo.set_timings(2, '01:00 - 02:00')
+        assert repo.collection.calls == 0
+        # Reading a user with queued changes sends everything first
+        user = await repo.find_by_tg_id(1)
+        assert repo.collection.calls == 2
+        await repo.set_group_value(2, 'Group2', 'eth_limit', 0.5)
+        await repo.stop()
+        return user, await repo.find_by_tg_id(2), await repo.find_subscribers('Group2')
+
+    user, other, subscribers = asyncio.run(scenario())
+    assert user['status'] == 'started'
+    assert user['groups']['Group1'] == {'eth_limit': 0.3, 'blacklist': ['@b']}
+    assert other['timings'] == '01:00 - 02:00' and other['groups']['Group2']['eth_limit'] == 0.5
+    assert subscribers == [2]
+    # Nine changes, four operations: the $pull cannot share an update with the $addToSet on the same list
+    assert repo.write_stats() == {'queued': 9, 'flushes': 2, 'flushed_ops': 4, 'coalesced': 5, 'pending': 0}
@@ -0,0 +1,40 @@
+from signals.dedup import SeenWindow
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_seen_window_suppresses_inside_window_and_expires():
+    clock = Clock()
+    seen = SeenWindow(window=60, clock=clock)
+    assert seen.first_seen((1, '0xabc'))
+    assert not seen.first_seen((1, '0xabc'))
+    assert seen.first_seen((2, '0xabc'))
+
+    clock.now = 59
+    assert not seen.first_seen((1, '0xabc'))
+    clock.now = 60
+    assert seen.first_seen((1, '0xabc'))
+    assert len(seen) == 1
+
+    seen.forget((1, '0xabc'))
+    assert seen.first_seen((1, '0xabc'))
+    clock.now = 500
+    assert seen.first_seen((3, '0xdef')) and len(seen) == 1
+
+    stats = seen.stats()
+    assert (stats['passed'], stats['suppressed'], stats['peak']) == (5, 2, 2)
+
+
+def test_first_seen_many_matches_one_by_one():
+    clock = Clock()
+    batched, single = SeenWindow(window=60, clock=clock), SeenWindow(window=60, clock=clock)
+    for now, keys in [(0, [1, 2, 1]), (30, [2, 3]), (61, [1, 2, 3, 3])]:
+        clock.now = now
+        assert batched.first_seen_many(keys) == [single.first_seen(key) for key in keys]
+    assert batched.stats() == single.stats()
@@ -0,0 +1,76 @@
+import asyncio
+import os
+
+from eth_abi import decode
+from eth_account import Account
+
+from bench.fake_rpc import FakeRpcServer
+from chain.execution import BASE_UNISWAP_V2_ROUTER, SnipeExecutor
+from chain.rpc import JsonRpcClient, RpcError, RpcUnavailable
+
+TOKEN = '0x6982508145454Ce325dDbE47a25d4ec3d2311933'
+
+
+def test_build_matches_eth_account_signing():
+    key = os.urandom(32)
+    executor = SnipeExecutor(None, key, clock=lambda: 1000)
+    executor.fees.max_fee, executor.fees.priority_fee = 10 ** 9, 10 ** 8
+    executor.nonces._next = 5
+    swap = executor.build(TOKEN, 0.1)
+
+    data = executor.template.calldata(TOKEN, 1120)
+    assert decode(['uint256', 'address[]', 'address', 'uint256'], data[4:])[1][1] == TOKEN.lower()
+    expected = Account.from_key(key).sign_transaction({
+        'type': 2, 'chainId': 8453, 'nonce': 5, 'to': BASE_UNISWAP_V2_ROUTER, 'value': 10 ** 17,
+        'gas': 350_000, 'maxFeePerGas': 10 ** 9, 'maxPriorityFeePerGas': 10 ** 8, 'data': data})
+    assert swap.raw == expected.raw_transaction
+    assert executor.nonces.reserve() == 6
+
+
+def test_executor_against_rpc_stand_in():
+    async def scenario():
+        server = FakeRpcServer(start_nonce=3)
+        rpc = JsonRpcClient(await server.start())
+        executor = SnipeExecutor(rpc, os.urandom(32))
+        await executor.start()
+        first = await executor.execute(TOKEN, 0.05)
+        second = await executor.execute(TOKEN, 0.05)
+        server.nonce = 10
+        try:
+            await executor.send(executor.build(TOKEN, 0.05))
+        except RpcError:
+            rejected = True
+        third = await executor.execute(TOKEN, 0.05)
+        await executor.stop()
+        await rpc.close()
+        await server.stop()
+        return first, second, rejected, third
+
+    first, second, rejected, third = asyncio.run(scenario())
+    assert (first.nonce, second.nonce, third.nonce) == (3, 4, 10)
+    assert rejected
+
+
+def test_failed_send_behind_a_later_nonce_resyncs():
+    async def scenario():
+        server = FakeRpcServer(start_nonce=3)
+        rpc = JsonRpcClient(await server.start())
+        executor = SnipeExecutor(rpc, os.urandom(32))
+        await executor.start()
+        first, second = executor.build(TOKEN, 0.05), executor.build(TOKEN, 0.05)
+        server.fail = True
+        try:
+            await executor.send(first)
+        except RpcUnavailable:
+            failed = True
+        server.fail = False
+        retried = await executor.execute(TOKEN, 0.05)
+        following = await executor.execute(TOKEN, 0.05)
+        await executor.stop()
+        await rpc.close()
+        await server.stop()
+        return failed, second, retried, following
+
+    failed, second, retried, following = asyncio.run(scenario())
+    assert failed and second.nonce == 4
+    assert (retried.nonce, following.nonce) == (3, 4)
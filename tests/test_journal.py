@@ -0,0 +1,102 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+
+from eth_utils import to_checksum_address
+from telegram import Update
+
+import main
+from bench.fakes import AsyncFakeCollection, FakeBotRequest, message_payload
+from repo.config_cache import build_user_config
+from signals.dedup import SeenWindow
+from signals.journal import REPLAY_RECORD, JournalReader, SignalJournal, segment_paths
+from signals.parser import TokenMention
+from signals.replay import SignalReplay
+from signals.subscriptions import SubscriptionIndex
+
+EVM = TokenMention(to_checksum_address('0x' + 'ab' * 20), 'base', 'evm', 'text')
+SOL = TokenMention('So11111111111111111111111111111111111111112', 'solana', 'solana', 'link')
+
+
+def test_segments_rotate_reopen_and_read_back(tmp_path):
+    directory = str(tmp_path / 'journal')
+    journal = SignalJournal(directory, segment_records=3)
+    for index in range(4):
+        journal.append(-100, 7, 'caller', EVM if index % 2 else SOL, 2, index % 2, timestamp=1000.0 + index)
+    journal.close()
+    # Appending resumes in the unfinished segment
+    journal = SignalJournal(directory, segment_records=3)
+    journal.append(-101, 8, None, TokenMention(EVM.address, 'polygon', 'evm', 'link'), 0, 0, timestamp=1004.0)
+    reader = JournalReader(directory)
+    assert len(reader) == 5
+    records = list(reader.signals())
+    journal.close()
+
+    assert len(segment_paths(directory)) == 2
+    # A closed segment is cut to the records it holds
+    assert os.path.getsize(segment_paths(directory)[1]) == 64 + 2 * 100
+    assert [record.timestamp for record in records] == [1000.0, 1001.0, 1002.0, 1003.0, 1004.0]
+    assert records[0].token == SOL._replace(source='journal') and records[1].token == EVM._replace(source='journal')
+    assert (records[1].chat_id, records[1].sender_id, records[1].username, records[1].recipients,
+            records[1].fired) == (-100, 7, 'caller', 2, 1)
+    assert records[4].token.chain == 'other' and records[4].username == ''
+    # Several shards' directories merge by time
+    other = str(tmp_path / 'other')
+    shard = SignalJournal(other)
+    shard.append(-100, 9, 'late', EVM, 1, 1, timestamp=1002.5)
+    shard.close()
+    assert [record[0] for record in JournalReader(directory, other).records(REPLAY_RECORD)] == \
+        [1000.0, 1001.0, 1002.0, 1002.5, 1003.0, 1004.0]
+
+
+def test_replay_applies_limits_blacklists_hours_and_dedup(tmp_path):
+    day = datetime(2024, 5, 1, tzinfo=timezone.utc).timestamp()
+    journal = SignalJournal(str(tmp_path))
+    calls = [
+        (day + 9 * 3600, 10, 'alpha', EVM),          # 09:00: both users
+        (day + 9 * 3600 + 60, 10, 'alpha', EVM),     # repost within the window: nobody
+        (day + 9 * 3600 + 120, 11, 'rugger', SOL),   # user 2 blacklisted @rugger; SOL is not buyable
+        (day + 20 * 3600, 10, 'alpha', EVM),         # 20:00: user 1's window is closed
+    ]
+    for timestamp, sender, username, token in calls:
+        journal.append(-100, sender, username, token, 0, 0, timestamp=timestamp)
+    journal.append(-999, 10, 'alpha', EVM, 0, 0, timestamp=day + 21 * 3600)
+    journal.close()
+
+    configs = {
+        1: build_user_config({'timings': '08:00 - 18:00', 'groups': {'-100': {'eth_limit': 0.5}}}),
+        2: build_user_config({'groups': {'-100': {'eth_limit': 0.2, 'blacklist': ['@Rugger']}}}),
+    }
+    result = SignalReplay(configs).run(JournalReader(str(tmp_path)).records(REPLAY_RECORD))
+
+    assert (result['replayed'], result['skipped']) == (5, 1)
+    assert result['notified'] == {1: 2, 2: 2}
+    assert result['buys'] == {1: 1, 2: 2}
+    assert result['eth_spent'] == {1: 0.5, 2: 0.4}
+
+
+def test_echo_journals_calls_of_subscribed_groups(tmp_path, monkeypatch):
+    index = SubscriptionIndex()
+    index.sync_user(5, build_user_config({'groups': {'-1001': {'eth_limit': 0.1}}}))
+    monkeypatch.setattr(main, 'subscriptions', index)
+    monkeypatch.setattr(main, 'seen_signals', SeenWindow())
+    monkeypatch.setattr(main, 'journal', SignalJournal(str(tmp_path)))
+    monkeypatch.setattr(main.group_repo, 'collection', AsyncFakeCollection())
+    application = main.build_application('123456:TEST', 4, FakeBotRequest())
+    texts = [(-1001, 8, f"CA {EVM.address} and {SOL.address}"), (-1001, 8, f"again {EVM.address}"),
+             (-1002, 8, f"CA {EVM.address}"), (-1001, 8, "gm")]
+
+    async def scenario():
+        async with application:
+            for chat_id, sender, text in texts:
+                payload = message_payload(sender, text, chat_id=chat_id, chat_type='supergroup')
+                await application.process_update(Update.de_json(payload, application.bot))
+    asyncio.run(scenario())
+    main.journal.close()
+
+    records = list(JournalReader(str(tmp_path)).signals())
+    assert [(record.token.address, record.recipients, record.fired) for record in records] == \
+        [(EVM.address, 1, 1), (SOL.address, 1, 1), (EVM.address, 1, 0)]
+    assert {record.username for record in records} == {'user8'}
+    # The tokens of one message share its time
+    assert records[0].timestamp == records[1].timestamp
@@ -0,0 +1,167 @@
+import asyncio
+import time
+
+import rlp
+from telegram import Update
+from telegram.ext import ConversationHandler
+
+import main
+from bench.bench_app import MENU_SCRIPT, step_payload
+from bench.fake_rpc import FakeRpcServer, sender_of
+from bench.fakes import AsyncFakeCollection, FakeBotRequest, message_payload
+from bot.outbound import OutboundDispatcher
+from chain.rpc import JsonRpcClient
+from chain.token_cache import REJECT_REVERTED, TokenCache
+from chain.tokens import TokenReader
+from chain.wallets import WalletExecutors, generate_wallet
+from constants import State
+from repo.config_cache import build_user_config
+from repo.wallet import AsyncWalletRepository
+from signals.dedup import SeenWindow
+from signals.subscriptions import SubscriptionIndex
+
+
+def test_menu_script_walks_every_state_offline(monkeypatch):
+    monkeypatch.setattr(main.user_repo, 'collection', AsyncFakeCollection())
+    monkeypatch.setattr(main.group_repo, 'collection', AsyncFakeCollection())
+    monkeypatch.setattr(main, 'seen_signals', SeenWindow())
+    main.config_cache.cache.clear()
+    application = main.build_application('123456:TEST', 4, FakeBotRequest())
+    conversation = application.handlers[0][0]
+    visited, errors = [], []
+
+    def record(callback):
+        async def wrapper(update, context):
+            state = await callback(update, context)
+            visited.append(state)
+            return state
+        return wrapper
+
+    for handler in conversation.entry_points + [h for state in conversation.states.values() for h in state]:
+        handler.callback = record(handler.callback)
+
+    async def on_error(update, context):
+        errors.append(context.error)
+    application.add_error_handler(on_error)
+
+    async def scenario():
+        async with application:
+            for index, step in enumerate(MENU_SCRIPT):
+                await application.process_update(Update.de_json(step_payload(7, *step, index), application.bot))
+            group_message = message_payload(8, f"CA 0x{1:040x}", chat_id=-1001, chat_type='supergroup')
+            await application.process_update(Update.de_json(group_message, application.bot))
+
+    asyncio.run(scenario())
+    assert errors == []
+    assert set(State) - set(visited) == set()
+    assert visited[-1] == ConversationHandler.END
+
+
+TOKEN = '0x6982508145454Ce325dDbE47a25d4ec3d2311933'
+
+
+def subscribe(monkeypatch, limits):
+    """Subscribe users to group -1001 with the given ETH limits, with fresh signal state."""
+    index = SubscriptionIndex()
+    for tg_id, limit in limits.items():
+        index.sync_user(tg_id, build_user_config({'groups': {'-1001': {'eth_limit': limit}}}))
+    monkeypatch.setattr(main, 'subscriptions', index)
+    monkeypatch.setattr(main, 'seen_signals', SeenWindow())
+    monkeypatch.setattr(main, 'outbound', OutboundDispatcher())
+    monkeypatch.setattr(main.group_repo, 'collection', AsyncFakeCollection())
+    return main.build_application('123456:TEST', 4, FakeBotRequest())
+
+
+async def enable_buying(monkeypatch, server, wallets, clock=time.monotonic):
+    """Turn buying on against `server`, with each user of `wallets` given that wallet."""
+    repo = AsyncWalletRepository()
+    repo.collection = AsyncFakeCollection()
+    await repo.add_to_pool(list(wallets.values()))
+    for tg_id, wallet in wallets.items():
+        await repo.assign(wallet['address'], tg_id)
+    rpc = JsonRpcClient(await server.start())
+    monkeypatch.setattr(main, 'token_cache', TokenCache(TokenReader(rpc), clock=clock))
+    monkeypatch.setattr(main, 'executors', WalletExecutors(repo, 'secret', rpc))
+    await main.executors.start()
+
+
+async def disable_buying(server):
+    await main.executors.stop()
+    await main.executors.rpc.close()
+    await server.stop()
+
+
+async def post(application, text):
+    payload = message_payload(8, text, chat_id=-1001, chat_type='supergroup')
+    await application.process_update(Update.de_json(payload, application.bot))
+
+
+def test_group_call_buys_once_per_subscriber_from_their_own_wallet(monkeypatch):
+    wallets = {tg_id: generate_wallet('secret', iterations=2 ** 10) for tg_id in (1, 2)}
+    # User 3 is subscribed but was never given a wallet
+    application = subscribe(monkeypatch, {1: 0.1, 2: 0.2, 3: 0.3})
+    server = FakeRpcServer()
+    server.add_token(TOKEN, reserve_token=10 ** 20, reserve_weth=10 ** 18)
+
+    async def scenario():
+        await enable_buying(monkeypatch, server, wallets)
+        async with application:
+            await post(application, f"CA {TOKEN}")
+        await disable_buying(server)
+    asyncio.run(scenario())
+
+    assert len(server.sent) == 2
+    # One buy per subscriber with a wallet, signed by that wallet for that subscriber's limit
+    assert {sender_of(raw): int.from_bytes(rlp.decode(raw[1:])[6], 'big') for raw in server.sent} == \
+        {wallets[1]['address']: 10 ** 17, wallets[2]['address']: 2 * 10 ** 17}
+    assert len(main.executors) == 2
+
+
+def test_call_rejected_for_no_liquidity_fires_again_on_repost(monkeypatch):
+    wallets = {1: generate_wallet('secret', iterations=2 ** 10)}
+    application = subscribe(monkeypatch, {1: 0.1})
+    server = FakeRpcServer()
+    server.add_token(TOKEN)
+    now = [0.0]
+
+    async def scenario():
+        await enable_buying(monkeypatch, server, wallets, clock=lambda: now[0])
+        async with application:
+            await post(application, f"CA {TOKEN}")
+            rejected = len(server.sent)
+            # Liquidity is added and the no-liquidity verdict expires within the dedup window
+            server.add_token(TOKEN, reserve_token=10 ** 20, reserve_weth=10 ** 18)
+            now[0] = 20
+            await post(application, f"again {TOKEN}")
+        await disable_buying(server)
+        return rejected
+    rejected = asyncio.run(scenario())
+
+    assert rejected == 0
+    assert [sender_of(raw) for raw in server.sent] == [wallets[1]['address']]
+
+
+def test_reverted_buy_rejects_the_token(monkeypatch):
+    wallets = {tg_id: generate_wallet('secret', iterations=2 ** 10) for tg_id in (1, 2)}
+    application = subscribe(monkeypatch, {1: 0.1})
+    server = FakeRpcServer()
+    server.add_token(TOKEN, reserve_token=10 ** 20, reserve_weth=10 ** 18)
+    attempts = []
+
+    def revert(params):
+        attempts.append(params)
+        raise ValueError('execution reverted: TRANSFER_FAILED')
+    server.methods['eth_sendRawTransaction'] = revert
+
+    async def scenario():
+        await enable_buying(monkeypatch, server, wallets)
+        async with application:
+            await post(application, f"CA {TOKEN}")
+            # Another subscriber's call of the same token is not tried again
+            main.subscriptions.sync_user(2, build_user_config({'groups': {'-1001': {'eth_limit': 0.2}}}))
+            await post(application, f"CA {TOKEN}")
+        await disable_buying(server)
+    asyncio.run(scenario())
+
+    assert len(attempts) == 1
+    assert main.token_cache.rejection(TOKEN) == REJECT_REVERTED
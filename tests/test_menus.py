@@ -0,0 +1,147 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from telegram import Update
+from telegram.error import BadRequest, NetworkError
+
+import main
+from bench.fakes import AsyncFakeCollection, FakeBotRequest, callback_payload, message_payload
+from bot.menus import MenuEngine, Screen, markup
+from bot.outbound import OutboundDispatcher
+from constants import State
+from signals.dedup import SeenWindow
+from signals.groups import GroupDirectory
+
+
+class RecordingDispatcher:
+    def __init__(self):
+        self.edits = []
+
+    def edit_query_message(self, query, text, **kwargs):
+        future = asyncio.get_running_loop().create_future()
+        self.edits.append((text, kwargs, future))
+        return future
+
+
+def test_unchanged_edits_are_skipped_until_an_edit_fails():
+    with pytest.raises(ValueError):
+        MenuEngine([Screen(State.SELECTING_CONFIG, 'menu', routes={'go': State.SELECTING_GROUP})], lambda: None)
+    rows = ((('A', 'a'), ('B', 'b')),)
+    assert markup(rows) is markup(tuple(tuple(row) for row in rows))
+
+    async def scenario():
+        dispatcher = RecordingDispatcher()
+        engine = MenuEngine([], lambda: dispatcher)
+        query = SimpleNamespace(message=SimpleNamespace(chat_id=7, message_id=1))
+        engine.edit(query, 'menu', rows)
+        assert engine.edit(query, 'menu', rows) is None
+        dispatcher.edits[0][2].set_exception(NetworkError('timed out'))
+        await asyncio.sleep(0)
+        # The failed edit may not have reached the message, so the same content is sent again
+        engine.edit(query, 'menu', rows)
+        dispatcher.edits[1][2].set_exception(BadRequest('Message is not modified'))
+        await asyncio.sleep(0)
+        engine.edit(query, 'menu', rows)
+        engine.edit(query, 'menu', ())
+        return dispatcher.edits, engine.stats()
+
+    edits, stats = asyncio.run(scenario())
+    assert [text for text, _, _ in edits] == ['menu', 'menu', 'menu']
+    assert edits[0][1]['reply_markup'] is markup(rows) and 'reply_markup' not in edits[2][1]
+    assert (stats['edited'], stats['unchanged']) == (3, 2)
+
+
+def test_group_list_shows_the_groups_a_user_posts_in_and_skips_repeated_screens(monkeypatch):
+    monkeypatch.setattr(main.user_repo, 'collection', AsyncFakeCollection())
+    monkeypatch.setattr(main.group_repo, 'collection', AsyncFakeCollection())
+    monkeypatch.setattr(main, 'seen_signals', SeenWindow())
+    monkeypatch.setattr(main, 'group_directory', GroupDirectory())
+    dispatcher = OutboundDispatcher(global_rate=1e9, chat_rate=1e9, group_chat_rate=1e9, chat_burst=1e9)
+    monkeypatch.setattr(main, 'outbound', dispatcher)
+    main.config_cache.cache.clear()
+    request = FakeBotRequest()
+    application = main.build_application('123456:TEST', 4, request)
+    edits = []
+    edit = dispatcher.edit_query_message
+
+    def record(query, text, **kwargs):
+        edits.append((text, kwargs.get('reply_markup')))
+        return edit(query, text, **kwargs)
+    monkeypatch.setattr(dispatcher, 'edit_query_message', record)
+
+    steps = [message_payload(7, '/start'),
+             message_payload(7, 'gm', chat_id=-1001, chat_type='supergroup'),
+             # Not a bot user: not listed anywhere
+             message_payload(8, 'gm', chat_id=-1002, chat_type='supergroup'),
+             callback_payload(7, 'configure_groups'),
+             callback_payload(7, 'group:-1001'),
+             callback_payload(7, 'set_limits'),
+             callback_payload(7, 'set_limits'),
+             callback_payload(7, 'back_to_group_options')]
+
+    async def scenario():
+        before = main.menus.stats()
+        async with application:
+            dispatcher.start(application.bot)
+            for payload in steps:
+                await application.process_update(Update.de_json(payload, application.bot))
+            await dispatcher.stop()
+        after = main.menus.stats()
+        return {key: after[key] - before[key] for key in ('edited', 'unchanged')}
+
+    counts = asyncio.run(scenario())
+    assert counts == {'edited': 4, 'unchanged': 1}
+    assert request.calls['editMessageText'] == 4 and request.calls['answerCallbackQuery'] == 5
+    groups = [[(button.text, button.callback_data) for button in row] for row in edits[0][1].inline_keyboard]
+    assert groups == [[('group -1001', 'group:-1001')],
+                      [('➕ Add Group', 'add_group')],
+                      [('🔙 Back to Main Menu', 'back_to_main')]]
+    assert edits[1][0].startswith('group -1001 Configuration')
+    assert 'ETH Limit(for base chain): 0.0' in edits[2][0]
+
+
+def test_group_directory_survives_restart_and_takes_groups_typed_in(monkeypatch):
+    monkeypatch.setattr(main.user_repo, 'collection', AsyncFakeCollection())
+    monkeypatch.setattr(main.group_repo, 'collection', AsyncFakeCollection())
+    monkeypatch.setattr(main, 'seen_signals', SeenWindow())
+    monkeypatch.setattr(main, 'group_directory', GroupDirectory())
+    dispatcher = OutboundDispatcher(global_rate=1e9, chat_rate=1e9, group_chat_rate=1e9, chat_burst=1e9)
+    monkeypatch.setattr(main, 'outbound', dispatcher)
+    main.config_cache.cache.clear()
+    application = main.build_application('123456:TEST', 4, FakeBotRequest())
+    replies = []
+    reply_to = dispatcher.reply_to
+
+    def record(message, text, **kwargs):
+        replies.append(text)
+        return reply_to(message, text, **kwargs)
+    monkeypatch.setattr(dispatcher, 'reply_to', record)
+
+    async def feed(*payloads):
+        for payload in payloads:
+            await application.process_update(Update.de_json(payload, application.bot))
+
+    async def scenario():
+        async with application:
+            dispatcher.start(application.bot)
+            await feed(message_payload(7, '/start'))
+            # Long after /start, with the settings evicted from the cache: still a bot user
+            main.config_cache.cache.clear()
+            await feed(message_payload(7, 'gm', chat_id=-1001, chat_type='supergroup'),
+                       callback_payload(7, 'configure_groups'),
+                       callback_payload(7, 'add_group'),
+                       message_payload(7, 'not a group'),
+                       # A group user 7 only reads
+                       message_payload(7, '-1002'))
+            await dispatcher.stop()
+        await asyncio.gather(*main._group_writes)
+        main.group_directory = GroupDirectory()
+        return await main.load_group_directory()
+
+    assert asyncio.run(scenario()) == 2
+    assert replies[1].startswith('❌ Group not found!')
+    assert replies[2].startswith('-1002 Configuration')
+    assert 7 in main.group_directory
+    assert main.group_directory.groups_of(7) == ['-1001', '-1002']
+    assert main.group_directory.title('-1001') == 'group -1001'
@@ -0,0 +1,72 @@
+import asyncio
+
+import aiohttp
+from telegram.ext import CallbackQueryHandler, CommandHandler, ConversationHandler
+
+import metrics
+
+
+def test_histogram_quantiles_and_prometheus_text():
+    histogram = metrics.Histogram('demo_seconds', 'Demo', ('stage',), buckets=(0.01, 0.1, 1.0))
+    for value in [0.005] * 50 + [0.05] * 45 + [0.5] * 5:
+        histogram.observe(value, 'parse')
+    assert histogram.count('parse') == 100
+    assert histogram.quantile(0.5, 'parse') == 0.01
+    assert 0.01 < histogram.quantile(0.95, 'parse') <= 0.1
+    assert 0.1 < histogram.quantile(0.99, 'parse') <= 1.0
+    assert histogram.quantile(0.5, 'missing') is None
+
+    text = '\n'.join(histogram.render())
+    assert '# TYPE demo_seconds histogram' in text
+    assert 'demo_seconds_bucket{stage="parse",le="0.1"} 95' in text
+    assert 'demo_seconds_bucket{stage="parse",le="+Inf"} 100' in text
+    assert 'demo_seconds_count{stage="parse"} 100' in text
+
+
+def test_handlers_are_only_wrapped_when_enabled():
+    async def callback(update, context):
+        return 'next'
+
+    def conversation():
+        return ConversationHandler(entry_points=[CommandHandler('start', callback)],
+                                   states={1: [CallbackQueryHandler(callback)]}, fallbacks=[])
+
+    disabled = conversation()
+    metrics.instrument_handlers([disabled])
+    assert disabled.entry_points[0].callback is callback
+
+    metrics.REGISTRY.enabled = True
+    try:
+        enabled = conversation()
+        metrics.instrument_handlers([enabled])
+        metrics.instrument_handlers([enabled])
+        wrapped = enabled.states[1][0].callback
+        assert wrapped is not callback and wrapped.__wrapped__ is callback
+        before = metrics.HANDLER_SECONDS.count('callback')
+        assert asyncio.run(wrapped(None, None)) == 'next'
+        assert metrics.HANDLER_SECONDS.count('callback') == before + 1
+
+        span = metrics.span()
+        span.mark('test_stage')
+        assert metrics.STAGE_SECONDS.count('test_stage') >= 1
+    finally:
+        metrics.REGISTRY.enabled = False
+    assert metrics.span() is metrics.NULL_SPAN
+
+
+def test_metrics_endpoint_serves_registry():
+    async def scenario():
+        registry = metrics.Registry(enabled=True)
+        registry.gauge('queue_depth', 'Queued items', lambda: 7)
+        registry.histogram('call_seconds', 'Calls', ('method',)).observe(0.2, 'send_message')
+        server = metrics.MetricsServer('127.0.0.1', 18190, registry)
+        await server.start()
+        async with aiohttp.ClientSession() as session:
+            async with session.get('http://127.0.0.1:18190/metrics') as response:
+                body = await response.text()
+        await server.stop()
+        return body
+
+    body = asyncio.run(scenario())
+    assert 'queue_depth 7' in body
+    assert 'call_seconds_count{method="send_message"} 1' in body
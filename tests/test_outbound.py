@@ -0,0 +1,71 @@
+import asyncio
+
+from bench.fakes import FakeBot
+from bot.outbound import OutboundDispatcher, Priority
+
+
+def run(scenario):
+    return asyncio.run(scenario())
+
+
+def test_priority_lanes_and_per_chat_order():
+    async def scenario():
+        bot = FakeBot()
+        dispatcher = OutboundDispatcher(bot, chat_rate=1000, chat_burst=1000)
+        futures = [dispatcher.send_message(1, 'menu', Priority.MENU),
+                   dispatcher.send_message(1, 'first'),
+                   dispatcher.send_message(1, 'second'),
+                   dispatcher.send_message(2, 'snipe', Priority.SNIPE)]
+        dispatcher.start()
+        await asyncio.gather(*futures)
+        await dispatcher.stop()
+        return [call[1]['text'] for call in bot.calls]
+
+    assert run(scenario) == ['snipe', 'first', 'second', 'menu']
+
+
+def test_coalesces_queued_notifications():
+    async def scenario():
+        bot = FakeBot()
+        dispatcher = OutboundDispatcher(bot)
+        first = dispatcher.send_message(7, 'a', coalesce_key='alpha')
+        second = dispatcher.send_message(7, 'b', coalesce_key='alpha')
+        dispatcher.start()
+        await asyncio.gather(first, second)
+        await dispatcher.stop()
+        return first is second, bot.calls
+
+    same, calls = run(scenario)
+    assert same
+    assert [call[1]['text'] for call in calls] == ['a\nb']
+
+
+def test_retry_after_requeues_without_failing():
+    async def scenario():
+        bot = FakeBot(flood_limit=2, retry_after=0)
+        dispatcher = OutboundDispatcher(bot, chat_rate=1000, chat_burst=1000)
+        dispatcher.start()
+        results = await asyncio.gather(*(dispatcher.send_message(chat, 'x') for chat in range(4)))
+        await dispatcher.stop()
+        return results, bot, dispatcher
+
+    results, bot, dispatcher = run(scenario)
+    assert len(results) == 4 and len(bot.calls) == 4
+    assert dispatcher.retries == bot.rejected > 0
+
+
+def test_per_chat_bucket_does_not_block_other_chats():
+    async def scenario():
+        bot = FakeBot()
+        dispatcher = OutboundDispatcher(bot, chat_rate=1, chat_burst=1)
+        dispatcher.start()
+        slow = dispatcher.send_message(1, 'one'), dispatcher.send_message(1, 'two')
+        other = dispatcher.send_message(2, 'other')
+        await other
+        delivered = [call[1]['text'] for call in bot.calls]
+        for future in slow:
+            future.cancel()
+        await dispatcher.stop(timeout=0)
+        return delivered
+
+    assert run(scenario) == ['one', 'other']
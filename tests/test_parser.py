@@ -0,0 +1,29 @@
+from types import SimpleNamespace
+
+from signals.parser import extract_from_message, extract_tokens
+
+PEPE = '0x6982508145454Ce325dDbE47a25d4ec3d2311933'
+MINT = 'EKpQGSJtjMFqKZ9KQanSqYXRcF8fBopzLHYxdM65zcjm'
+
+
+def test_checksums_and_dedupes_evm_addresses():
+    tokens = extract_tokens(f"ape {PEPE.lower()} https://dexscreener.com/ethereum/{PEPE}")
+    assert [(t.address, t.chain) for t in tokens] == [(PEPE, 'ethereum')]
+
+
+def test_links_give_chain_context():
+    text = (f"basescan.org/token/{PEPE.lower()}\n"
+            f"https://www.dextools.io/app/en/ether/pair-explorer/{PEPE}\n"
+            f"pump.fun/{MINT}")
+    tokens = extract_tokens(text)
+    assert [(t.address, t.chain, t.source) for t in tokens] == [(PEPE, 'base', 'link'), (MINT, 'solana', 'link')]
+
+
+def test_ignores_non_addresses():
+    assert extract_tokens("gm thisisaverylongwordthatisntanaddressreally 0x1234") == []
+    assert extract_tokens(None) == []
+
+
+def test_reads_captions():
+    message = SimpleNamespace(text=None, caption=f"CA {MINT}")
+    assert extract_from_message(message)[0].address == MINT
@@ -0,0 +1,73 @@
+import asyncio
+
+from telegram import Update
+
+import main
+from bench.bench_app import INPUT_SETUP, step_payload
+from bench.fakes import AsyncFakeCollection, FakeBotRequest, message_payload
+from constants import State
+from repo.dbhelper import AsyncMongoHelper
+from repo.persistence import MongoPersistence
+from signals.dedup import SeenWindow
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_conversation_survives_restart_loaded_lazily_and_evicted(monkeypatch):
+    monkeypatch.setattr(main.user_repo, 'collection', AsyncFakeCollection())
+    monkeypatch.setattr(main.group_repo, 'collection', AsyncFakeCollection())
+    monkeypatch.setattr(main, 'seen_signals', SeenWindow())
+    main.config_cache.cache.clear()
+    store = AsyncFakeCollection()
+    clock = Clock()
+
+    def build():
+        helper = AsyncMongoHelper('mydb', 'conversations')
+        helper.collection = store
+        persistence = MongoPersistence(helper, update_interval=60, idle_ttl=600, clock=clock)
+        return main.build_application('123456:TEST', 4, FakeBotRequest(), persistence), persistence
+
+    async def feed(application, payload):
+        update = Update.de_json(payload, application.bot)
+        await application.update_processor.process_update(update, application.process_update(update))
+
+    async def scenario():
+        application, persistence = build()
+        async with application:
+            for index, step in enumerate(INPUT_SETUP):
+                await feed(application, step_payload(7, *step, index))
+            await application.update_persistence()
+        first_run = dict(persistence.stats())
+
+        application, persistence = build()
+        conversation = application.handlers[0][0]
+        async with application:
+            # Nothing is read at boot, and group members are not loaded
+            await feed(application, message_payload(9, 'gm', chat_id=-1001, chat_type='supergroup'))
+            assert persistence.stats()['loads'] == 0
+            await feed(application, message_payload(7, '0.25'))
+            resumed = conversation._conversations.get((7, 7))
+            await application.update_persistence()
+            second_run = dict(persistence.stats())
+            clock.now = 601
+            await feed(application, message_payload(8, 'hi'))
+            evicted = 7 not in application.user_data, (7, 7) not in conversation._conversations
+        return first_run, resumed, second_run, persistence.stats(), evicted
+
+    first_run, resumed, second_run, stats, evicted = asyncio.run(scenario())
+    assert first_run['writes'] >= 1 and first_run['loads'] == 1
+    # The eth limit prompt is answered after the restart with the stored group selection
+    assert resumed == State.SETTING_LIMITS
+    # Only the conversation state changed; the unchanged user_data is not written again
+    assert (second_run['loads'], second_run['writes'], second_run['written_ops']) == (1, 1, 1)
+    assert second_run['unchanged'] >= 1
+    assert stats['evictions'] == 2 and evicted == (True, True)
+    doc = store._find_one({'_id': 7})
+    assert doc['conversations']['menu'] == {'7_7': 'SETTING_LIMITS'}
+    assert doc['user_data']['selected_group'] == 'Group1'
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from bench.fake_rpc import FakeRpcServer
+from chain.rpc import JsonRpcClient, RpcError, RpcUnavailable
+from chain.tokens import TokenReader, pair_for
+
+TOKEN = '0x6982508145454Ce325dDbE47a25d4ec3d2311933'
+
+
+def test_concurrent_calls_share_one_round_trip():
+    async def scenario():
+        server = FakeRpcServer()
+        rpc = JsonRpcClient(await server.start())
+        chain_id, block, nonce = await asyncio.gather(
+            rpc.call('eth_chainId'), rpc.call('eth_blockNumber'), rpc.call('eth_getTransactionCount', ['0x0']))
+        with pytest.raises(RpcError):
+            await rpc.call('eth_unknown')
+        await rpc.close()
+        await server.stop()
+        return (chain_id, block, nonce), server.round_trips
+
+    results, round_trips = asyncio.run(scenario())
+    assert results == (hex(8453), hex(1_000_000), '0x0')
+    assert round_trips == 2
+
+
+def test_failover_to_next_endpoint():
+    async def scenario():
+        dead, alive = FakeRpcServer(fail=True), FakeRpcServer()
+        rpc = JsonRpcClient([await dead.start(), await alive.start()])
+        first = await rpc.call('eth_chainId')
+        second = await rpc.call('eth_chainId')
+        await rpc.close()
+        await dead.stop()
+        await alive.stop()
+        only_dead = JsonRpcClient([dead.url])
+        with pytest.raises(RpcUnavailable):
+            await only_dead.call('eth_chainId')
+        await only_dead.close()
+        return first, second, dead.round_trips, alive.round_trips
+
+    # The failing endpoint is benched after its first error
+    assert asyncio.run(scenario()) == (hex(8453), hex(8453), 1, 2)
+
+
+
+@pytest.mark.parametrize('body', [None, 5, [1, None], {'id': [1]}, [{'id': {}}]])
+def test_malformed_replies_fail_every_call(monkeypatch, body):
+    async def reply(payload):
+        return body
+
+    async def scenario():
+        rpc = JsonRpcClient('http://127.0.0.1:1')
+        monkeypatch.setattr(rpc, '_post', reply)
+        results = await asyncio.wait_for(rpc.batch([('eth_chainId', []), ('eth_blockNumber', [])],
+                                                   raise_errors=False), 1)
+        single = await asyncio.wait_for(rpc.batch([('eth_chainId', [])], raise_errors=False), 1)
+        return results + single
+
+    assert all(isinstance(result, RpcError) for result in asyncio.run(scenario()))
+
+
+@pytest.mark.parametrize('use_multicall', [True, False])
+def test_token_reader_batches_the_fields_and_sends_bounded_log_queries_alone(use_multicall):
+    async def scenario():
+        server = FakeRpcServer()
+        server.add_token(TOKEN, decimals=9, total_supply=10 ** 18, reserve_token=10 ** 17, reserve_weth=2 * 10 ** 18,
+                         created_block=990_000)
+        server.add_token('0x' + '11' * 20)
+        ranges = []
+        get_logs = server.methods['eth_getLogs']
+
+        def record(params):
+            ranges.append((params[0]['fromBlock'], params[0]['toBlock']))
+            return get_logs(params)
+        server.methods['eth_getLogs'] = record
+        reader = TokenReader(JsonRpcClient(await server.start()), use_multicall=use_multicall)
+        info, unlisted = await reader.read_many([TOKEN, '0x' + '11' * 20])
+        reader.log_blocks = 5_000
+        old = await reader.read(TOKEN)
+        await reader.rpc.close()
+        await server.stop()
+        return info, unlisted, old, server.round_trips, ranges
+
+    info, unlisted, old, round_trips, ranges = asyncio.run(scenario())
+    # One batch for both tokens, then each log query on its own
+    assert round_trips == 1 + 2 + 2
+    assert ranges[:2] == [(hex(950_000), hex(1_000_000))] * 2
+    assert (info.decimals, info.total_supply, info.creation_block) == (9, 10 ** 18, 990_000)
+    assert (info.reserve_token, info.reserve_weth, info.pair) == (10 ** 17, 2 * 10 ** 18, pair_for(TOKEN)[0])
+    assert info.market_cap_eth == pytest.approx(20.0)
+    assert not unlisted.has_liquidity and unlisted.creation_block is None and unlisted.decimals == 18
+    # Launched before the last log_blocks blocks: not dated
+    assert old.creation_block is None and old.has_liquidity
+
+
+def test_token_reader_survives_a_failed_log_query():
+    async def scenario():
+        server = FakeRpcServer()
+        server.add_token(TOKEN, reserve_token=10 ** 17, reserve_weth=2 * 10 ** 18, created_block=123)
+
+        def refuse(params):
+            raise ValueError('query exceeds max block range')
+        server.methods['eth_getLogs'] = refuse
+        reader = TokenReader(JsonRpcClient(await server.start()))
+        info = await reader.read(TOKEN)
+        await reader.rpc.close()
+        await server.stop()
+        return info
+
+    info = asyncio.run(scenario())
+    assert info.creation_block is None
+    assert (info.reserve_token, info.reserve_weth) == (10 ** 17, 2 * 10 ** 18)
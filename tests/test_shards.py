@@ -0,0 +1,129 @@
+import asyncio
+import functools
+import json
+from collections import Counter
+from types import SimpleNamespace
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from telegram import Update
+
+from bench.bench_shards import SUBSCRIBER, bench_setup
+from bench.fakes import callback_payload, message_payload
+from bot.shards import (ANSWER, CLAIM, HELLO, SNIPE, ShardIngress, _Worker, frame, poll_updates, raw_update_key,
+                         read_frame, shard_for)
+from bot.updates import update_order_key
+
+
+def test_jump_hash_is_balanced_and_moves_few_keys():
+    keys = list(range(-1_000_000, -990_000)) + list(range(10_000))
+    four = [shard_for(key, 4) for key in keys]
+    five = [shard_for(key, 5) for key in keys]
+    assert min(Counter(four).values()) > len(keys) / 4 * 0.9
+    moved = [(a, b) for a, b in zip(four, five) if a != b]
+    assert all(b == 4 for _, b in moved)
+    assert abs(len(moved) - len(keys) / 5) < len(keys) * 0.02
+    assert shard_for(None, 4) == 0 and shard_for(123, 1) == 0
+
+
+def test_raw_update_key_is_the_chat_of_update_order_key():
+    payloads = [message_payload(7, 'hi'), message_payload(7, 'CA', chat_id=-1001, chat_type='supergroup'),
+                callback_payload(7, 'exit'), {'update_id': 1, 'inline_query': {
+                    'id': '1', 'from': {'id': 9, 'is_bot': False, 'first_name': 'x'}, 'query': '', 'offset': ''}}]
+    for payload in payloads:
+        chat, user = update_order_key(Update.de_json(payload, None))
+        assert raw_update_key(payload) == (chat if chat is not None else user)
+
+
+def test_shards_share_settings_and_signal_claims():
+    async def scenario():
+        groups = {}
+        for chat_id in range(-1001, -1100, -1):
+            groups.setdefault(shard_for(chat_id, 2), chat_id)
+        setup = functools.partial(bench_setup, mongo_latency=0.0, concurrency=4, groups=list(groups.values()))
+        ingress = ShardIngress(2, setup)
+        await ingress.start()
+        try:
+            await ingress.route(message_payload(SUBSCRIBER, '/start'))
+            await ingress.drain()
+            broadcasts = ingress.broadcasts
+            for chat_id in groups.values():
+                await ingress.route(message_payload(30, f"CA 0x{1:040x}", chat_id=chat_id, chat_type='supergroup'))
+            await ingress.drain()
+            return broadcasts, ingress.routed, ingress.seen.stats()
+        finally:
+            await ingress.stop()
+
+    broadcasts, routed, claims = asyncio.run(scenario())
+    assert broadcasts == 1
+    assert sorted(routed) == [1, 2]
+    # The same call in groups on both shards is acted on once
+    assert (claims['passed'], claims['suppressed']) == (1, 1)
+
+
+def test_ingress_drops_a_forwarded_buy_while_the_owner_shard_is_down():
+    class Writer:
+        def __init__(self):
+            self.reader = asyncio.StreamReader()
+
+        def write(self, data):
+            self.reader.feed_data(data)
+
+    async def scenario():
+        ingress = ShardIngress(2, None)
+        ingress._workers = [_Worker(SimpleNamespace(name=f'shard-{index}')) for index in range(2)]
+        ingress._ready = asyncio.get_running_loop().create_future()
+        frames = asyncio.StreamReader()
+        frames.feed_data(frame(HELLO, b'1') + frame(SNIPE, b'{}') + frame(CLAIM, json.dumps([0, [[1, '0x1']]]).encode()))
+        frames.feed_eof()
+        writer = Writer()
+        await ingress._serve(frames, writer)
+        return ingress.forwarded, await read_frame(writer.reader)
+
+    forwarded, answer = asyncio.run(scenario())
+    # The sender's frame loop goes on: its claim is still answered
+    assert forwarded == 0
+    assert answer == (ANSWER, json.dumps([0, [True]]).encode())
+
+
+def test_poll_updates_backs_off_on_errors_and_honours_retry_after(monkeypatch):
+    replies = [(409, {'ok': False, 'error_code': 409, 'description': 'Conflict'}),
+               (409, {'ok': False, 'error_code': 409, 'description': 'Conflict'}),
+               (429, {'ok': False, 'error_code': 429, 'parameters': {'retry_after': 7}}),
+               (200, {'ok': True, 'result': [{'update_id': 5, 'message': {}}]})]
+    offsets, sleeps = [], []
+    sleep = asyncio.sleep
+
+    async def record_sleep(delay, *args):
+        if delay:
+            sleeps.append(delay)
+        await sleep(0)
+    monkeypatch.setattr(asyncio, 'sleep', record_sleep)
+
+    async def handle(request):
+        if request.match_info['method'] == 'getUpdates':
+            offsets.append((await request.json())['offset'])
+            if replies:
+                status, body = replies.pop(0)
+                return web.json_response(body, status=status)
+            await sleep(10)
+        return web.json_response({'ok': True, 'result': True})
+
+    async def scenario():
+        routed = asyncio.Queue()
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', handle)
+        async with TestServer(app) as server:
+            ingress = SimpleNamespace(route=routed.put)
+            poller = asyncio.create_task(poll_updates(ingress, 'TOKEN', str(server.make_url('/bot')),
+                                                      retry_delay=0.5))
+            update = await asyncio.wait_for(routed.get(), 5)
+            while len(offsets) < 5:
+                await sleep(0.01)
+            poller.cancel()
+            return update
+
+    assert asyncio.run(scenario()) == {'update_id': 5, 'message': {}}
+    assert sleeps == [0.5, 1.0, 7]
+    assert offsets == [0, 0, 0, 0, 6]
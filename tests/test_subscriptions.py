@@ -0,0 +1,55 @@
+import random
+from datetime import datetime, timezone
+
+from repo.config_cache import build_user_config
+from signals.access import AccessIndex, SharedDenyList
+from signals.active_hours import ActiveHoursScheduler, compile_slots
+from signals.subscriptions import SubscriptionIndex
+
+
+def config(**limits: float) -> dict:
+    return build_user_config({'groups': {group: {'eth_limit': limit} for group, limit in limits.items()}})
+
+
+def test_sync_user_adds_updates_and_removes_only_changes():
+    index = SubscriptionIndex()
+    index.sync_user(1, config(g1=0.1, g2=0.2))
+    index.sync_user(2, config(g1=0.3))
+    index.sync_user(3, config(g1=0.4))
+    assert index.groups_of(1) == {'g1': 0.1, 'g2': 0.2}
+    index.sync_user(1, config(g1=0.0, g2=0.5))
+    subscribers = index.subscribers('g1')
+    # The last record moved into the freed slot
+    assert list(subscribers.ids) == [3, 2] and list(subscribers.eth_limits) == [0.4, 0.3]
+    assert index.groups_of(1) == {'g2': 0.5}
+    index.remove_user(1)
+    assert index.subscribers('g2') is None
+    assert index.stats() == {'users': 2, 'groups': 1, 'subscriptions': 2}
+
+
+def test_select_matches_per_subscriber_checks():
+    rng = random.Random(5)
+    index = SubscriptionIndex()
+    access = AccessIndex(SharedDenyList([900, 901]))
+    hours = ActiveHoursScheduler(clock=lambda: datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc))
+    senders = list(range(900, 910))
+    for sender in senders:
+        access.observe(sender, f'user{sender}')
+    for tg_id in range(200):
+        groups = {f'g{group}': 0.1 for group in rng.sample(range(5), 2)}
+        index.sync_user(tg_id, config(**groups))
+        for group in groups:
+            if rng.random() < 0.3:
+                access.deny_handle((tg_id, group), f'@user{rng.choice(senders)}')
+            if rng.random() < 0.05:
+                access.allow_handle((tg_id, group), f'@user{rng.choice(senders)}')
+        if rng.random() < 0.3:
+            hours.set_window(tg_id, compile_slots('00:00 - 06:00'))
+
+    for group in [f'g{group}' for group in range(5)] + ['none']:
+        for sender in senders:
+            subscribers = index.subscribers(group)
+            records = list(zip(subscribers.ids, subscribers.eth_limits)) if subscribers else []
+            expected = [(tg_id, limit) for tg_id, limit in records
+                        if hours.is_armed(tg_id) and access.allows((tg_id, group), sender)]
+            assert index.select(group, sender, hours, access) == expected
@@ -0,0 +1,67 @@
+import asyncio
+
+from bench.fake_rpc import FakeRpcServer
+from chain.rpc import JsonRpcClient
+from chain.token_cache import REJECT_NO_LIQUIDITY, REJECT_NOT_A_TOKEN, TokenCache
+from chain.tokens import TokenReader
+
+LIVE = '0x6982508145454Ce325dDbE47a25d4ec3d2311933'
+UNLISTED = '0x' + '11' * 20
+MISSING = '0x' + '22' * 20
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_cache_single_flight_ttls_and_negatives():
+    async def scenario():
+        server = FakeRpcServer()
+        server.add_token(LIVE, reserve_token=10 ** 20, reserve_weth=10 ** 18)
+        server.add_token(UNLISTED)
+        clock = Clock()
+        cache = TokenCache(TokenReader(JsonRpcClient(await server.start())), volatile_ttl=3, clock=clock)
+
+        burst = await asyncio.gather(*(cache.get(LIVE.lower()) for _ in range(10)))
+        undated = cache.static.peek(LIVE.lower()).creation_block
+        await asyncio.gather(*cache._dating)
+        after_burst = server.calls
+        assert await cache.get(LIVE) == burst[0]
+        assert server.calls == after_burst
+
+        clock.now = 5
+        server.add_token(LIVE, reserve_token=10 ** 20, reserve_weth=2 * 10 ** 18)
+        refreshed = await cache.get(LIVE)
+        volatile_calls = server.calls - after_burst
+
+        missing, unlisted = await cache.get_many([MISSING, UNLISTED])
+        await asyncio.gather(*cache._dating)
+        before_negatives = server.calls
+        assert await cache.get(MISSING) is None and await cache.get(UNLISTED) is None
+        negative_calls = server.calls - before_negatives
+
+        cache.reject(LIVE, 'honeypot')
+        rejected = await cache.get(LIVE)
+        await cache.reader.rpc.close()
+        await server.stop()
+        return (burst, undated, after_burst, refreshed, volatile_calls, missing, unlisted, negative_calls,
+                rejected, cache)
+
+    burst, undated, after_burst, refreshed, volatile_calls, missing, unlisted, negative_calls, rejected, cache = \
+        asyncio.run(scenario())
+    # The lookups do not wait for the log query; the block number and logs follow in the background
+    assert all(info is burst[0] for info in burst) and burst[0].creation_block is None and undated is None
+    assert after_burst == 3
+    assert refreshed.reserve_weth == 2 * 10 ** 18 and refreshed.creation_block == 1_000_000
+    assert volatile_calls == 1
+    assert missing is None and unlisted is None and negative_calls == 0
+    assert cache.rejection(MISSING) == REJECT_NOT_A_TOKEN and cache.rejection(UNLISTED) == REJECT_NO_LIQUIDITY
+    assert rejected is None and cache.rejection(LIVE) == 'honeypot'
+    stats = cache.stats()
+    assert stats['coalesced'] == 9 and stats['full_reads'] == 3 and stats['volatile_reads'] == 1
+    assert stats['log_reads'] == 2 and stats['rpc_calls'] == 3 * 1 + 2 * 2 + 1
+    assert stats['rpc_calls_saved'] == stats['lookups'] * 3 - stats['rpc_calls']
@@ -0,0 +1,82 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from eth_keys import keys
+from pymongo.errors import PyMongoError
+
+import main
+from bench.fakes import AsyncFakeCollection
+from chain.wallets import WalletPool, decrypt_wallet, generate_wallet
+from repo.wallet import AsyncWalletRepository
+
+
+def test_generated_keystore_decrypts_to_its_address():
+    wallet = generate_wallet('secret', iterations=2 ** 10)
+    key = keys.PrivateKey(decrypt_wallet(wallet['keystore'], 'secret'))
+    assert key.public_key.to_checksum_address() == wallet['address']
+    assert wallet['keystore']['crypto']['kdf'] == 'scrypt'
+
+
+def test_pool_hands_out_stored_wallets_once_and_survives_restart():
+    repo = AsyncWalletRepository()
+    repo.collection = AsyncFakeCollection()
+
+    def pool() -> WalletPool:
+        return WalletPool(repo, 'secret', size=4, low_water=1, workers=2, iterations=2 ** 10,
+                          executor=ThreadPoolExecutor(2))
+
+    async def until(condition):
+        for _ in range(500):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError('timed out')
+
+    async def scenario():
+        await repo.ensure_indexes()
+        first = pool()
+        await first.start()
+        await until(lambda: len(first) == 4)
+        wallet = await first.take(1)
+        await first.stop()
+
+        second = pool()
+        await second.start()
+        # The three stored wallets are reloaded; one of them was taken meanwhile by another process
+        await repo.assign(second._ready[0]['address'], 99)
+        taken = [await second.take(user) for user in (2, 3)]
+        await until(lambda: len(second) == 4)
+        await second.stop()
+        return wallet, taken, first.stats(), second.stats()
+
+    wallet, taken, first, second = asyncio.run(scenario())
+    assert (first['generated'], first['handed_out']) == (4, 1)
+    assert second['generated'] == 4 and second['handed_out'] == 2 and second['made_on_demand'] == 0
+    addresses = [wallet['address']] + [w['address'] for w in taken]
+    assert len(set(addresses)) == 3
+    assert repo.collection._find_one({'tg_id': 2})['address'] == taken[0]['address']
+    # What is left in memory is what is stored as unassigned
+    assert len(repo.collection._find({'tg_id': None})) == 4
+
+
+def test_pool_is_loaded_oldest_first_and_a_db_error_is_answered(monkeypatch):
+    repo = AsyncWalletRepository()
+    repo.collection = AsyncFakeCollection()
+
+    async def failing(tg_id):
+        raise PyMongoError('no primary')
+
+    async def scenario():
+        await repo.insert_many([{'address': address, 'keystore': {}, 'tg_id': None, 'created_at': created_at}
+                                for address, created_at in (('0xb', 2.0), ('0xc', 3.0), ('0xa', 1.0))])
+        pool = await repo.find_pool(limit=2)
+        monkeypatch.setattr(main, 'wallet_pool', SimpleNamespace(take=failing))
+        monkeypatch.setattr(main, 'wallet_repo', repo)
+        update = SimpleNamespace(callback_query=SimpleNamespace(from_user=SimpleNamespace(id=5)))
+        return pool, await main.wallet_text(update, None)
+
+    pool, text = asyncio.run(scenario())
+    assert [wallet['address'] for wallet in pool] == ['0xa', '0xb']
+    assert 'keystore' in pool[0] and 'created_at' not in pool[0]
+    assert text.startswith('❌')
@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+from aiohttp.test_utils import TestClient, TestServer
+from telegram import Update
+from telegram.ext import Application
+
+from bot.updates import ChatOrderedUpdateProcessor
+from bot.webhook import SECRET_HEADER, WebhookServer
+
+UPDATE = {
+    'update_id': 7,
+    'message': {'message_id': 1, 'date': 0, 'text': 'hi',
+                'chat': {'id': -5, 'type': 'group', 'title': 'g'},
+                'from': {'id': 3, 'is_bot': False, 'first_name': 'a'}},
+}
+
+
+def test_webhook_checks_secret_and_enqueues_update():
+    async def scenario():
+        application = Application.builder().token('1:TEST').build()
+        server = WebhookServer(application, 'sekrit')
+        async with TestClient(TestServer(server.build_app())) as client:
+            denied = await client.post('/telegram', data=json.dumps(UPDATE), headers={SECRET_HEADER: 'nope'})
+            accepted = await client.post('/telegram', data=json.dumps(UPDATE), headers={SECRET_HEADER: 'sekrit'})
+            malformed = await client.post('/telegram', data='{', headers={SECRET_HEADER: 'sekrit'})
+        return denied.status, accepted.status, malformed.status, application.update_queue.get_nowait()
+
+    denied, accepted, malformed, update = asyncio.run(scenario())
+    assert (denied, accepted, malformed) == (403, 200, 400)
+    assert update.update_id == 7 and update.message.text == 'hi'
+
+
+def test_processor_serializes_per_chat_only():
+    def make(update_id, chat_id):
+        data = dict(UPDATE, update_id=update_id, message=dict(UPDATE['message'], chat={'id': chat_id, 'type': 'group'}))
+        return Update.de_json(data, None)
+
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(8)
+        active, peak, order = {}, {}, []
+
+        async def handle(update):
+            chat = update.effective_chat.id
+            active[chat] = active.get(chat, 0) + 1
+            peak[chat] = max(peak.get(chat, 0), active[chat])
+            peak['all'] = max(peak.get('all', 0), sum(active.values()))
+            await asyncio.sleep(0.01)
+            order.append(update.update_id)
+            active[chat] -= 1
+
+        updates = [make(i, -1 if i % 2 else -2) for i in range(6)]
+        await asyncio.gather(*(processor.process_update(u, handle(u)) for u in updates))
+        return peak, order
+
+    peak, order = asyncio.run(scenario())
+    assert peak[-1] == peak[-2] == 1
+    assert peak['all'] == 2
+    assert [i for i in order if i % 2] == [1, 3, 5]
+
+
+def test_waiting_for_a_chat_holds_no_slot_and_group_members_overlap():
+    def make(update_id, chat_id, user_id):
+        data = dict(UPDATE, update_id=update_id, message=dict(UPDATE['message'], chat={'id': chat_id, 'type': 'group'},
+                                                              **{'from': dict(UPDATE['message']['from'], id=user_id)}))
+        return Update.de_json(data, None)
+
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(2)
+        done = []
+
+        async def handle(update, delay):
+            await asyncio.sleep(delay)
+            done.append(update.update_id)
+
+        # 1 and 2 are one user in one chat, 3 another chat, 4 another member of 1's group
+        updates = [(make(1, -1, 3), 0.2), (make(2, -1, 3), 0.01), (make(3, -2, 3), 0.01), (make(4, -1, 4), 0.01)]
+        tasks = []
+        for update, delay in updates:
+            tasks.append(asyncio.create_task(processor.process_update(update, handle(update, delay))))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return done, processor.in_flight
+
+    done, in_flight = asyncio.run(scenario())
+    assert done[-1] == 2 and set(done[:2]) == {3, 4}
+    assert in_flight == 0